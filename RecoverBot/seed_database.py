@@ -302,7 +302,7 @@ async def seed():
             "conversation_log": conv_log,
             "checkin_schedule": make_checkin_schedule(discharged_at, days_ago),
             "is_pediatric":     patient_config["is_pediatric"],
-            "created_at":       discharged_at.isoformat(),
+            "created_at":       discharged_at,
             "_seeded":          True,   # marker for cleanup
         }
         fu_res = await db.followups.insert_one(followup_doc)
@@ -30,10 +30,10 @@ export const AppProvider = ({ children }) => {
     };
 
     useEffect(() => {
-        // Note: Developer 2 owns the /api/recoverbot/ws/alerts endpoint
+        // Multiplexed realtime gateway (shared/realtime.py); /api/recoverbot/ws/alerts remains as an alias
         // We instantiate it here so all modules can share it. For ScribeAI backend we don't need this specific general WS, 
         // but we adhere to the Shared Contract (Section 6.4 in PRD).
-        const socket = new WebSocket('ws://localhost:8000/api/recoverbot/ws/alerts');
+        const socket = new WebSocket('ws://localhost:8000/api/realtime/ws?topics=recoverbot.*,commhub.*,painscan.*,scribe.*');
 
         socket.onopen = () => {
             console.log('Shared alert websocket connected');
@@ -43,15 +43,25 @@ export const AppProvider = ({ children }) => {
             try {
                 const event = JSON.parse(e.data);
                 console.log("Shared WS Event Received:", event);
-                // Handle global events if needed (like popup alerts)
-                if (event.type === 'alert' || event.topic === 'recoverbot.flagged' || event.topic === 'commhub.emergency') {
+                // Handle global events if needed (like popup alerts).
+                // RecoverBot flags arrive through CommHub doctor alerts (deduped, digested), not recoverbot.flagged
+                if (event.type === 'alert' || event.topic === 'commhub.emergency') {
                     addAlert({
-                        title: event.topic === 'commhub.emergency' ? 'Emergency Request' : 'High Risk Flag',
+                        title: 'Emergency Request',
                         message: event.data?.reason || event.data?.message || JSON.stringify(event.data),
                         patient_name: event.data?.patient_name || 'Patient',
-                        risk: event.topic === 'commhub.emergency' ? 'CRITICAL' : 'HIGH',
+                        risk: event.data?.severity || 'CRITICAL',
                         suggested_action: event.data?.suggested_action || 'Review patient immediately in Control Center.'
                     });
+                } else if (event.topic === 'commhub.doctor_digest') {
+                    const alerts = event.data?.alerts || [];
+                    addAlert({
+                        title: `Alert Digest (${event.data?.count || alerts.length})`,
+                        message: alerts.map(a => `${a.patient_name}: ${a.severity}`).join(', '),
+                        patient_name: alerts.length === 1 ? alerts[0].patient_name : `${alerts.length} patients`,
+                        risk: alerts.some(a => a.severity === 'CRITICAL') ? 'CRITICAL' : 'HIGH',
+                        suggested_action: 'Review flagged patients in Control Center.'
+                    });
                 }
             } catch (err) {
                 console.error("Failed to parse WS message", e.data);
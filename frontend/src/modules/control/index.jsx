@@ -2,6 +2,19 @@ import React, { useState, useEffect, useCallback } from 'react';
 
 const API = 'http://localhost:8000';
 
+// /risk-flagged is paginated; follow next_cursor so the panel lists every flagged followup
+async function fetchAllFlagged() {
+    const items = [];
+    let cursor = null;
+    do {
+        const qs = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+        const res = await fetch(`${API}/api/recoverbot/risk-flagged${qs}`).then(r => r.json());
+        items.push(...(res.data?.items || []));
+        cursor = res.data?.next_cursor;
+    } while (cursor);
+    return { data: { items } };
+}
+
 export default function ControlCenter() {
     const [gaps, setGaps] = useState([]);
     const [followups, setFollowups] = useState([]);
@@ -21,13 +34,13 @@ export default function ControlCenter() {
         try {
             const [gRes, fRes, pRes, aRes, uRes] = await Promise.all([
                 fetch(`${API}/api/caregap/pending`).then(r => r.json()),
-                fetch(`${API}/api/recoverbot/followups`).then(r => r.json()).catch(() => ({ data: [] })),
+                fetchAllFlagged().catch(() => ({ data: {} })),
                 fetch(`${API}/api/commhub/patients`).then(r => r.json()),
                 fetch(`${API}/api/commhub/appointments`).then(r => r.json()).catch(() => ({ data: [] })),
                 fetch(`${API}/api/commhub/unmapped`).then(r => r.json()).catch(() => ({ data: [] })),
             ]);
             setGaps(gRes.data || []);
-            setFollowups((fRes.data || []).filter(f => ['HIGH', 'CRITICAL'].includes(f.risk_label)));
+            setFollowups(fRes.data?.items || []);
             setPatients(pRes.data || []);
             setAppointments(aRes.data || []);
             setUnmappedMessages(uRes.data || []);
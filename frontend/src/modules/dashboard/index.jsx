@@ -6,6 +6,20 @@ import PatientOnboardingModal from '../../components/PatientOnboardingModal';
 const API = 'http://localhost:8000';
 const AUTO_REFRESH_MS = 30000;
 
+// /followups is paginated; follow next_cursor so every patient gets its followup
+async function fetchAllFollowups(authToken) {
+    const items = [];
+    let cursor = null;
+    do {
+        const qs = `limit=200${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
+        const res = await fetch(`${API}/api/recoverbot/followups?${qs}`, { headers: { 'Authorization': `Bearer ${authToken}` } }).then(r => r.json());
+        if (!res.success) return { success: false, data: { items } };
+        items.push(...(res.data?.items || []));
+        cursor = res.data?.next_cursor;
+    } while (cursor);
+    return { success: true, data: { items } };
+}
+
 export default function DoctorDashboard() {
     const [patients, setPatients] = useState([]);
     const [sessions, setSessions] = useState([]);
@@ -30,13 +44,13 @@ export default function DoctorDashboard() {
             const [pt, sess, fu, gaps] = await Promise.all([
                 fetch(`${API}/api/commhub/patients`).then(r => r.json()),
                 fetch(`${API}/api/commhub/sessions`).then(r => r.json()),
-                fetch(`${API}/api/recoverbot/followups`, { headers: { 'Authorization': `Bearer ${authToken}` } }).then(r => r.json()).catch(() => ({ data: [] })),
+                fetchAllFollowups(authToken).catch(() => ({ data: {} })),
                 fetch(`${API}/api/caregap/pending`, { headers: { 'Authorization': `Bearer ${authToken}` } }).then(r => r.json()).catch(() => ({ data: [] })),
             ]);
 
             if (pt.success) setPatients(pt.data || []);
             if (sess.success) setSessions(sess.data || []);
-            if (fu.success) setFollowups(fu.data || []);
+            if (fu.success) setFollowups(fu.data?.items || []);
             if (gaps && gaps.success) setCareGaps(gaps.data || []);
 
             setLastFetch(new Date());
@@ -1,17 +1,37 @@
 import React, { useRef, useState, useEffect } from 'react';
 
+// Session WebSocket wire format (module3_painscan/session.py):
+// header = kind (u8: 1 frame, 2 audio) | seq (u32) | capture time in seconds (f64), big-endian
+const WS_URL = 'ws://localhost:8000/api/painscan/ws/session';
+const KIND_FRAME = 1;
+const KIND_AUDIO = 2;
+const HEADER_BYTES = 13;
+// Capture target until the server sends a {type: 'pace'} message (module3_painscan/pacing.py)
+const DEFAULT_PACE = { fps: 10, max_width: 640, jpeg_quality: 0.8 };
+
+function packet(kind, seq, payload) {
+    const buf = new ArrayBuffer(HEADER_BYTES + payload.byteLength);
+    const view = new DataView(buf);
+    view.setUint8(0, kind);
+    view.setUint32(1, seq);
+    view.setFloat64(5, performance.timeOrigin / 1000 + performance.now() / 1000);
+    new Uint8Array(buf, HEADER_BYTES).set(new Uint8Array(payload));
+    return buf;
+}
+
 export default function CameraView({ onComplete, patientId, followupId }) {
     const videoRef = useRef(null);
     const [countdown, setCountdown] = useState(10);
     const [feedback, setFeedback] = useState('Position face in frame');
-    const [scores, setScores] = useState([]);
     const canvasRef = useRef(document.createElement('canvas'));
-
-    const [audioB64, setAudioB64] = useState(null);
-    const mediaRecorderRef = useRef(null);
+    const wsRef = useRef(null);
+    const seqRef = useRef({ frame: 0, audio: 0 });
+    const audioCtxRef = useRef(null);
+    const paceRef = useRef(DEFAULT_PACE);
 
     useEffect(() => {
         let stream;
+        let frameTimer;
         const startCamera = async () => {
             try {
                 // Multimodal Upgrade: Request both video and audio
@@ -22,30 +42,59 @@ export default function CameraView({ onComplete, patientId, followupId }) {
 
                 if (videoRef.current) videoRef.current.srcObject = stream;
 
-                // Set up Audio MediaRecorder to capture chunks parallel to frames
-                const mediaRecorder = new MediaRecorder(stream);
-                mediaRecorderRef.current = mediaRecorder;
-
-                mediaRecorder.ondataavailable = async (e) => {
-                    if (e.data.size > 0) {
-                        const reader = new FileReader();
-                        reader.readAsDataURL(e.data);
-                        reader.onloadend = () => setAudioB64(reader.result);
+                const audioCtx = new AudioContext();
+                audioCtxRef.current = audioCtx;
+                const ws = new WebSocket(
+                    `${WS_URL}?patient_id=${patientId}&followup_id=${followupId}&sample_rate=${audioCtx.sampleRate}`
+                );
+                ws.binaryType = 'arraybuffer';
+                wsRef.current = ws;
+
+                ws.onmessage = (e) => {
+                    const msg = JSON.parse(e.data);
+                    if (msg.type === 'result') {
+                        setFeedback(msg.face_detected ? (msg.quality?.guidance || 'Good... Keep still') : (msg.message || 'Move closer'));
+                    } else if (msg.type === 'pace') {
+                        paceRef.current = { ...DEFAULT_PACE, ...msg };
+                    } else if (msg.type === 'saved') {
+                        // Pass full multimodal doc up to Index Router
+                        onComplete(msg.data);
+                    } else if (msg.type === 'error') {
+                        setFeedback(msg.message || 'Failed to save multimodal score.');
                     }
                 };
+                ws.onerror = () => setFeedback('Error connecting to server.');
+
+                // Raw PCM (int16 mono) in ~0.25s chunks alongside the frames
+                const source = audioCtx.createMediaStreamSource(stream);
+                const processor = audioCtx.createScriptProcessor(4096, 1, 1);
+                processor.onaudioprocess = (e) => {
+                    if (ws.readyState !== WebSocket.OPEN) return;
+                    const input = e.inputBuffer.getChannelData(0);
+                    const pcm = new Int16Array(input.length);
+                    for (let i = 0; i < input.length; i++) {
+                        pcm[i] = Math.max(-1, Math.min(1, input[i])) * 0x7fff;
+                    }
+                    ws.send(packet(KIND_AUDIO, seqRef.current.audio++, pcm.buffer));
+                };
+                source.connect(processor);
+                processor.connect(audioCtx.destination);
 
-                // Request 1-second chunks matches frame-capture rate
-                mediaRecorder.start(1000);
-
+                // Re-armed after every frame so pace changes apply immediately
+                const captureLoop = () => {
+                    captureFrame();
+                    frameTimer = setTimeout(captureLoop, 1000 / paceRef.current.fps);
+                };
+                captureLoop();
             } catch (err) {
                 setFeedback('Camera or Microphone access denied');
             }
         };
         startCamera();
         return () => {
-            if (mediaRecorderRef.current && mediaRecorderRef.current.state !== 'inactive') {
-                mediaRecorderRef.current.stop();
-            }
+            clearTimeout(frameTimer);
+            if (audioCtxRef.current) audioCtxRef.current.close();
+            if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) wsRef.current.close();
             if (stream) stream.getTracks().forEach(t => t.stop());
         };
     }, []);
@@ -54,75 +103,35 @@ export default function CameraView({ onComplete, patientId, followupId }) {
         let timer;
         if (countdown > 0) {
             timer = setTimeout(() => setCountdown(c => c - 1), 1000);
-            captureFrame();
         } else {
             submitFinalScore();
         }
         return () => clearTimeout(timer);
     }, [countdown]);
 
-    const captureFrame = async () => {
+    const captureFrame = () => {
+        const ws = wsRef.current;
+        if (!ws || ws.readyState !== WebSocket.OPEN) return;
         if (!videoRef.current || !videoRef.current.videoWidth) return;
+        const { max_width, jpeg_quality } = paceRef.current;
         const canvas = canvasRef.current;
-        canvas.width = videoRef.current.videoWidth;
-        canvas.height = videoRef.current.videoHeight;
+        const scale = Math.min(1, max_width / videoRef.current.videoWidth);
+        canvas.width = Math.round(videoRef.current.videoWidth * scale);
+        canvas.height = Math.round(videoRef.current.videoHeight * scale);
         const ctx = canvas.getContext('2d');
         ctx.drawImage(videoRef.current, 0, 0, canvas.width, canvas.height);
-        const b64 = canvas.toDataURL('image/jpeg', 0.8);
-
-        try {
-            const payload = { image: b64 };
-            if (audioB64) payload.audio_chunk = audioB64;
-
-            const res = await fetch('http://localhost:8000/api/painscan/analyze-frame', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(payload)
-            });
-            const data = await res.json();
-            if (data.success && data.data.face_detected) {
-                setFeedback('Good... Keep still');
-                // Store complex multimodal trace instead of just scalar scores
-                setScores(prev => [...prev, data.data]);
-            } else {
-                setFeedback(data.message || 'Move closer');
-            }
-        } catch (err) {
-            console.error(err);
-        }
+        canvas.toBlob(async (blob) => {
+            if (!blob || ws.readyState !== WebSocket.OPEN) return;
+            ws.send(packet(KIND_FRAME, seqRef.current.frame++, await blob.arrayBuffer()));
+        }, 'image/jpeg', jpeg_quality);
     };
 
-    const submitFinalScore = async () => {
-        try {
-            // Aggregate multimodal scores array safely 
-            const frame_scores = scores.map(s => s.score);
-            let payload = { patient_id: patientId, followup_id: followupId, frame_scores: frame_scores };
-
-            if (scores.length > 0) {
-                const latest = scores[scores.length - 1]; // Use ultimate state trajectory
-                payload.resp_rate = latest.resp_rate;
-                payload.heart_rate = latest.heart_rate;
-                payload.cry_intensity = latest.cry_intensity;
-                payload.agitation_score = latest.agitation_score;
-                payload.risk_level = latest.risk_level;
-                payload.modalities_used = latest.modalities_used;
-            }
-
-            const res = await fetch('http://localhost:8000/api/painscan/score', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(payload)
-            });
-
-            const data = await res.json();
-            if (data.success) {
-                // Pass full multimodal doc up to Index Router
-                onComplete(data.data);
-            } else {
-                setFeedback('Failed to save multimodal score.');
-            }
-        } catch (err) {
-            console.error(err);
+    const submitFinalScore = () => {
+        // The server aggregates the session's frame results and saves them like /score
+        const ws = wsRef.current;
+        if (ws && ws.readyState === WebSocket.OPEN) {
+            ws.send(JSON.stringify({ action: 'finish' }));
+        } else {
             setFeedback('Error connecting to server.');
         }
     };
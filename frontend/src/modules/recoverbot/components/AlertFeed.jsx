@@ -58,8 +58,16 @@ export default function AlertFeed({ wsUrl = DEFAULT_WS_URL }) {
         ws.onmessage = (e) => {
             try {
                 const data = JSON.parse(e.data);
-                if (data.type === "RISK_ALERT") {
-                    setAlerts((prev) => [{ ...data, ts: Date.now() }, ...prev].slice(0, 50));
+                // Flags are delivered by CommHub doctor alerts: one DOCTOR_ALERT for a
+                // critical flag, or a DOCTOR_DIGEST bundling the rest
+                const items = data.type === "DOCTOR_ALERT" ? [data.data]
+                    : data.type === "DOCTOR_DIGEST" ? (data.data?.alerts || [])
+                    : [];
+                const flags = items
+                    .filter((a) => a && a.channel === "followup.flagged")
+                    .map((a) => ({ ...a, risk_label: a.severity, ts: Date.now() }));
+                if (flags.length) {
+                    setAlerts((prev) => [...flags, ...prev].slice(0, 50));
                 }
             } catch { }
         };
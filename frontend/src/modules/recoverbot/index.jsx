@@ -38,6 +38,9 @@ export default function RecoverBot() {
     const [tab, setTab] = useState("followups"); // 'followups' | 'flagged' | 'alerts'
     const [followups, setFollowups] = useState([]);
     const [flagged, setFlagged] = useState([]);
+    const [cursors, setCursors] = useState({ followups: null, flagged: null });
+    // Server-side totals; the lists above only hold the pages loaded so far
+    const [counts, setCounts] = useState(null);
     const [selected, setSelected] = useState(null);
     const [loading, setLoading] = useState(false);
     const [searchQuery, setSearchQuery] = useState("");
@@ -53,14 +56,51 @@ export default function RecoverBot() {
         Promise.all([
             apiFetch(followupUrl, authToken),
             apiFetch("/api/recoverbot/risk-flagged", authToken),
+            apiFetch("/api/recoverbot/followups/counts", authToken),
         ])
-            .then(([fu, fl]) => {
-                setFollowups(fu.data ?? []);
-                setFlagged(fl.data ?? []);
+            .then(([fu, fl, ct]) => {
+                setFollowups(fu.data?.items ?? []);
+                setFlagged(fl.data?.items ?? []);
+                setCounts(ct.success ? ct.data : null);
+                setCursors({ followups: fu.data?.next_cursor ?? null, flagged: fl.data?.next_cursor ?? null });
             })
             .finally(() => setLoading(false));
     }, [authToken, patientId]);
 
+    // Lists are paginated; append the next page of either list
+    const loadMore = async (list) => {
+        const path = list === "flagged" ? "/api/recoverbot/risk-flagged" : "/api/recoverbot/followups";
+        const res = await apiFetch(`${path}?cursor=${encodeURIComponent(cursors[list])}`, authToken);
+        const setter = list === "flagged" ? setFlagged : setFollowups;
+        setter((prev) => [...prev, ...(res.data?.items ?? [])]);
+        setCursors((prev) => ({ ...prev, [list]: res.data?.next_cursor ?? null }));
+    };
+
+    // List rows are summaries; the detail view needs the conversation log and schedule
+    const selectFollowup = async (f) => {
+        setSelected(f);
+        const res = await apiFetch(`/api/recoverbot/followups/${f._id}/detail`, authToken);
+        if (res.success) setSelected(res.data);
+    };
+
+    const loadMoreButton = (list) => cursors[list] && (
+        <button
+            onClick={() => loadMore(list)}
+            style={{
+                marginTop: 12,
+                padding: "7px 14px",
+                borderRadius: 8,
+                border: "1px solid #E2E8F0",
+                background: "transparent",
+                color: "#64748B",
+                cursor: "pointer",
+                fontSize: "0.82rem",
+            }}
+        >
+            Load more
+        </button>
+    );
+
     const tabStyle = (name) => ({
         padding: "8px 18px",
         borderRadius: "8px 8px 0 0",
@@ -81,6 +121,7 @@ export default function RecoverBot() {
 
     const filteredFollowups = followups.filter(filterFn);
     const filteredFlagged = flagged.filter(filterFn);
+    const flaggedTotal = counts?.flagged ?? flagged.length;
 
     return (
         <div style={{ fontFamily: "'Inter', sans-serif", color: "#0F172A", height: "100%", overflowY: "auto", background: "#F8FAFC" }}>
@@ -108,9 +149,9 @@ export default function RecoverBot() {
                 {!loading && (
                     <div style={{ display: "flex", gap: 24, marginTop: 20 }}>
                         {[
-                            { label: "Active Follow-ups", value: followups.filter((f) => f.status === "active").length },
-                            { label: "Flagged Patients", value: flagged.length, alert: flagged.length > 0 },
-                            { label: "Completed", value: followups.filter((f) => f.status === "completed").length },
+                            { label: "Active Follow-ups", value: counts ? counts.by_status.active ?? 0 : "—" },
+                            { label: "Flagged Patients", value: flaggedTotal, alert: flaggedTotal > 0 },
+                            { label: "Completed", value: counts ? counts.by_status.completed ?? 0 : "—" },
                         ].map((s) => (
                             <div
                                 key={s.label}
@@ -138,7 +179,7 @@ export default function RecoverBot() {
                         Follow-ups
                     </button>
                     <button style={tabStyle("flagged")} onClick={() => setTab("flagged")}>
-                        🚨 Flagged{flagged.length > 0 && <span style={{ marginLeft: 6, background: "#ef4444", color: "#0F172A", borderRadius: 9999, padding: "1px 6px", fontSize: "0.65rem" }}>{flagged.length}</span>}
+                        🚨 Flagged{flaggedTotal > 0 && <span style={{ marginLeft: 6, background: "#ef4444", color: "#0F172A", borderRadius: 9999, padding: "1px 6px", fontSize: "0.65rem" }}>{flaggedTotal}</span>}
                     </button>
                     <button style={tabStyle("alerts")} onClick={() => setTab("alerts")}>
                         Live Alerts
@@ -276,7 +317,8 @@ export default function RecoverBot() {
                         }}
                     >
                         <h2 style={{ marginTop: 0, color: "#0F172A" }}>Patient Follow-ups</h2>
-                        <FollowupList followups={filteredFollowups} onSelect={setSelected} />
+                        <FollowupList followups={filteredFollowups} onSelect={selectFollowup} />
+                        {loadMoreButton("followups")}
                     </div>
                 )}
 
@@ -290,7 +332,8 @@ export default function RecoverBot() {
                         }}
                     >
                         <h2 style={{ marginTop: 0, color: "#f87171" }}>🚨 High-Risk Patients</h2>
-                        <FollowupList followups={filteredFlagged} onSelect={setSelected} />
+                        <FollowupList followups={filteredFlagged} onSelect={selectFollowup} />
+                        {loadMoreButton("flagged")}
                     </div>
                 )}
 
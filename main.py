@@ -49,6 +49,12 @@ try:
 except ImportError:
     commhub_router = None
 
+try:
+    from shared.realtime import router as realtime_router
+except Exception as e:
+    print(f"Failed to load realtime gateway: {e}")
+    realtime_router = None
+
 try:
     from patient_resolver import router as patient_router
 except Exception as e:
@@ -83,10 +89,19 @@ if commhub_router:
     app.include_router(commhub_router, prefix='/api/commhub')
 if patient_router:
     app.include_router(patient_router, prefix='/api/patient')
+if realtime_router:
+    app.include_router(realtime_router, prefix='/api/realtime')
 
 @app.on_event("startup")
 async def startup_event():
     # Database connection is initialized in shared/database.py when db is accessed
+    try:
+        from shared.realtime import start_gateway
+        await start_gateway()
+        print("✅ Realtime gateway started")
+    except Exception as e:
+        print(f"Failed to start realtime gateway: {e}")
+
     try:
         from module2_recoverbot.services.scheduler_service import start_scheduler
         from module2_recoverbot.events import start_subscribers
@@ -120,6 +135,22 @@ async def startup_event():
     except ImportError as e:
         print(f"Failed to load CommHub: {e}")
 
+    try:
+        import asyncio
+        from module1_scribe.search_index import start_search_indexer
+        asyncio.create_task(start_search_indexer())
+        print("✅ Scribe search index started")
+    except Exception as e:
+        print(f"Failed to start Scribe search index: {e}")
+
+    try:
+        import asyncio
+        from module1_scribe.similarity import start_similarity_indexer
+        asyncio.create_task(start_similarity_indexer())
+        print("✅ Scribe similar-case index started")
+    except Exception as e:
+        print(f"Failed to start Scribe similar-case index: {e}")
+
     try:
         import asyncio
         from scribe_enricher import start_enricher
@@ -128,6 +159,20 @@ async def startup_event():
     except Exception as e:
         print(f"Failed to load Scribe Enricher: {e}")
 
+    try:
+        from module3_painscan.inference_pool import start_pool
+        start_pool()
+        print("✅ PainScan inference pool started")
+    except Exception as e:
+        print(f"Failed to start PainScan inference pool: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    try:
+        from module3_painscan.inference_pool import shutdown_pool
+        shutdown_pool()
+    except Exception as e:
+        print(f"Failed to stop PainScan inference pool: {e}")
 
 
 @app.get("/")
@@ -0,0 +1,68 @@
+"""
+module1_scribe/bench_similarity.py
+Query-latency benchmark for the similar-case vector store.
+Usage: python -m module1_scribe.bench_similarity [--rows 100000] [--k 10] [--queries 200]
+
+Fills a throwaway store with random unit vectors (same dim as the hashed
+embedder / all-MiniLM-L6-v2) and times top-k cosine queries against it.
+No Mongo or Redis needed.
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from module1_scribe.similarity import HASH_DIM, VectorStore
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=HASH_DIM)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(tmp, args.dim, "bench")
+
+        t0 = time.perf_counter()
+        chunk = 10_000
+        for start in range(0, args.rows, chunk):
+            n = min(chunk, args.rows - start)
+            vecs = rng.standard_normal((n, args.dim), dtype=np.float32)
+            vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+            store.append([({"consultation_id": f"c{start + i}", "patient_id": f"p{(start + i) % 5000}"}, v)
+                          for i, v in enumerate(vecs)])
+        build_s = time.perf_counter() - t0
+
+        queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+        store.top_k(queries[0], args.k)  # warm page cache
+        latencies = []
+        for q in queries:
+            t = time.perf_counter()
+            store.top_k(q, args.k)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+        # Reference: plain Python loop over rows (what a naive per-row cosine costs)
+        sample = min(2_000, args.rows)
+        t = time.perf_counter()
+        mat = store._matrix
+        _ = sorted(((float(np.dot(mat[i], queries[0])), i) for i in range(sample)), reverse=True)[:args.k]
+        loop_ms = (time.perf_counter() - t) * 1000 * (args.rows / sample)
+
+    lat = np.array(latencies)
+    print(f"rows={args.rows:,} dim={args.dim} k={args.k} queries={args.queries}")
+    print(f"append:            {build_s:.2f}s ({args.rows / build_s:,.0f} rows/s)")
+    print(f"top-k matvec:      p50={np.percentile(lat, 50):.2f}ms  p95={np.percentile(lat, 95):.2f}ms  "
+          f"max={lat.max():.2f}ms")
+    print(f"per-row loop (est): {loop_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,15 @@ import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.responses import JSONResponse
 from datetime import datetime, timezone
+from typing import Optional
 from bson import ObjectId
 
 from shared.database import db
 from shared.models import APIResponse
 from shared.events import publish
 from .services import process_audio_chunk, generate_soap_note, map_icd_codes
+from .search_index import search_consultations
+from .similarity import find_similar
 import google.generativeai as genai
 
 router = APIRouter()
@@ -108,6 +111,17 @@ async def get_consultation(id: str):
         return APIResponse(success=False, data=None, message=str(e))
 
 
+@router.get("/consultation/{id}/similar", response_model=APIResponse)
+async def get_similar_consultations(id: str, k: int = 5, exclude_same_patient: bool = True):
+    """Top-k past consultations with the most similar assessment / plan / summary."""
+    try:
+        k = max(1, min(k, 50))
+        similar = await find_similar(id, k=k, exclude_same_patient=exclude_same_patient)
+        return APIResponse(success=True, data=similar, message=f"{len(similar)} similar case(s)")
+    except Exception as e:
+        return APIResponse(success=False, data=None, message=str(e))
+
+
 @router.get("/consultations", response_model=APIResponse)
 async def get_consultations(patient_id: str):
     try:
@@ -121,6 +135,28 @@ async def get_consultations(patient_id: str):
         return APIResponse(success=False, data=None, message=str(e))
 
 
+@router.get("/search", response_model=APIResponse)
+async def search(
+    q: str,
+    patient_id: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+):
+    """
+    Full-text search over SOAP notes, summaries, ICD codes and transcripts.
+    Field-scoped terms are supported, e.g. `assessment:pneumonia icd:J18.9 fever`.
+    Pass `next_cursor` from the previous page as `cursor` to continue.
+    """
+    try:
+        limit = max(1, min(limit, 100))
+        data = await search_consultations(q, patient_id=patient_id, doctor_id=doctor_id,
+                                          limit=limit, cursor=cursor)
+        return APIResponse(success=True, data=data, message=f"{data['total']} match(es)")
+    except Exception as e:
+        return APIResponse(success=False, data=None, message=str(e))
+
+
 @router.patch("/consultation/{id}/discharge", response_model=APIResponse)
 async def discharge_patient(id: str):
     try:
@@ -0,0 +1,319 @@
+"""
+module1_scribe/search_index.py
+In-process inverted index over consultations, backing GET /api/scribe/search.
+Built once from Mongo at startup, then kept current from consultation.completed.
+
+Only postings and light metadata live in memory; note text is fetched from Mongo
+(projected, page-sized) when building highlighted snippets.
+"""
+from __future__ import annotations
+import base64
+import json
+import math
+import re
+from collections import defaultdict
+from datetime import datetime
+
+from bson import ObjectId
+from shared.database import db
+from shared.events import subscribe
+
+# Searchable fields → path in the consultation document
+FIELD_PATHS = {
+    "assessment": ("soap_note", "assessment"),
+    "plan":       ("soap_note", "plan"),
+    "subjective": ("soap_note", "subjective"),
+    "objective":  ("soap_note", "objective"),
+    "summary":    ("summary_short",),
+    "icd":        ("icd_codes",),
+    "transcript": ("transcript",),
+}
+
+# Per-field boost applied to the BM25 score
+FIELD_WEIGHTS = {
+    "icd": 3.0,
+    "assessment": 2.0,
+    "plan": 1.5,
+    "summary": 1.5,
+    "subjective": 1.0,
+    "objective": 1.0,
+    "transcript": 0.5,
+}
+
+# Query aliases, e.g. "dx:pneumonia" == "assessment:pneumonia"
+FIELD_ALIASES = {"dx": "assessment", "icd10": "icd", "code": "icd", "summary_short": "summary"}
+
+_PROJECTION = {
+    "patient_id": 1, "doctor_id": 1, "created_at": 1, "status": 1,
+    "soap_note": 1, "summary_short": 1, "icd_codes": 1, "transcript": 1,
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+_QUERY_RE = re.compile(r'(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 160
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def _field_text(doc: dict, field: str) -> str:
+    value = doc
+    for key in FIELD_PATHS[field]:
+        value = (value or {}).get(key) if isinstance(value, dict) else None
+    if field == "icd":
+        return " ".join(
+            f"{c.get('code', '')} {c.get('description', '')}"
+            for c in (value or []) if isinstance(c, dict)
+        )
+    return value if isinstance(value, str) else ""
+
+
+def parse_query(q: str) -> list[tuple[str | None, str]]:
+    """
+    Split a query into (field, term) pairs.
+    `assessment:pneumonia icd:J18.9 "chest pain"` → scoped and unscoped terms.
+    Unknown field prefixes are treated as plain text.
+    """
+    terms: list[tuple[str | None, str]] = []
+    for prefix, quoted, bare in _QUERY_RE.findall(q or ""):
+        field = FIELD_ALIASES.get(prefix.lower(), prefix.lower()) if prefix else None
+        text = quoted or bare
+        if field and field not in FIELD_PATHS:
+            text, field = f"{prefix}:{text}", None
+        for tok in tokenize(text):
+            terms.append((field, tok))
+    return terms
+
+
+def encode_cursor(score: float, doc_id: str) -> str:
+    raw = json.dumps([round(score, 6), doc_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[float, str] | None:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(score), str(doc_id)
+    except Exception:
+        return None
+
+
+def highlight(text: str, terms: set[str], width: int = SNIPPET_CHARS) -> str | None:
+    """Return a window of `text` around the first matched term, with matches wrapped in <mark>."""
+    if not text or not terms:
+        return None
+    hits = [m for m in _TOKEN_RE.finditer(text.lower()) if m.group(0) in terms]
+    if not hits:
+        return None
+    start = max(0, hits[0].start() - width // 3)
+    end = min(len(text), start + width)
+    out, pos = [], start
+    for m in hits:
+        if m.start() < start or m.end() > end:
+            continue
+        out.append(text[pos:m.start()])
+        out.append(f"<mark>{text[m.start():m.end()]}</mark>")
+        pos = m.end()
+    out.append(text[pos:end])
+    snippet = "".join(out).strip()
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+
+class ConsultationIndex:
+    """BM25F-style inverted index: field → term → {doc_id: term frequency}."""
+
+    def __init__(self):
+        self.postings: dict[str, dict[str, dict[str, int]]] = {f: defaultdict(dict) for f in FIELD_PATHS}
+        self.doc_len: dict[str, dict[str, int]] = {f: {} for f in FIELD_PATHS}
+        self.total_len: dict[str, int] = {f: 0 for f in FIELD_PATHS}
+        # doc_id → {field: terms}, so removing a doc touches only its own postings
+        self.doc_terms: dict[str, dict[str, list[str]]] = {}
+        self.meta: dict[str, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.meta)
+
+    def add(self, doc: dict) -> None:
+        doc_id = str(doc["_id"])
+        if doc_id in self.meta:
+            self.remove(doc_id)
+        doc_terms: dict[str, list[str]] = {}
+        for field in FIELD_PATHS:
+            tokens = tokenize(_field_text(doc, field))
+            if not tokens:
+                continue
+            counts: dict[str, int] = defaultdict(int)
+            for tok in tokens:
+                counts[tok] += 1
+            for tok, tf in counts.items():
+                self.postings[field][tok][doc_id] = tf
+            doc_terms[field] = list(counts)
+            self.doc_len[field][doc_id] = len(tokens)
+            self.total_len[field] += len(tokens)
+        self.doc_terms[doc_id] = doc_terms
+        created_at = doc.get("created_at")
+        self.meta[doc_id] = {
+            "patient_id": doc.get("patient_id"),
+            "doctor_id": doc.get("doctor_id"),
+            "status": doc.get("status"),
+            "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        }
+
+    def remove(self, doc_id: str) -> None:
+        if self.meta.pop(doc_id, None) is None:
+            return
+        for field, tokens in self.doc_terms.pop(doc_id, {}).items():
+            self.total_len[field] -= self.doc_len[field].pop(doc_id, 0)
+            terms = self.postings[field]
+            for tok in tokens:
+                docs = terms.get(tok)
+                if docs is None:
+                    continue
+                docs.pop(doc_id, None)
+                if not docs:
+                    del terms[tok]
+
+    def _bm25(self, field: str, term: str) -> dict[str, float]:
+        docs = self.postings[field].get(term)
+        if not docs:
+            return {}
+        n_docs = max(1, len(self.doc_len[field]))
+        avg_len = self.total_len[field] / n_docs or 1.0
+        idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+        lengths = self.doc_len[field]
+        weight = FIELD_WEIGHTS.get(field, 1.0)
+        return {
+            doc_id: weight * idf * tf * (BM25_K1 + 1)
+            / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_id] / avg_len))
+            for doc_id, tf in docs.items()
+        }
+
+    def search(
+        self,
+        terms: list[tuple[str | None, str]],
+        patient_id: str | None = None,
+        doctor_id: str | None = None,
+    ) -> list[tuple[float, str, dict[str, set[str]]]]:
+        """
+        AND-match every term; returns [(score, doc_id, {field: matched_terms})]
+        sorted by score (rounded as in the cursor) desc, then doc_id desc, so
+        the order is exactly the keyset order pages are cut on.
+        """
+        scores: dict[str, float] | None = None
+        matched: dict[str, dict[str, set[str]]] = defaultdict(lambda: defaultdict(set))
+        for field, term in terms:
+            fields = [field] if field else list(FIELD_PATHS)
+            term_scores: dict[str, float] = defaultdict(float)
+            for f in fields:
+                for doc_id, s in self._bm25(f, term).items():
+                    term_scores[doc_id] += s
+                    matched[doc_id][f].add(term)
+            if scores is None:
+                scores = dict(term_scores)
+            else:
+                scores = {d: scores[d] + s for d, s in term_scores.items() if d in scores}
+            if not scores:
+                return []
+
+        results = []
+        for doc_id, score in (scores or {}).items():
+            meta = self.meta.get(doc_id, {})
+            if patient_id and meta.get("patient_id") != patient_id:
+                continue
+            if doctor_id and meta.get("doctor_id") != doctor_id:
+                continue
+            results.append((score, doc_id, matched[doc_id]))
+        results.sort(key=lambda r: (round(r[0], 6), r[1]), reverse=True)
+        return results
+
+
+index = ConsultationIndex()
+
+
+async def search_consultations(
+    q: str,
+    patient_id: str | None = None,
+    doctor_id: str | None = None,
+    limit: int = 20,
+    cursor: str | None = None,
+) -> dict:
+    """Rank, paginate and highlight. Only the returned page is read back from Mongo."""
+    terms = parse_query(q)
+    if not terms:
+        return {"results": [], "total": 0, "next_cursor": None}
+
+    ranked = index.search(terms, patient_id=patient_id, doctor_id=doctor_id)
+    total = len(ranked)
+
+    after = decode_cursor(cursor) if cursor else None
+    if after:
+        a_score, a_id = after
+        ranked = [r for r in ranked if (round(r[0], 6), r[1]) < (a_score, a_id)]
+
+    page = ranked[:limit]
+    next_cursor = encode_cursor(page[-1][0], page[-1][1]) if len(ranked) > limit else None
+
+    snippet_fields = {f for _, _, m in page for f in m}
+    projection = {"soap_note": 1, "summary_short": 1, "icd_codes": 1}
+    if "transcript" in snippet_fields:
+        projection["transcript"] = 1
+    docs = {}
+    if page:
+        cursor_ = db.consultations.find(
+            {"_id": {"$in": [ObjectId(doc_id) for _, doc_id, _ in page]}}, projection
+        )
+        async for doc in cursor_:
+            docs[str(doc["_id"])] = doc
+
+    results = []
+    for score, doc_id, fields in page:
+        doc = docs.get(doc_id, {})
+        highlights = {}
+        for field, field_terms in fields.items():
+            snippet = highlight(_field_text(doc, field), field_terms)
+            if snippet:
+                highlights[field] = snippet
+        results.append({
+            "consultation_id": doc_id,
+            **index.meta.get(doc_id, {}),
+            "score": round(score, 4),
+            "summary_short": doc.get("summary_short"),
+            "icd_codes": [c.get("code") for c in doc.get("icd_codes", []) if isinstance(c, dict)],
+            "highlights": highlights,
+        })
+
+    return {"results": results, "total": total, "next_cursor": next_cursor}
+
+
+async def index_consultation(consultation_id: str) -> None:
+    doc = await db.consultations.find_one({"_id": ObjectId(consultation_id)}, _PROJECTION)
+    if doc:
+        index.add(doc)
+
+
+async def build_index() -> int:
+    async for doc in db.consultations.find({}, _PROJECTION):
+        index.add(doc)
+    return len(index)
+
+
+async def start_search_indexer():
+    """Load all consultations into the index, then follow consultation.completed."""
+    try:
+        count = await build_index()
+        print(f"[ScribeSearch] Indexed {count} consultations")
+    except Exception as e:
+        print(f"[ScribeSearch] Initial build failed: {e}")
+
+    async for event in subscribe("consultation.completed"):
+        try:
+            consultation_id = event.get("consultation_id")
+            if consultation_id:
+                await index_consultation(consultation_id)
+        except Exception as e:
+            print(f"[ScribeSearch] Index update error: {e}")
@@ -0,0 +1,343 @@
+"""
+module1_scribe/similarity.py
+Similar-case retrieval for consultations.
+
+Each consultation's assessment / plan / summary_short is embedded on CPU and
+stored as one L2-normalised float32 row in a memory-mapped matrix on disk.
+A top-k cosine query is a single matrix-vector product over that matrix.
+
+Embedding model: sentence-transformers (SCRIBE_EMBED_MODEL, default
+all-MiniLM-L6-v2) when installed, otherwise a hashed uni/bi-gram embedding
+that needs no model download. The store records which one produced it and is
+rebuilt if that changes.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import fcntl
+import json
+import logging
+import os
+import pathlib
+import re
+import threading
+import zlib
+
+import numpy as np
+from bson import ObjectId
+from shared.database import db
+from shared.events import subscribe
+
+logger = logging.getLogger(__name__)
+
+VECTOR_DIR = pathlib.Path(os.getenv("SCRIBE_VECTOR_DIR", pathlib.Path(__file__).parent / "vectors"))
+EMBED_MODEL = os.getenv("SCRIBE_EMBED_MODEL", "all-MiniLM-L6-v2")
+HASH_DIM = 384
+_INITIAL_CAPACITY = 1024
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:\.[a-z0-9]+)*")
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:
+    SentenceTransformer = None
+    logger.warning("sentence-transformers not installed; using hashed embeddings for similar cases")
+
+
+# ─── Embedding ────────────────────────────────────────────────────────────────
+
+class HashingEmbedder:
+    """Signed feature hashing of unigrams + bigrams with sublinear tf. Deterministic across processes."""
+
+    name = f"hash-ngram-{HASH_DIM}"
+    dim = HASH_DIM
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            toks = _TOKEN_RE.findall((text or "").lower())
+            grams = toks + [f"{a} {b}" for a, b in zip(toks, toks[1:])]
+            if not grams:
+                continue
+            h = np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint32, count=len(grams))
+            idx = (h % self.dim).astype(np.intp)
+            sign = np.where(h & 0x80000000, -1.0, 1.0).astype(np.float32)
+            np.add.at(out[row], idx, sign)
+        # Sublinear tf, then L2 normalise
+        out = np.sign(out) * np.log1p(np.abs(out))
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).astype(np.float32)
+
+
+class TransformerEmbedder:
+    def __init__(self, model_name: str):
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.name = model_name
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        vecs = self._model.encode(texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False)
+        return np.ascontiguousarray(vecs, dtype=np.float32)
+
+
+_embedder = None
+
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        if SentenceTransformer is not None:
+            try:
+                _embedder = TransformerEmbedder(EMBED_MODEL)
+            except Exception as e:
+                logger.error(f"Failed to load {EMBED_MODEL}, falling back to hashed embeddings: {e}")
+        if _embedder is None:
+            _embedder = HashingEmbedder()
+    return _embedder
+
+
+def consultation_text(doc: dict) -> str:
+    soap = doc.get("soap_note") or {}
+    parts = [soap.get("assessment", ""), soap.get("plan", ""), doc.get("summary_short", "")]
+    return "\n".join(p for p in parts if isinstance(p, str) and p)
+
+
+# ─── Vector store ─────────────────────────────────────────────────────────────
+
+class VectorStore:
+    """
+    Append-only float32 matrix (`vectors.f32`) plus a JSON-lines sidecar (`rows.jsonl`)
+    mapping row → consultation. Capacity doubles when full. Appends take an flock so
+    several workers can share one directory; readers pick up rows written by others
+    via refresh().
+
+    Construction, refresh() and append() block on the flock and on file I/O, so the
+    async service API below always runs them via asyncio.to_thread; a thread lock
+    keeps those calls from interleaving within one process.
+    """
+
+    def __init__(self, directory: pathlib.Path, dim: int, model_name: str):
+        self.dir = pathlib.Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dim = dim
+        self.model_name = model_name
+        self.vec_path = self.dir / "vectors.f32"
+        self.rows_path = self.dir / "rows.jsonl"
+        self.meta_path = self.dir / "meta.json"
+        self.lock_path = self.dir / ".lock"
+
+        self.rows: list[dict] = []
+        self.row_of: dict[str, int] = {}
+        self._rows_offset = 0
+        self._matrix: np.memmap | None = None
+        self._mutex = threading.RLock()
+
+        with self._locked():
+            self._check_meta()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._mutex, open(self.lock_path, "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _check_meta(self) -> None:
+        meta = json.loads(self.meta_path.read_text()) if self.meta_path.exists() else None
+        if meta == {"model": self.model_name, "dim": self.dim}:
+            return
+        if meta is not None:
+            print(f"[ScribeSimilar] Embedder changed ({meta} → {self.model_name}); rebuilding store")
+        for p in (self.vec_path, self.rows_path):
+            if p.exists():
+                p.unlink()
+        self.meta_path.write_text(json.dumps({"model": self.model_name, "dim": self.dim}))
+
+    def _capacity(self) -> int:
+        size = self.vec_path.stat().st_size if self.vec_path.exists() else 0
+        return size // (4 * self.dim)
+
+    def _map(self) -> None:
+        cap = self._capacity()
+        self._matrix = np.memmap(self.vec_path, dtype=np.float32, mode="r+", shape=(cap, self.dim)) if cap else None
+
+    def refresh(self) -> None:
+        """Pick up rows appended by this or another process since the last call."""
+        with self._mutex:
+            if self.rows_path.exists():
+                with open(self.rows_path, "r") as f:
+                    f.seek(self._rows_offset)
+                    for line in f:
+                        if not line.endswith("\n"):
+                            break
+                        self._rows_offset += len(line.encode())
+                        row = json.loads(line)
+                        self.row_of[row["consultation_id"]] = len(self.rows)
+                        self.rows.append(row)
+            if self._matrix is None or self._matrix.shape[0] < len(self.rows):
+                self._map()
+
+    def _ensure_capacity(self, n: int) -> None:
+        cap = self._capacity()
+        if cap >= n:
+            return
+        new_cap = max(_INITIAL_CAPACITY, cap)
+        while new_cap < n:
+            new_cap *= 2
+        with open(self.vec_path, "ab") as f:
+            f.truncate(new_cap * self.dim * 4)
+        self._map()
+
+    def append(self, items: list[tuple[dict, np.ndarray]]) -> int:
+        """Append (row_meta, vector) pairs, skipping consultations already stored. Returns rows added."""
+        with self._locked():
+            self.refresh()
+            fresh = [(m, v) for m, v in items if m["consultation_id"] not in self.row_of]
+            if not fresh:
+                return 0
+            start = len(self.rows)
+            self._ensure_capacity(start + len(fresh))
+            self._matrix[start:start + len(fresh)] = np.stack([v for _, v in fresh])
+            self._matrix.flush()
+            with open(self.rows_path, "a") as f:
+                for meta, _ in fresh:
+                    f.write(json.dumps(meta) + "\n")
+            self.refresh()
+            return len(fresh)
+
+    def vector(self, consultation_id: str) -> np.ndarray | None:
+        row = self.row_of.get(consultation_id)
+        return None if row is None else np.array(self._matrix[row])
+
+    def top_k(self, query: np.ndarray, k: int, exclude: set[str] | None = None) -> list[tuple[int, float]]:
+        """Cosine top-k over all rows: one matvec + argpartition."""
+        n = len(self.rows)
+        if n == 0:
+            return []
+        scores = self._matrix[:n] @ query.astype(np.float32, copy=False)
+        drop = [self.row_of[c] for c in (exclude or ()) if c in self.row_of]
+        if drop:
+            scores[drop] = -np.inf
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if np.isfinite(scores[i])]
+
+
+_store: VectorStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> VectorStore:
+    """Blocking (first call opens the store under its flock); from async code use _get_store()."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            emb = get_embedder()
+            _store = VectorStore(VECTOR_DIR, emb.dim, emb.name)
+    return _store
+
+
+async def _get_store() -> VectorStore:
+    return _store if _store is not None else await asyncio.to_thread(get_store)
+
+
+# ─── Service API ──────────────────────────────────────────────────────────────
+
+_PROJECTION = {"patient_id": 1, "soap_note": 1, "summary_short": 1}
+
+
+async def _embed(texts: list[str]) -> np.ndarray:
+    # Encoding is CPU-bound; keep it off the event loop
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, get_embedder().encode, texts)
+
+
+async def add_consultations(docs: list[dict]) -> int:
+    store = await _get_store()
+    docs = [d for d in docs if str(d["_id"]) not in store.row_of and consultation_text(d)]
+    if not docs:
+        return 0
+    vecs = await _embed([consultation_text(d) for d in docs])
+    items = [({"consultation_id": str(d["_id"]), "patient_id": d.get("patient_id")}, v)
+             for d, v in zip(docs, vecs)]
+    # flock + memmap resize/write: off the event loop
+    return await asyncio.to_thread(store.append, items)
+
+
+async def find_similar(consultation_id: str, k: int = 5, exclude_same_patient: bool = True) -> list[dict]:
+    store = await _get_store()
+    await asyncio.to_thread(store.refresh)
+
+    query = store.vector(consultation_id)
+    source = await db.consultations.find_one({"_id": ObjectId(consultation_id)}, _PROJECTION)
+    if source is None:
+        return []
+    if query is None:
+        query = (await _embed([consultation_text(source)]))[0]
+
+    exclude = {consultation_id}
+    patient_id = source.get("patient_id")
+    # Over-fetch so that filtering out the same patient still leaves k results
+    hits = store.top_k(query, k * 3 if exclude_same_patient else k, exclude=exclude)
+    if exclude_same_patient and patient_id:
+        hits = [(r, s) for r, s in hits if store.rows[r].get("patient_id") != patient_id]
+    hits = hits[:k]
+
+    ids = [store.rows[r]["consultation_id"] for r, _ in hits]
+    docs = {}
+    async for doc in db.consultations.find(
+        {"_id": {"$in": [ObjectId(i) for i in ids]}},
+        {"patient_id": 1, "summary_short": 1, "soap_note.assessment": 1, "soap_note.plan": 1,
+         "icd_codes": 1, "created_at": 1},
+    ):
+        doc["_id"] = str(doc["_id"])
+        docs[doc["_id"]] = doc
+
+    return [
+        {**docs[cid], "consultation_id": cid, "similarity": round(score, 4)}
+        for cid, (_, score) in zip(ids, hits) if cid in docs
+    ]
+
+
+async def backfill(batch_size: int = 256) -> int:
+    """Embed any consultations not yet in the store (first run, or after a model change)."""
+    store = await _get_store()
+    added, batch = 0, []
+    async for doc in db.consultations.find({}, _PROJECTION):
+        if str(doc["_id"]) in store.row_of:
+            continue
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            added += await add_consultations(batch)
+            batch = []
+    if batch:
+        added += await add_consultations(batch)
+    return added
+
+
+async def start_similarity_indexer():
+    """Backfill the vector store, then append on every consultation.completed."""
+    try:
+        added = await backfill()
+        print(f"[ScribeSimilar] Store ready: {len(await _get_store())} vectors ({added} new) using {get_embedder().name}")
+    except Exception as e:
+        print(f"[ScribeSimilar] Backfill failed: {e}")
+
+    async for event in subscribe("consultation.completed"):
+        try:
+            consultation_id = event.get("consultation_id")
+            if not consultation_id:
+                continue
+            doc = await db.consultations.find_one({"_id": ObjectId(consultation_id)}, _PROJECTION)
+            if doc:
+                await add_consultations([doc])
+        except Exception as e:
+            print(f"[ScribeSimilar] Index update error: {e}")
@@ -0,0 +1,61 @@
+"""
+module2_recoverbot/bench_risk_model.py
+Compare the compiled forest against sklearn predict_proba.
+Usage: python -m module2_recoverbot.bench_risk_model
+
+Checks that both give the same probabilities, then times 1 to 100k rows
+for sklearn, the compiled walk, and score_risk_batch (which picks between them
+at risk_service.COMPILED_MAX_ROWS). The compiled walk only wins on small
+batches; the larger rows show where sklearn takes over.
+"""
+import time
+
+import numpy as np
+
+from module2_recoverbot.services import risk_service
+
+
+def _random_rows(n: int, rng) -> np.ndarray:
+    return np.column_stack([
+        rng.integers(0, 11, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(0, 2, n),
+        rng.integers(1, 15, n),
+        rng.integers(1, 90, n),
+        rng.integers(1, 4, n),
+    ]).astype(np.float32)
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    model = risk_service._get_production()
+    compiled, clf = model.compiled, model.clf
+
+    check = _random_rows(5_000, rng)
+    max_diff = np.abs(clf.predict_proba(check) - compiled.predict_proba(check)).max()
+    print(f"max |p_sklearn - p_compiled| over 5k rows: {max_diff:.2e}")
+
+    print(f"{'rows':>8} {'sklearn ms':>12} {'sklearn loop ms':>16} {'compiled ms':>12} {'batch api ms':>13}")
+    for n, repeat in ((1, 50), (64, 20), (risk_service.COMPILED_MAX_ROWS, 10), (1_000, 10), (100_000, 3)):
+        X = _random_rows(n, rng)
+        sk = _time(lambda: clf.predict_proba(X), repeat)
+        # What score_risk did per patient before: one predict_proba per row
+        loop_n = min(n, 200)
+        sk_loop = _time(lambda: [clf.predict_proba(X[i:i + 1]) for i in range(loop_n)], 1) * n / loop_n
+        comp = _time(lambda: compiled.predict_proba(X), repeat)
+        api = _time(lambda: risk_service.score_risk_batch(X), repeat)
+        print(f"{n:>8,} {sk:>12.2f} {sk_loop:>16.1f} {comp:>12.2f} {api:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
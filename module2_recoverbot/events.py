@@ -1,11 +1,12 @@
 """
 module2_recoverbot/events.py
 Redis event handlers for Module 2.
-Subscribed channels: patient.discharged
+Subscribed channels: patient.discharged, risk_model.changed
 Published channels:  followup.flagged
 """
 import asyncio
 from shared.events import subscribe
+from .services import risk_service
 from .services.followup_service import create_followup
 
 
@@ -27,7 +28,23 @@ async def _listen_patient_discharged():
     async for payload in subscribe("patient.discharged"):
         await handle_patient_discharged(payload)
 
+async def _reload_risk_models() -> None:
+    try:
+        await asyncio.to_thread(risk_service.reload_models)
+    except Exception as e:
+        print(f"[recoverbot:events] Risk model reload failed: {e}")
+
+
+async def _listen_risk_model_changed():
+    async for payload in subscribe("risk_model.changed"):
+        print(f"[recoverbot:events] risk_model.changed: {payload}")
+        await _reload_risk_models()
+
+
 async def start_subscribers() -> None:
     """Start all background subscriber tasks. Called in @app.on_event('startup')."""
     asyncio.create_task(_listen_patient_discharged())
-    print("[recoverbot:events] Subscribed to patient.discharged")
+    asyncio.create_task(_listen_risk_model_changed())
+    # Load (and checksum) the production model now rather than on the first reply
+    asyncio.create_task(_reload_risk_models())
+    print("[recoverbot:events] Subscribed to patient.discharged, risk_model.changed")
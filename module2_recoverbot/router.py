@@ -7,49 +7,22 @@ from __future__ import annotations
 import asyncio
 import json
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
 
 from bson import ObjectId
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Form
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, Form
 from fastapi.responses import JSONResponse
 
 from shared.auth import get_current_user
 from shared.database import db
 from shared.models import APIResponse
-from .services import followup_service
+from shared.events import publish
+from shared.realtime import serve as serve_realtime
+from .services import cadence_service, conversation_memory, feature_store, followup_queries, followup_service, model_registry, risk_service, scheduler_service
 
 router = APIRouter()
 
 
-# ─── WebSocket Alert Manager ─────────────────────────────────────────────────
-
-class AlertManager:
-    def __init__(self):
-        self.connections: list[WebSocket] = []
-
-    async def connect(self, ws: WebSocket):
-        await ws.accept()
-        self.connections.append(ws)
-
-    def disconnect(self, ws: WebSocket):
-        if ws in self.connections:
-            self.connections.remove(ws)
-
-    async def broadcast(self, payload: dict):
-        dead = []
-        for ws in self.connections:
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
-
-
-ws_manager = AlertManager()
-followup_service.ws_manager = ws_manager  # inject into service layer
-
-
 # ─── REST Endpoints ───────────────────────────────────────────────────────────
 
 @router.post("/start", response_model=APIResponse)
@@ -87,6 +60,16 @@ async def _attach_patient_names(docs: list[dict]) -> list[dict]:
     return docs
 
 
+@router.get("/followups/counts", response_model=APIResponse)
+async def get_followup_counts(
+    doctor_id: Optional[str] = None,
+    _user: dict = Depends(get_current_user),
+):
+    """Totals over all followups (by status, by risk, flagged) for dashboard stats; lists are paginated."""
+    counts = await followup_queries.followup_counts(doctor_id=doctor_id)
+    return APIResponse(success=True, data=counts, message=f"{counts['total']} followup(s)")
+
+
 @router.get("/followups/{patient_id}", response_model=APIResponse)
 async def get_followups(
     patient_id: str,
@@ -102,34 +85,263 @@ async def get_followups(
     return APIResponse(success=True, data=docs, message=f"{len(docs)} followup(s) found")
 
 
+def _split(value: Optional[str]) -> list[str] | None:
+    return [v.strip() for v in value.split(",") if v.strip()] if value else None
+
+
+async def _followup_page(**query) -> dict:
+    try:
+        return await followup_queries.list_followups(**query)
+    except followup_queries.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/followups", response_model=APIResponse)
 async def get_all_followups(
+    status: Optional[str] = None,
+    risk: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    limit: int = followup_queries.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
     _user: dict = Depends(get_current_user),
 ):
-    """Return ALL followup documents — used by the dashboard with no patient filter."""
-    cursor = db.followups.find({}).sort("created_at", -1)
-    docs = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        docs.append(doc)
-    docs = await _attach_patient_names(docs)
-    return APIResponse(success=True, data=docs, message=f"{len(docs)} followup(s) found")
+    """
+    Followup summaries for the dashboard, newest first, one page at a time.
+    Filters: status, risk (comma-separated labels), doctor_id. Pass next_cursor back as cursor.
+    """
+    page = await _followup_page(status=status, risk_labels=_split(risk), doctor_id=doctor_id,
+                                limit=limit, cursor=cursor)
+    return APIResponse(success=True, data=page, message=f"{len(page['items'])} followup(s) found")
+
+
+@router.get("/followups/{followup_id}/detail", response_model=APIResponse)
+async def get_followup_detail(
+    followup_id: str,
+    _user: dict = Depends(get_current_user),
+):
+    """Full followup document (conversation log, check-in schedule) for the detail view."""
+    doc = await followup_queries.followup_detail(followup_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Followup not found")
+    return APIResponse(success=True, data=doc, message="Followup fetched")
+
+
+@router.get("/features/stats", response_model=APIResponse)
+async def get_feature_extraction_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """How many symptom updates were resolved by local rules vs. the LLM on this worker."""
+    return APIResponse(success=True, data=feature_store.extraction_stats, message="Extraction stats")
+
+
+@router.get("/summary/stats", response_model=APIResponse)
+async def get_summary_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """Rolling conversation summary updates, turns folded and failures on this worker."""
+    return APIResponse(success=True, data=conversation_memory.summary_stats, message="Summary stats")
+
+
+@router.get("/features/{followup_id}", response_model=APIResponse)
+async def get_feature_history(
+    followup_id: str,
+    limit: int = 100,
+    _user: dict = Depends(get_current_user),
+):
+    """Symptom feature changes for a followup, oldest first, with per-field source."""
+    docs = await feature_store.feature_history(followup_id, limit=max(1, min(limit, 500)))
+    return APIResponse(success=True, data=docs, message=f"{len(docs)} feature update(s)")
 
 
 @router.get("/risk-flagged", response_model=APIResponse)
 async def get_risk_flagged(
+    status: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    limit: int = followup_queries.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
     _user: dict = Depends(get_current_user),
 ):
-    """List all HIGH / CRITICAL patients for the doctor dashboard."""
-    cursor = db.followups.find(
-        {"risk_label": {"$in": ["HIGH", "CRITICAL"]}}
-    ).sort("created_at", -1)
-    docs = []
-    async for doc in cursor:
-        doc["_id"] = str(doc["_id"])
-        docs.append(doc)
-    docs = await _attach_patient_names(docs)
-    return APIResponse(success=True, data=docs, message=f"{len(docs)} flagged patient(s)")
+    """HIGH / CRITICAL followups for the doctor dashboard, paginated like /followups."""
+    page = await _followup_page(status=status, risk_labels=["HIGH", "CRITICAL"], doctor_id=doctor_id,
+                                limit=limit, cursor=cursor)
+    return APIResponse(success=True, data=page, message=f"{len(page['items'])} flagged patient(s)")
+
+
+@router.get("/followups/cache/stats", response_model=APIResponse)
+async def get_followup_cache_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """List-page cache hits and misses on this worker."""
+    return APIResponse(
+        success=True,
+        data=followup_queries.cache_summary(),
+        message="Followup list cache stats",
+    )
+
+
+@router.get("/scheduler/stats", response_model=APIResponse)
+async def get_scheduler_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """Most recent check-in dispatch batch: size, outcome counts and duration."""
+    stats = scheduler_service.last_dispatch_stats
+    return APIResponse(
+        success=True,
+        data=stats or None,
+        message="Dispatch stats" if stats else "No batch dispatched by this worker yet",
+    )
+
+
+@router.get("/risk/rescore/stats", response_model=APIResponse)
+async def get_rescore_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """Most recent nightly risk re-score: rows scored, changed, escalated and duration."""
+    stats = followup_service.last_rescore_stats
+    return APIResponse(
+        success=True,
+        data=stats or None,
+        message="Re-score stats" if stats else "No re-score run by this worker yet",
+    )
+
+
+@router.post("/risk/rescore", response_model=APIResponse)
+async def trigger_rescore(
+    _user: dict = Depends(get_current_user),
+):
+    """Run the nightly re-score now."""
+    stats = await followup_service.rescore_active_followups()
+    return APIResponse(success=True, data=stats, message="Re-score complete")
+
+
+# ─── Risk model registry ─────────────────────────────────────────────────────
+
+@router.get("/risk/models", response_model=APIResponse)
+async def list_risk_models(
+    _user: dict = Depends(get_current_user),
+):
+    """Registered versions, what registry.json points at, and what this worker has loaded."""
+    return APIResponse(
+        success=True,
+        data={
+            "pointers": model_registry.read_pointers(),
+            "loaded": risk_service.active_versions(),
+            "versions": model_registry.list_versions(),
+        },
+    )
+
+
+async def _set_model_pointer(role: str, version: str | None) -> dict:
+    try:
+        pointers = await asyncio.to_thread(model_registry.set_pointer, role, version)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    # Every worker (this one included) reloads on the event
+    await publish("risk_model.changed", pointers)
+    return pointers
+
+
+@router.post("/risk/models/{version}/shadow", response_model=APIResponse)
+async def shadow_risk_model(
+    version: str,
+    _user: dict = Depends(get_current_user),
+):
+    """Score every request with this version alongside production, without using its output."""
+    pointers = await _set_model_pointer("candidate", version)
+    return APIResponse(success=True, data=pointers, message=f"{version} loading as shadow candidate")
+
+
+@router.delete("/risk/models/shadow", response_model=APIResponse)
+async def clear_shadow_risk_model(
+    _user: dict = Depends(get_current_user),
+):
+    pointers = await _set_model_pointer("candidate", None)
+    return APIResponse(success=True, data=pointers, message="Shadow candidate cleared")
+
+
+@router.post("/risk/models/{version}/promote", response_model=APIResponse)
+async def promote_risk_model(
+    version: str,
+    _user: dict = Depends(get_current_user),
+):
+    """Make a version production (also how to roll back to an older one)."""
+    pointers = await _set_model_pointer("production", version)
+    return APIResponse(success=True, data=pointers, message=f"{version} promoted to production")
+
+
+@router.get("/risk/shadow", response_model=APIResponse)
+async def get_shadow_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """Production vs shadow candidate agreement on this worker since the pair was loaded."""
+    return APIResponse(success=True, data=risk_service.shadow_summary())
+
+
+@router.post("/followups/{followup_id}/outcome", response_model=APIResponse)
+async def record_followup_outcome(
+    followup_id: str,
+    outcome_label: str,
+    user: dict = Depends(get_current_user),
+):
+    """Record the clinician-confirmed outcome (LOW/MEDIUM/HIGH/CRITICAL); used as training label."""
+    label = outcome_label.upper()
+    if label not in ("LOW", "MEDIUM", "HIGH", "CRITICAL"):
+        raise HTTPException(status_code=400, detail="outcome_label must be LOW, MEDIUM, HIGH or CRITICAL")
+    try:
+        oid = ObjectId(followup_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid followup_id")
+    result = await db.followups.update_one(
+        {"_id": oid},
+        {"$set": {"outcome_label": label, "outcome_recorded_at": datetime.utcnow(),
+                  "outcome_recorded_by": user.get("id") or user.get("sub")}},
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Followup not found")
+    return APIResponse(success=True, data={"followup_id": followup_id, "outcome_label": label})
+
+
+@router.post("/followups/{followup_id}/complete", response_model=APIResponse)
+async def complete_followup(
+    followup_id: str,
+    _user: dict = Depends(get_current_user),
+):
+    """Close a followup; its remaining check-ins are cancelled."""
+    try:
+        ObjectId(followup_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid followup_id")
+    change = await followup_service.complete_followup(followup_id)
+    if change is None:
+        return APIResponse(success=True, data=None, message="Followup not found or already completed")
+    return APIResponse(success=True, data=change, message=f"Completed, {change['cancelled']} check-ins cancelled")
+
+
+@router.get("/cadence/stats", response_model=APIResponse)
+async def get_cadence_stats(
+    days: int = 14,
+    _user: dict = Depends(get_current_user),
+):
+    """Per-day cadence changes and net check-in messages saved by the adaptive cadence."""
+    stats = await cadence_service.cadence_stats(days=min(max(days, 1), 90))
+    return APIResponse(success=True, data=stats)
+
+
+@router.get("/reply/timings", response_model=APIResponse)
+async def get_reply_timings(
+    _user: dict = Depends(get_current_user),
+):
+    """p50 / p95 per reply-pipeline stage over the last 500 replies handled by this worker."""
+    import numpy as np
+    data = {
+        stage: {
+            "count": len(samples),
+            "p50_ms": round(float(np.percentile(samples, 50)), 1),
+            "p95_ms": round(float(np.percentile(samples, 95)), 1),
+        }
+        for stage, samples in followup_service.reply_timings.items() if samples
+    }
+    return APIResponse(success=True, data=data, message=f"{len(data)} stage(s)")
 
 
 @router.post("/webhook/twilio")
@@ -161,16 +373,12 @@ async def twilio_webhook(
 # ─── WebSocket ────────────────────────────────────────────────────────────────
 
 @router.websocket("/ws/alerts")
-async def websocket_alerts(ws: WebSocket):
+async def websocket_alerts(ws: WebSocket, topics: Optional[str] = None, doctor_id: Optional[str] = None):
     """
-    Real-time alert stream for the doctor dashboard.
-    Clients connect here; they receive JSON alerts when patients are flagged.
+    Real-time alert stream for the doctor dashboard, served by the shared realtime
+    gateway (see shared/realtime.py; /api/realtime/ws is the multiplexed endpoint).
+    Without `topics` the socket receives every topic, as it always has.
     No JWT for WebSocket simplicity — add token query param check if needed.
     """
-    await ws_manager.connect(ws)
-    try:
-        while True:
-            # Keep connection alive; server pushes data
-            await ws.receive_text()
-    except WebSocketDisconnect:
-        ws_manager.disconnect(ws)
+    wanted = {t.strip() for t in (topics or "").split(",") if t.strip()} or {"*"}
+    await serve_realtime(ws, wanted, doctor_id)
@@ -0,0 +1,20 @@
+"""
+module2_recoverbot/services/background.py
+Fire-and-forget tasks started from request paths (post-reply alerts,
+reschedules, summary updates).
+
+The event loop only keeps weak references to tasks, so a task nobody holds
+can be garbage-collected before it finishes; spawn() keeps each one in a set
+until it is done.
+"""
+from __future__ import annotations
+import asyncio
+
+_tasks: set[asyncio.Task] = set()
+
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
@@ -0,0 +1,184 @@
+"""
+module2_recoverbot/services/cadence_service.py
+Risk-adaptive check-in cadence.
+
+Each followup runs on one cadence tier. A reply that moves it to a different
+tier cancels its remaining pending slots and schedules the tier's offsets that
+are still in the future (offsets are hours after discharge, like
+CHECKIN_OFFSETS_HOURS). Stable LOW patients are thinned out, rising risk gets
+tighter check-ins, and completing a followup cancels whatever is left.
+Every change is logged to `cadence_changes` with the net number of messages
+it saved (negative when tightening), aggregated per day by cadence_stats().
+
+Slot numbers are reserved atomically by appending the new entries to the
+followup's checkin_schedule in one update, so concurrent reschedules never
+reuse an index. The new slots are inserted before the old pending ones are
+cancelled, and only slots numbered below the reservation are cancelled, so a
+failed reschedule leaves the previous cadence in place.
+"""
+from __future__ import annotations
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import BulkWriteError
+from shared.database import db
+from .scheduler_service import (
+    CHECKIN_OFFSETS_HOURS, cancel_pending_slots, schedule_checkins, schedule_entries,
+)
+
+# Offsets (hours after discharge) per tier
+CADENCE_PLANS = {
+    "thin": [24, 72, 24 * 7, 24 * 14],
+    "standard": CHECKIN_OFFSETS_HOURS,
+    "tight": [6, 12, 24, 36, 48, 72, 120, 24 * 7, 24 * 14],
+    "intensive": [4, 8, 12, 18, 24, 36, 48, 72, 120, 24 * 7, 24 * 14],
+}
+
+# Tightened tiers check in again within this many hours, even between plan offsets
+FIRST_CHECKIN_WITHIN_HOURS = {"tight": 6, "intensive": 3}
+
+# Consecutive LOW replies before a followup is thinned out
+STABLE_LOW_REPLIES = int(os.getenv("CADENCE_STABLE_LOW_REPLIES", "2"))
+# Earliest a newly scheduled slot may fall after a reschedule
+MIN_LEAD = timedelta(hours=float(os.getenv("CADENCE_MIN_LEAD_HOURS", "2")))
+
+_indexes_ready = False
+
+
+def cadence_tier(risk_label: str, low_streak: int) -> str:
+    if risk_label == "CRITICAL":
+        return "intensive"
+    if risk_label == "HIGH":
+        return "tight"
+    if risk_label == "LOW" and low_streak >= STABLE_LOW_REPLIES:
+        return "thin"
+    return "standard"
+
+
+def remaining_offsets(tier: str, created_at: datetime, now: datetime | None = None) -> list[float]:
+    """
+    The tier's offsets that still lie at least MIN_LEAD in the future; tightened
+    tiers also get a slot within FIRST_CHECKIN_WITHIN_HOURS if the plan has none.
+    """
+    now = now or datetime.utcnow()
+    earliest = now + MIN_LEAD
+    offsets = [h for h in CADENCE_PLANS[tier] if created_at + timedelta(hours=h) >= earliest]
+    within = FIRST_CHECKIN_WITHIN_HOURS.get(tier)
+    if within is not None:
+        elapsed_h = (now - created_at).total_seconds() / 3600
+        first = round(elapsed_h + max(within, MIN_LEAD.total_seconds() / 3600), 2)
+        if not offsets or offsets[0] > first:
+            offsets.insert(0, first)
+    return offsets
+
+
+async def ensure_indexes() -> None:
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.cadence_changes.create_index([("created_at", ASCENDING)])
+        _indexes_ready = True
+
+
+async def _reserve_slots(followup_id: str, entries: list[dict]) -> int:
+    """
+    Append entries to the followup's checkin_schedule in one atomic update and
+    return the index of the first one; their positions are their slot numbers.
+    """
+    doc = await db.followups.find_one_and_update(
+        {"_id": ObjectId(followup_id)},
+        [
+            {"$set": {"checkin_schedule": {"$concatArrays": [{"$ifNull": ["$checkin_schedule", []]}, entries]}}},
+            {"$set": {"checkin_schedule_size": {"$size": "$checkin_schedule"}}},
+        ],
+        projection={"checkin_schedule_size": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if doc is None:
+        raise LookupError(f"followup {followup_id} not found")
+    return doc["checkin_schedule_size"] - len(entries)
+
+
+async def apply_cadence(followup: dict, new_tier: str, reason: str) -> dict | None:
+    """
+    Move a followup to new_tier if it is not already there.
+    followup needs _id, patient_id, created_at, cadence (its checkin_schedule may be stale).
+    Returns the logged change, or None when nothing changed or the new slots could not be stored.
+    """
+    old_tier = followup.get("cadence") or "standard"
+    if new_tier == old_tier:
+        return None
+
+    followup_id = str(followup["_id"])
+    added, first_index = [], None
+    if new_tier != "completed":
+        offsets = remaining_offsets(new_tier, followup["created_at"])
+        if offsets:
+            entries = schedule_entries(offsets, followup["created_at"])
+            first_index = await _reserve_slots(followup_id, entries)
+            try:
+                added = await schedule_checkins(
+                    followup["patient_id"], followup_id,
+                    offsets_hours=offsets, base_time=followup["created_at"], first_index=first_index,
+                )
+            except BulkWriteError as e:
+                # Roll back: drop whatever was inserted and void the reserved entries;
+                # the old pending slots were not touched, so the previous cadence stays
+                reserved = range(first_index, first_index + len(entries))
+                await db.checkin_slots.delete_many({"followup_id": followup_id, "slot_index": {"$in": list(reserved)}})
+                await db.followups.update_one(
+                    {"_id": ObjectId(followup_id)},
+                    {"$set": {f"checkin_schedule.{i}.status": "cancelled" for i in reserved}},
+                )
+                print(f"[cadence] {followup_id}: {old_tier} → {new_tier} rolled back: {e.details.get('writeErrors', e)}")
+                return None
+
+    cancelled = await cancel_pending_slots(followup_id, reason=f"cadence:{new_tier}", before_index=first_index)
+    await db.followups.update_one(
+        {"_id": ObjectId(followup_id)},
+        {"$set": {"cadence": new_tier, "checkin_series_stale": True,
+                  **{f"checkin_schedule.{i}.status": "cancelled" for i in cancelled}}},
+    )
+
+    change = {
+        "followup_id": followup_id,
+        "patient_id": followup["patient_id"],
+        "from": old_tier,
+        "to": new_tier,
+        "reason": reason,
+        "cancelled": len(cancelled),
+        "added": len(added),
+        "messages_saved": len(cancelled) - len(added),
+        "created_at": datetime.utcnow(),
+    }
+    await ensure_indexes()
+    await db.cadence_changes.insert_one(dict(change))
+    print(f"[cadence] {followup_id}: {old_tier} → {new_tier} ({reason}), "
+          f"{len(cancelled)} cancelled, {len(added)} scheduled")
+    return change
+
+
+async def cadence_stats(days: int = 14) -> dict:
+    """Per-day totals of cadence changes and net check-in messages saved."""
+    since = datetime.utcnow() - timedelta(days=days)
+    pipeline = [
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$group": {
+            "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+            "changes": {"$sum": 1},
+            "cancelled": {"$sum": "$cancelled"},
+            "added": {"$sum": "$added"},
+            "messages_saved": {"$sum": "$messages_saved"},
+            "thinned": {"$sum": {"$cond": [{"$eq": ["$to", "thin"]}, 1, 0]}},
+            "tightened": {"$sum": {"$cond": [{"$in": ["$to", ["tight", "intensive"]]}, 1, 0]}},
+            "completed": {"$sum": {"$cond": [{"$eq": ["$to", "completed"]}, 1, 0]}},
+        }},
+        {"$sort": {"_id": 1}},
+    ]
+    per_day = [{"date": d.pop("_id"), **d} async for d in db.cadence_changes.aggregate(pipeline)]
+    return {
+        "days": days,
+        "per_day": per_day,
+        "messages_saved": sum(d["messages_saved"] for d in per_day),
+    }
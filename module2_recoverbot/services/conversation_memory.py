@@ -0,0 +1,125 @@
+"""
+module2_recoverbot/services/conversation_memory.py
+Rolling per-followup conversation summary.
+
+Stored on the followup next to conversation_log:
+    conversation_summary   text covering every turn up to summary_through
+    summary_through        timestamp of the last turn folded into the summary
+    summary_turns          number of turns folded in so far
+Once SUMMARY_EVERY_TURNS turns are newer than summary_through, a background
+task folds them into the summary with one LLM call (previous summary + new
+turns only, so the call stays the same size however long the log gets).
+Prompts use the summary plus a fixed window of recent turns
+(gemini_service.format_history), so prompt size is bounded without dropping
+older clinical history.
+"""
+from __future__ import annotations
+from datetime import datetime
+
+from bson import ObjectId
+from shared.database import db
+from .background import spawn
+from .gemini_service import RECENT_TURNS, SUMMARY_EVERY_TURNS, summarize_conversation
+
+# Fields every prompt-building read should project alongside the recent turns
+SUMMARY_PROJECTION = {"conversation_summary": 1, "summary_through": 1}
+
+# Process-wide counters for GET /api/recoverbot/summary/stats
+summary_stats = {"updates": 0, "turns_folded": 0, "failures": 0, "conflicts": 0}
+
+_in_flight: set[str] = set()
+
+
+def context_projection(recent: int = RECENT_TURNS) -> dict:
+    """Projection for prompt context: enough tail turns to cover a lagging summary, plus the summary."""
+    return {"conversation_log": {"$slice": -(recent + SUMMARY_EVERY_TURNS)}, **SUMMARY_PROJECTION}
+
+
+def uncovered_turns(conversation_log: list[dict], summary_through: datetime | None) -> int:
+    if summary_through is None:
+        return len(conversation_log)
+    return sum(1 for m in conversation_log
+               if isinstance(m.get("timestamp"), datetime) and m["timestamp"] > summary_through)
+
+
+def maybe_schedule_update(followup_id, conversation_log: list[dict], summary_through: datetime | None) -> bool:
+    """
+    Start a background summary update if enough turns are uncovered.
+    conversation_log only needs to be the recent tail the caller already has.
+    """
+    if uncovered_turns(conversation_log, summary_through) < SUMMARY_EVERY_TURNS:
+        return False
+    followup_id = str(followup_id)
+    if followup_id in _in_flight:
+        return False
+    _in_flight.add(followup_id)
+    spawn(_run_update(followup_id))
+    return True
+
+
+async def _run_update(followup_id: str) -> None:
+    try:
+        await update_summary(followup_id)
+    except Exception as e:
+        summary_stats["failures"] += 1
+        print(f"[summary] Update failed for {followup_id}: {e}")
+    finally:
+        _in_flight.discard(followup_id)
+
+
+async def update_summary(followup_id: str) -> bool:
+    """
+    Fold every turn newer than summary_through into the summary.
+    Only the uncovered turns are read (server-side $filter). The write is conditional on
+    summary_through being unchanged, so concurrent updaters on other workers cannot
+    overwrite each other. Returns True if the summary was advanced.
+    """
+    docs = await db.followups.aggregate([
+        {"$match": {"_id": ObjectId(followup_id)}},
+        {"$project": {
+            "consultation_id": 1,
+            "conversation_summary": 1,
+            "summary_through": 1,
+            "summary_turns": 1,
+            "pending": {"$filter": {
+                "input": {"$ifNull": ["$conversation_log", []]},
+                "cond": {"$gt": ["$$this.timestamp", {"$ifNull": ["$summary_through", datetime(1970, 1, 1)]}]},
+            }},
+        }},
+    ]).to_list(length=1)
+    if not docs:
+        return False
+    doc = docs[0]
+    pending = doc.get("pending") or []
+    if len(pending) < SUMMARY_EVERY_TURNS:
+        return False
+
+    diagnosis = ""
+    if doc.get("consultation_id"):
+        try:
+            consult = await db.consultations.find_one({"_id": ObjectId(doc["consultation_id"])}, {"diagnosis": 1})
+            diagnosis = (consult or {}).get("diagnosis", "")
+        except Exception:
+            pass
+
+    summary = await summarize_conversation(doc.get("conversation_summary"), pending, diagnosis)
+    if not summary:
+        summary_stats["failures"] += 1
+        return False
+
+    through = max(m["timestamp"] for m in pending)
+    result = await db.followups.update_one(
+        {"_id": doc["_id"], "summary_through": doc.get("summary_through")},
+        {"$set": {
+            "conversation_summary": summary,
+            "summary_through": through,
+            "summary_turns": (doc.get("summary_turns") or 0) + len(pending),
+            "summary_updated_at": datetime.utcnow(),
+        }},
+    )
+    if not result.modified_count:
+        summary_stats["conflicts"] += 1
+        return False
+    summary_stats["updates"] += 1
+    summary_stats["turns_folded"] += len(pending)
+    return True
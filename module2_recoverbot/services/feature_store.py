@@ -0,0 +1,197 @@
+"""
+module2_recoverbot/services/feature_store.py
+Per-followup symptom feature state with provenance.
+
+The latest value of each risk-model feature is kept on the followup as
+`symptom_state`, one entry per feature:
+    {"value": ..., "source": "rule" | "llm" | "default", "turn_at": datetime, "updated_at": datetime}
+New patient turns first go through the local rule extractor (symptom_rules);
+the LLM is only asked about fields the turns mention but the rules could not
+resolve, and then only with the turns newer than `symptom_state_through` plus
+the current values. `symptom_state_through` only advances past turns that
+were fully extracted: if the LLM call fails, the same turns are retried with
+the next reply. Every change is also appended to the
+`symptom_features` collection so the history can be re-scored in batch.
+"""
+from __future__ import annotations
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from shared.database import db
+from .gemini_service import extract_feature_updates
+from .symptom_rules import extract_rule_features, unresolved_mentions
+
+# Values used until a conversation establishes otherwise
+DEFAULT_FEATURES = {
+    "pain_score": 5,
+    "fever_present": False,
+    "swelling": False,
+    "medication_adherent": True,
+    "diagnosis_severity": 2,
+}
+
+_indexes_ready = False
+
+# Process-wide counters for GET /api/recoverbot/features/stats
+extraction_stats = {
+    "updates": 0,          # update_feature_state calls with new turns
+    "llm_calls": 0,
+    "llm_failures": 0,     # extraction calls that failed; their turns are retried
+    "llm_calls_saved": 0,  # updates fully resolved (or not needing) the LLM
+    "fields": {"rule": 0, "llm": 0},
+}
+
+
+def _coerce(key: str, value):
+    if key == "pain_score":
+        return max(0, min(10, int(round(float(value)))))
+    if key == "diagnosis_severity":
+        return max(1, min(3, int(value)))
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "1")
+    return bool(value)
+
+
+def current_values(state: dict | None) -> dict:
+    """Flatten symptom_state into {feature: value}, filling defaults."""
+    state = state or {}
+    return {k: (state.get(k) or {}).get("value", d) for k, d in DEFAULT_FEATURES.items()}
+
+
+def has_observations(state: dict | None) -> bool:
+    """Whether any feature in symptom_state came from the conversation rather than a default."""
+    return any((v or {}).get("source") not in (None, "default") for v in (state or {}).values())
+
+
+def new_turns_since(conversation_log: list[dict], through: datetime | None) -> list[dict]:
+    if through is None:
+        return list(conversation_log)
+    return [m for m in conversation_log if isinstance(m.get("timestamp"), datetime) and m["timestamp"] > through]
+
+
+def apply_updates(state: dict | None, updates: dict, source: str, turn_at: datetime | None) -> tuple[dict, dict]:
+    """Merge validated updates into state. Returns (new_state, changed {feature: value})."""
+    state = dict(state or {})
+    now = datetime.utcnow()
+    changed = {}
+    for key, raw in updates.items():
+        if key not in DEFAULT_FEATURES or raw is None:
+            continue
+        try:
+            value = _coerce(key, raw)
+        except (TypeError, ValueError):
+            continue
+        prev = state.get(key)
+        if prev is not None and prev.get("value") == value and prev.get("source") != "default":
+            continue
+        state[key] = {"value": value, "source": source, "turn_at": turn_at, "updated_at": now}
+        changed[key] = value
+    for key, default in DEFAULT_FEATURES.items():
+        state.setdefault(key, {"value": default, "source": "default", "turn_at": None, "updated_at": now})
+    return state, changed
+
+
+async def ensure_indexes() -> None:
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.symptom_features.create_index([("followup_id", ASCENDING), ("created_at", ASCENDING)])
+        _indexes_ready = True
+
+
+def _window_covers(conversation_log: list[dict], through: datetime | None) -> bool:
+    """Whether a tail of the log reaches back to `through` (so no unseen turn is outside it)."""
+    if through is None:
+        return False
+    return any(isinstance(m.get("timestamp"), datetime) and m["timestamp"] <= through for m in conversation_log)
+
+
+async def _turns_after(followup_id, through: datetime | None) -> list[dict]:
+    """Every turn newer than `through`, read with a server-side $filter."""
+    docs = await db.followups.aggregate([
+        {"$match": {"_id": ObjectId(str(followup_id))}},
+        {"$project": {"pending": {"$filter": {
+            "input": {"$ifNull": ["$conversation_log", []]},
+            "cond": {"$gt": ["$$this.timestamp", through or datetime(1970, 1, 1)]},
+        }}}},
+    ]).to_list(length=1)
+    return (docs[0].get("pending") or []) if docs else []
+
+
+async def update_feature_state(followup: dict, conversation_log: list[dict]) -> tuple[dict, dict, datetime | None]:
+    """
+    Bring the followup's symptom_state up to date with turns it has not seen yet.
+    conversation_log may be just the recent tail; when it does not reach back to
+    symptom_state_through, the unseen turns are read from the followup instead.
+    Returns (new_state, changed, through) — the caller persists state/through with its own update.
+    """
+    state = followup.get("symptom_state")
+    prev_through = followup.get("symptom_state_through")
+    if conversation_log and not _window_covers(conversation_log, prev_through):
+        turns = await _turns_after(followup["_id"], prev_through)
+    else:
+        turns = new_turns_since(conversation_log, prev_through)
+    through = turns[-1]["timestamp"] if turns else prev_through
+    if not turns:
+        new_state, _ = apply_updates(state, {}, "default", None)
+        return new_state, {}, through
+
+    # Only the patient's own words are evidence; bot turns contain the questions
+    patient_turns = [m for m in turns if m.get("role") == "patient"]
+    rule_updates: dict = {}
+    for m in patient_turns:
+        rule_updates.update(extract_rule_features(m.get("message", "")))
+    needed: set[str] = set()
+    for m in patient_turns:
+        needed.update(unresolved_mentions(m.get("message", ""), set(rule_updates)))
+
+    state, changed = apply_updates(state, rule_updates, "rule", through)
+
+    extraction_stats["updates"] += 1
+    extraction_stats["fields"]["rule"] += len(rule_updates)
+    if needed:
+        llm_updates = await extract_feature_updates(current_values(state), turns, fields=sorted(needed))
+        extraction_stats["llm_calls"] += 1
+        if llm_updates is None:
+            # Keep these turns unseen so the next reply asks again; rule values are idempotent
+            extraction_stats["llm_failures"] += 1
+            return state, changed, prev_through
+        extraction_stats["fields"]["llm"] += len(llm_updates)
+        state, llm_changed = apply_updates(state, llm_updates, "llm", through)
+        changed.update(llm_changed)
+    else:
+        extraction_stats["llm_calls_saved"] += 1
+    return state, changed, through
+
+
+async def record_history(
+    followup: dict, changed: dict, state: dict, risk_score: float, risk_label: str,
+    features: dict | None = None, model_version: str | None = None,
+) -> None:
+    """
+    Append one history row per reply that changed a feature.
+    `features` is the full model input (with age / days_since_discharge) so the
+    row can be reused as training data once the followup has an outcome.
+    """
+    if not changed:
+        return
+    await ensure_indexes()
+    await db.symptom_features.insert_one({
+        "followup_id": str(followup["_id"]),
+        "patient_id": followup.get("patient_id"),
+        "changed": changed,
+        "features": features or current_values(state),
+        "sources": {k: v.get("source") for k, v in state.items()},
+        "risk_score": risk_score,
+        "risk_label": risk_label,
+        "model_version": model_version,
+        "created_at": datetime.utcnow(),
+    })
+
+
+async def feature_history(followup_id: str, limit: int = 100) -> list[dict]:
+    cursor = db.symptom_features.find({"followup_id": followup_id}).sort("created_at", ASCENDING).limit(limit)
+    docs = await cursor.to_list(length=limit)
+    for d in docs:
+        d["_id"] = str(d["_id"])
+    return docs
@@ -0,0 +1,270 @@
+"""
+module2_recoverbot/services/followup_queries.py
+Dashboard list queries over followups.
+
+Lists are keyset-paginated on (created_at, _id) descending: the cursor is the
+last row's sort key, so page N costs the same as page 1 however long the
+history gets. One aggregation filters (status / risk / doctor), sorts on an
+index, limits, projects only summary fields (never the conversation log) and
+joins the patient name server-side for just the rows on the page. Pages are
+cached per query shape for LIST_CACHE_TTL_SECONDS so a dashboard refresh burst
+costs one query. Full documents come from followup_detail(), and the
+dashboard's headline numbers come from followup_counts(), which counts over
+every followup rather than the pages a client happened to load.
+"""
+from __future__ import annotations
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from shared.database import db
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+LIST_CACHE_TTL_SECONDS = float(os.getenv("FOLLOWUP_LIST_CACHE_TTL_SECONDS", "5"))
+LIST_CACHE_MAX_ENTRIES = 256
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Summary fields for list rows; the log itself is reduced to a count and the last entry
+LIST_PROJECTION = {
+    "patient_id": 1,
+    "consultation_id": 1,
+    "doctor_id": 1,
+    "status": 1,
+    "risk_score": 1,
+    "risk_label": 1,
+    "suggested_action": 1,
+    "is_pediatric": 1,
+    "cadence": 1,
+    "created_at": 1,
+    "message_count": {"$size": {"$ifNull": ["$conversation_log", []]}},
+    "last_message": {"$arrayElemAt": [{"$ifNull": ["$conversation_log", []]}, -1]},
+    "next_checkin_at": {"$min": {"$map": {
+        "input": {"$filter": {
+            "input": {"$ifNull": ["$checkin_schedule", []]},
+            "cond": {"$eq": ["$$this.status", "pending"]},
+        }},
+        "in": "$$this.scheduled_at",
+    }}},
+}
+
+_cache: OrderedDict = OrderedDict()   # shape key -> (expires_at, page)
+cache_stats = {"hits": 0, "misses": 0}
+_indexes_ready = False
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+async def ensure_indexes() -> None:
+    """Indexes backing each filter + the (created_at, _id) keyset sort; backfills doctor_id once."""
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    keyset = [("created_at", DESCENDING), ("_id", DESCENDING)]
+    await db.followups.create_index(keyset)
+    await db.followups.create_index([("status", ASCENDING), *keyset])
+    await db.followups.create_index([("risk_label", ASCENDING), *keyset])
+    await db.followups.create_index([("doctor_id", ASCENDING), *keyset])
+    await backfill_doctor_ids()
+    await backfill_created_at()
+    _indexes_ready = True
+
+
+async def backfill_doctor_ids() -> int:
+    """Copy doctor_id from the consultation onto followups created before it was stored."""
+    missing = await db.followups.find(
+        {"doctor_id": {"$exists": False}}, {"consultation_id": 1},
+    ).to_list(length=None)
+    if not missing:
+        return 0
+    consult_ids = []
+    for f in missing:
+        try:
+            consult_ids.append(ObjectId(f.get("consultation_id")))
+        except (InvalidId, TypeError):
+            pass
+    doctors = {
+        str(c["_id"]): c.get("doctor_id")
+        async for c in db.consultations.find({"_id": {"$in": consult_ids}}, {"doctor_id": 1})
+    }
+    ops = [UpdateOne({"_id": f["_id"]}, {"$set": {"doctor_id": doctors.get(str(f.get("consultation_id")))}})
+           for f in missing]
+    await db.followups.bulk_write(ops, ordered=False)
+    print(f"[followup_queries] Backfilled doctor_id on {len(ops)} followup(s)")
+    return len(ops)
+
+
+def _as_datetime(value) -> datetime | None:
+    """created_at as a naive UTC datetime; older seeded followups stored ISO strings."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        dt = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+
+async def backfill_created_at() -> int:
+    """
+    Rewrite string created_at values as dates. The keyset sort and the cursor's
+    $lt only order dates against dates, so string rows would drop out after page 1.
+    """
+    rows = await db.followups.find(
+        {"created_at": {"$type": "string"}}, {"created_at": 1},
+    ).to_list(length=None)
+    ops = [UpdateOne({"_id": f["_id"]}, {"$set": {"created_at": dt}})
+           for f in rows if (dt := _as_datetime(f["created_at"])) is not None]
+    if not ops:
+        return 0
+    await db.followups.bulk_write(ops, ordered=False)
+    print(f"[followup_queries] Converted created_at to a date on {len(ops)} followup(s)")
+    return len(ops)
+
+
+# ─── Cursor ──────────────────────────────────────────────────────────────────
+
+def encode_cursor(created_at: datetime, oid) -> str:
+    created_at = _as_datetime(created_at) or _EPOCH
+    ms = (created_at - _EPOCH) // timedelta(milliseconds=1)
+    return f"{ms}.{oid}"
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        ms, oid = cursor.split(".", 1)
+        return _EPOCH + timedelta(milliseconds=int(ms)), ObjectId(oid)
+    except (ValueError, InvalidId, TypeError):
+        raise InvalidCursor(f"Invalid cursor {cursor!r}")
+
+
+def cache_summary() -> dict:
+    return {**cache_stats, "entries": len(_cache), "ttl_seconds": LIST_CACHE_TTL_SECONDS}
+
+
+# ─── Lists ───────────────────────────────────────────────────────────────────
+
+def _pipeline(match: dict, limit: int) -> list[dict]:
+    return [
+        {"$match": match},
+        {"$sort": {"created_at": -1, "_id": -1}},
+        {"$limit": limit + 1},
+        {"$project": LIST_PROJECTION},
+        # Join after the limit so only the rows on this page are looked up
+        {"$lookup": {
+            "from": "patients",
+            "let": {"pid": {"$convert": {"input": "$patient_id", "to": "objectId", "onError": None, "onNull": None}}},
+            "pipeline": [{"$match": {"$expr": {"$eq": ["$_id", "$$pid"]}}}, {"$project": {"name": 1}}],
+            "as": "patient",
+        }},
+        {"$addFields": {"patient_name": {"$ifNull": [{"$first": "$patient.name"}, "Unknown Patient"]}}},
+        {"$project": {"patient": 0}},
+    ]
+
+
+async def list_followups(
+    status: str | None = None,
+    risk_labels: list[str] | None = None,
+    doctor_id: str | None = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: str | None = None,
+) -> dict:
+    """
+    One page of followup summaries, newest first.
+    Returns {"items": [...], "next_cursor": str | None}.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    risk_labels = sorted({r.upper() for r in risk_labels}) if risk_labels else None
+    key = (status, tuple(risk_labels or ()), doctor_id, limit, cursor)
+    cached = _cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        cache_stats["hits"] += 1
+        _cache.move_to_end(key)
+        return cached[1]
+    cache_stats["misses"] += 1
+
+    match: dict = {}
+    if status:
+        match["status"] = status
+    if risk_labels:
+        match["risk_label"] = risk_labels[0] if len(risk_labels) == 1 else {"$in": risk_labels}
+    if doctor_id:
+        match["doctor_id"] = doctor_id
+    if cursor:
+        created_at, oid = decode_cursor(cursor)
+        match["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": oid}},
+        ]
+
+    await ensure_indexes()
+    rows = await db.followups.aggregate(_pipeline(match, limit)).to_list(length=limit + 1)
+    next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["_id"]) if len(rows) > limit else None
+    items = rows[:limit]
+    for row in items:
+        row["_id"] = str(row["_id"])
+    page = {"items": items, "next_cursor": next_cursor}
+
+    _cache[key] = (time.monotonic() + LIST_CACHE_TTL_SECONDS, page)
+    if len(_cache) > LIST_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return page
+
+
+async def followup_counts(doctor_id: str | None = None) -> dict:
+    """
+    Followup totals by status and by risk label (optionally for one doctor).
+    Returns {"total", "by_status": {status: n}, "by_risk": {label: n}, "flagged": n},
+    flagged being HIGH + CRITICAL like /risk-flagged. Cached like the list pages.
+    """
+    key = ("counts", doctor_id)
+    cached = _cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        cache_stats["hits"] += 1
+        _cache.move_to_end(key)
+        return cached[1]
+    cache_stats["misses"] += 1
+
+    await ensure_indexes()
+    pipeline = [
+        {"$match": {"doctor_id": doctor_id} if doctor_id else {}},
+        {"$group": {"_id": {"status": "$status", "risk": "$risk_label"}, "n": {"$sum": 1}}},
+    ]
+    counts = {"total": 0, "by_status": {}, "by_risk": {}, "flagged": 0}
+    async for row in db.followups.aggregate(pipeline):
+        status, risk, n = row["_id"].get("status") or "unknown", row["_id"].get("risk") or "UNKNOWN", row["n"]
+        counts["total"] += n
+        counts["by_status"][status] = counts["by_status"].get(status, 0) + n
+        counts["by_risk"][risk] = counts["by_risk"].get(risk, 0) + n
+        if risk in ("HIGH", "CRITICAL"):
+            counts["flagged"] += n
+
+    _cache[key] = (time.monotonic() + LIST_CACHE_TTL_SECONDS, counts)
+    if len(_cache) > LIST_CACHE_MAX_ENTRIES:
+        _cache.popitem(last=False)
+    return counts
+
+
+async def followup_detail(followup_id: str) -> dict | None:
+    """Full followup document (conversation log, schedule) with the patient name."""
+    try:
+        doc = await db.followups.find_one({"_id": ObjectId(followup_id)})
+    except InvalidId:
+        return None
+    if not doc:
+        return None
+    doc["_id"] = str(doc["_id"])
+    patient = None
+    try:
+        patient = await db.patients.find_one({"_id": ObjectId(doc.get("patient_id"))}, {"name": 1})
+    except (InvalidId, TypeError):
+        pass
+    doc["patient_name"] = (patient or {}).get("name", "Unknown Patient")
+    return doc
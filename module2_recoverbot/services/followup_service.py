@@ -4,20 +4,43 @@ Core business logic: create followups, process check-ins, score risk, send alert
 """
 from __future__ import annotations
 import asyncio
+import os
+import time
+from collections import defaultdict, deque
 from datetime import datetime
-from typing import Any
 
+import numpy as np
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
 from shared.database import db
 from shared.events import publish
-from .gemini_service import generate_opener, continue_conversation, extract_features, generate_suggested_action
-from .risk_service import score_risk
+from shared.realtime import gateway
+from .gemini_service import (
+    generate_opener, generate_checkin_series, continue_conversation, generate_suggested_action,
+)
+from .risk_service import score_risk, score_risk_batch, features_to_row, active_versions
+from . import conversation_memory, feature_store
+from .background import spawn
+from .cadence_service import apply_cadence, cadence_tier
 from .twilio_service import send_whatsapp
-from .scheduler_service import schedule_checkins
+from .scheduler_service import (
+    CHECKIN_OFFSETS_HOURS, schedule_checkins, set_checkin_batch_handler, set_rescore_handler,
+)
 
-# Manager to broadcast WebSocket alerts to connected doctors
-# Populated by router.py
-ws_manager: Any = None
+
+# Concurrency limits for batched check-in dispatch
+CHECKIN_LLM_CONCURRENCY = int(os.getenv("CHECKIN_LLM_CONCURRENCY", "8"))
+CHECKIN_SEND_CONCURRENCY = int(os.getenv("CHECKIN_SEND_CONCURRENCY", "16"))
+
+# Followups re-scored per page by the nightly job
+RESCORE_PAGE_SIZE = int(os.getenv("RISK_RESCORE_PAGE_SIZE", "5000"))
+
+# Turns loaded per reply; the symptom feature state covers everything older
+REPLY_RECENT_TURNS = 20
+
+# Regenerate the remaining pre-written check-ins when the patient has replied since they were written
+CHECKIN_REPERSONALIZE = os.getenv("CHECKIN_REPERSONALIZE", "true").lower() == "true"
 
 SEVERITY_MAP = {"low": 1, "mild": 1, "moderate": 2, "medium": 2, "severe": 3, "high": 3}
 
@@ -47,6 +70,14 @@ async def create_followup(patient_id: str, consultation_id: str) -> dict:
 
     is_pediatric = (patient.get("age", 30) or 30) < 12
 
+    # Opener + every scheduled check-in message in one LLM call
+    series = await generate_checkin_series(
+        patient_name=patient.get("name", "there"),
+        diagnosis=diagnosis,
+        is_pediatric=is_pediatric,
+        offsets_hours=CHECKIN_OFFSETS_HOURS,
+    )
+
     # Build slot placeholders
     now = datetime.utcnow()
     checkin_schedule_placeholder = []  # will be filled by scheduler
@@ -54,19 +85,25 @@ async def create_followup(patient_id: str, consultation_id: str) -> dict:
     followup_doc = {
         "patient_id": patient_id,
         "consultation_id": consultation_id,
+        "doctor_id": (consultation or {}).get("doctor_id"),
         "status": "active",
         "risk_score": 0.0,
         "risk_label": "LOW",
         "conversation_log": [],
         "checkin_schedule": checkin_schedule_placeholder,
         "is_pediatric": is_pediatric,
+        "checkin_messages": series["checkins"],
+        # Template series (LLM unavailable) gets retried at the first dispatch
+        "checkin_series_stale": series.get("fallback", False),
+        "cadence": "standard",
+        "low_streak": 0,
         "created_at": now,
     }
     result = await db.followups.insert_one(followup_doc)
     followup_id = str(result.inserted_id)
 
-    # Schedule APScheduler jobs
-    slots = await schedule_checkins(patient_id, followup_id, _run_checkin)
+    # Persist check-in slots (dispatched by scheduler_service)
+    slots = await schedule_checkins(patient_id, followup_id)
     await db.followups.update_one(
         {"_id": result.inserted_id},
         {"$set": {"checkin_schedule": slots}},
@@ -75,11 +112,7 @@ async def create_followup(patient_id: str, consultation_id: str) -> dict:
     # Send first message immediately if phone available
     phone = patient.get("phone")
     if phone:
-        opener = await generate_opener(
-            patient_name=patient.get("name", "there"),
-            diagnosis=diagnosis,
-            is_pediatric=is_pediatric,
-        )
+        opener = series["opener"]
         try:
             send_whatsapp(phone, opener)
         except Exception as e:
@@ -96,103 +129,247 @@ async def create_followup(patient_id: str, consultation_id: str) -> dict:
     return followup_id
 
 
-async def _run_checkin(patient_id: str, followup_id: str, slot_index: int):
-    """APScheduler callback: send a check-in message at scheduled time."""
-    followup = await db.followups.find_one({"_id": ObjectId(followup_id)})
-    if not followup or followup.get("status") in ("completed",):
-        return
+def _object_ids(ids) -> list[ObjectId]:
+    out = []
+    for i in ids:
+        try:
+            out.append(ObjectId(i))
+        except (InvalidId, TypeError):
+            pass
+    return out
+
 
-    patient = await db.patients.find_one({"_id": ObjectId(patient_id)})
-    phone = (patient or {}).get("phone")
-    diagnosis = ""
-    if followup.get("consultation_id"):
-        consult = await db.consultations.find_one({"_id": ObjectId(followup["consultation_id"])})
-        diagnosis = (consult or {}).get("diagnosis", "")
+async def _find_by_ids(collection, ids, projection: dict) -> dict[str, dict]:
+    docs = {}
+    async for doc in collection.find({"_id": {"$in": _object_ids(ids)}}, projection):
+        docs[str(doc["_id"])] = doc
+    return docs
 
-    bot_msg = await generate_opener(
-        patient_name=(patient or {}).get("name", "there"),
-        diagnosis=diagnosis,
-        is_pediatric=followup.get("is_pediatric", False),
+
+def _slot_offset(schedule: list[dict], i: int) -> float:
+    entry = schedule[i] if i < len(schedule) else {}
+    if entry.get("offset_hours") is not None:
+        return entry["offset_hours"]
+    # Followups scheduled before offsets were stored on the schedule used the default plan
+    return CHECKIN_OFFSETS_HOURS[min(i, len(CHECKIN_OFFSETS_HOURS) - 1)]
+
+
+async def run_checkin_batch(slots: list[dict]) -> dict:
+    """
+    Scheduler batch handler: send one check-in per due slot.
+    Followups, patients and consultations are prefetched with one `$in` query each.
+    Messages come from the followup's pre-generated series; the LLM is only called to
+    re-tailor a stale series (or for legacy followups), concurrently under
+    CHECKIN_LLM_CONCURRENCY. Twilio sends run in threads under CHECKIN_SEND_CONCURRENCY,
+    and followups are updated in one bulk_write.
+    Returns {slot_id: (outcome, error)} with outcome 'sent' | 'skipped' | 'failed'.
+    """
+    followups = await _find_by_ids(
+        db.followups, {s["followup_id"] for s in slots},
+        {"status": 1, "consultation_id": 1, "is_pediatric": 1, "checkin_messages": 1,
+         "checkin_series_stale": 1, "checkin_schedule": 1, **conversation_memory.context_projection()},
+    )
+    patients = await _find_by_ids(
+        db.patients, {s["patient_id"] for s in slots}, {"name": 1, "phone": 1},
+    )
+    consults = await _find_by_ids(
+        db.consultations,
+        {f.get("consultation_id") for f in followups.values() if f.get("consultation_id")},
+        {"diagnosis": 1},
     )
 
-    if phone:
+    llm_sem = asyncio.Semaphore(CHECKIN_LLM_CONCURRENCY)
+    send_sem = asyncio.Semaphore(CHECKIN_SEND_CONCURRENCY)
+
+    async def _one(slot: dict):
+        followup = followups.get(slot["followup_id"])
+        if not followup or followup.get("status") in ("completed",):
+            return slot, "skipped", None, None, None
+        patient = patients.get(slot["patient_id"]) or {}
+        consult = consults.get(followup.get("consultation_id") or "") or {}
+        idx = slot["slot_index"]
+        messages = list(followup.get("checkin_messages") or [])
+        refreshed = None
         try:
-            send_whatsapp(phone, bot_msg)
+            written = messages[idx] if idx < len(messages) else None
+            if written and not (CHECKIN_REPERSONALIZE and followup.get("checkin_series_stale")):
+                bot_msg = written
+            elif messages:
+                # Patient replied (or the cadence changed) since the series was written:
+                # re-tailor this slot and the still-pending ones after it in one call
+                schedule = followup.get("checkin_schedule") or []
+                targets = [idx] + [i for i in range(idx + 1, len(schedule))
+                                   if schedule[i].get("status") == "pending"]
+                offsets = [slot.get("offset_hours") or _slot_offset(schedule, idx)]
+                offsets += [_slot_offset(schedule, i) for i in targets[1:]]
+                async with llm_sem:
+                    series = await generate_checkin_series(
+                        patient_name=patient.get("name", "there"),
+                        diagnosis=consult.get("diagnosis", ""),
+                        is_pediatric=followup.get("is_pediatric", False),
+                        offsets_hours=offsets,
+                        conversation_context=followup.get("conversation_log", []),
+                        include_opener=False,
+                        conversation_summary=followup.get("conversation_summary"),
+                        summary_through=followup.get("summary_through"),
+                    )
+                if series.get("fallback"):
+                    # Templates must not replace the tailored series; it stays stale for the next slot
+                    bot_msg = written or series["checkins"][0]
+                else:
+                    refreshed = messages + [None] * (max(len(schedule), idx + 1) - len(messages))
+                    for i, text in zip(targets, series["checkins"]):
+                        refreshed[i] = text
+                    bot_msg = refreshed[idx]
+            else:
+                # Followups created before series pre-generation
+                async with llm_sem:
+                    bot_msg = await generate_opener(
+                        patient_name=patient.get("name", "there"),
+                        diagnosis=consult.get("diagnosis", ""),
+                        is_pediatric=followup.get("is_pediatric", False),
+                    )
+            if patient.get("phone"):
+                async with send_sem:
+                    await asyncio.to_thread(send_whatsapp, patient["phone"], bot_msg)
         except Exception as e:
-            print(f"[checkin] Twilio error: {e}")
+            return slot, "failed", str(e), None, None
+        return slot, "sent", None, bot_msg, refreshed
 
-    await db.followups.update_one(
-        {"_id": ObjectId(followup_id)},
-        {
-            "$push": {"conversation_log": {
-                "timestamp": datetime.utcnow(),
-                "role": "bot",
-                "message": bot_msg,
-            }},
-            "$set": {f"checkin_schedule.{slot_index}.status": "completed",
-                     f"checkin_schedule.{slot_index}.completed_at": datetime.utcnow()},
-        },
-    )
+    outcomes = await asyncio.gather(*(_one(s) for s in slots))
+
+    now = datetime.utcnow()
+    ops = []
+    for slot, outcome, _, bot_msg, refreshed in outcomes:
+        if outcome != "sent":
+            continue
+        fields = {f"checkin_schedule.{slot['slot_index']}.status": "completed",
+                  f"checkin_schedule.{slot['slot_index']}.completed_at": now}
+        if refreshed is not None:
+            fields["checkin_messages"] = refreshed
+            fields["checkin_series_stale"] = False
+        ops.append(UpdateOne(
+            {"_id": ObjectId(slot["followup_id"])},
+            {
+                "$push": {"conversation_log": {"timestamp": now, "role": "bot", "message": bot_msg}},
+                "$set": fields,
+            },
+        ))
+    if ops:
+        await db.followups.bulk_write(ops, ordered=False)
+        for slot, outcome, _, bot_msg, _ in outcomes:
+            if outcome == "sent":
+                followup = followups[slot["followup_id"]]
+                conversation_memory.maybe_schedule_update(
+                    slot["followup_id"],
+                    followup.get("conversation_log", []) + [{"timestamp": now, "role": "bot", "message": bot_msg}],
+                    followup.get("summary_through"),
+                )
+
+    for slot, outcome, error, _, _ in outcomes:
+        if outcome == "failed":
+            print(f"[checkin] {slot['followup_id']}#{slot['slot_index']} failed: {error}")
+
+    return {slot["_id"]: (outcome, error) for slot, outcome, error, _, _ in outcomes}
+
+
+# Restarted workers must be able to dispatch slots created before the restart
+set_checkin_batch_handler(run_checkin_batch)
+
+
+class _StageTimer:
+    """Wall-clock timings for the stages of one reply, in milliseconds."""
+
+    def __init__(self):
+        self._start = self._last = time.perf_counter()
+        self.stages: dict[str, float] = {}
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    def total(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 1)
+
+
+# Recent per-stage timings for GET /api/recoverbot/reply/timings
+reply_timings: dict[str, deque] = defaultdict(lambda: deque(maxlen=500))
+
+
+async def _publish_timings(timer: _StageTimer, followup_id: str) -> None:
+    for stage, ms in timer.stages.items():
+        reply_timings[stage].append(ms)
+    try:
+        await publish("recoverbot.reply_timing", {"followup_id": followup_id, **timer.stages})
+    except Exception as e:
+        print(f"[process_reply] Timing publish failed: {e}")
+
+
+def _days_since(created_at) -> int:
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00")).replace(tzinfo=None)
+    return max(1, (datetime.utcnow() - created_at).days)
 
 
 async def process_patient_reply(patient_id: str, patient_message: str) -> dict:
     """
     Handles an incoming Twilio webhook reply:
-    1. Fetches active followup
-    2. Generates Gemini reply
-    3. Extracts features → risk score
-    4. Fires alert if HIGH/CRITICAL
-    Returns updated followup.
+    1. Appends the message and fetches the active followup in one find_one_and_update
+       (patient lookup runs alongside it)
+    2. Generates the Gemini reply and updates the symptom feature state concurrently
+    3. Sends the reply, then writes bot message + risk score in one update
+    4. Suggested action, events and dashboard alerts run in the background if HIGH/CRITICAL
+    Returns the updated followup (built in memory, not re-read).
     """
-    followup = await db.followups.find_one({"patient_id": patient_id, "status": "active"})
+    timer = _StageTimer()
+    patient_entry = {"timestamp": datetime.utcnow(), "role": "patient", "message": patient_message}
+
+    followup, patient = await asyncio.gather(
+        db.followups.find_one_and_update(
+            {"patient_id": patient_id, "status": "active"},
+            {"$push": {"conversation_log": patient_entry}},
+            projection={"conversation_log": {"$slice": -REPLY_RECENT_TURNS}},
+            return_document=ReturnDocument.AFTER,
+        ),
+        db.patients.find_one({"_id": ObjectId(patient_id)}, {"name": 1, "age": 1, "phone": 1}),
+    )
     if not followup:
         return {"error": "No active followup found"}
 
     followup_id = followup["_id"]
-    patient = await db.patients.find_one({"_id": ObjectId(patient_id)})
     age = (patient or {}).get("age", 30) or 30
     phone = (patient or {}).get("phone")
 
-    consult = await db.consultations.find_one({"_id": ObjectId(followup["consultation_id"])}) if followup.get("consultation_id") else {}
+    consult = await db.consultations.find_one(
+        {"_id": ObjectId(followup["consultation_id"])}, {"diagnosis": 1, "doctor_id": 1}
+    ) if followup.get("consultation_id") else {}
     diagnosis = (consult or {}).get("diagnosis", "")
-
-    # Append patient message
-    await db.followups.update_one(
-        {"_id": followup_id},
-        {"$push": {"conversation_log": {
-            "timestamp": datetime.utcnow(),
-            "role": "patient",
-            "message": patient_message,
-        }}},
-    )
-
-    # Generate bot reply
-    updated = await db.followups.find_one({"_id": followup_id})
-    conv_log = updated.get("conversation_log", [])
-
-    bot_reply = await continue_conversation(conv_log, patient_message, diagnosis)
-
-    await db.followups.update_one(
-        {"_id": followup_id},
-        {"$push": {"conversation_log": {
-            "timestamp": datetime.utcnow(),
-            "role": "bot",
-            "message": bot_reply,
-        }}},
+    timer.mark("load")
+
+    conv_log = followup.get("conversation_log", [])
+    days_since = _days_since(followup["created_at"])
+
+    # Reply and feature update only depend on the conversation so far; the feature
+    # update sees just the turns since the last one, not the whole log
+    bot_reply, (symptom_state, changed, state_through) = await asyncio.gather(
+        # conv_log already ends with this message; the prompt adds it separately
+        continue_conversation(
+            conv_log[:-1], patient_message, diagnosis,
+            summary=followup.get("conversation_summary"),
+            summary_through=followup.get("summary_through"),
+        ),
+        feature_store.update_feature_state(followup, conv_log),
     )
+    features = {**feature_store.current_values(symptom_state), "age": age, "days_since_discharge": days_since}
+    timer.mark("llm")
 
     if phone:
         try:
-            send_whatsapp(phone, bot_reply)
+            await asyncio.to_thread(send_whatsapp, phone, bot_reply)
         except Exception as e:
             print(f"[process_reply] Twilio error: {e}")
-
-    # Extract features and score risk
-    created_at = followup["created_at"]
-    if isinstance(created_at, str):
-        created_at = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
-    days_since = max(1, (datetime.utcnow() - created_at).days)
-    features = await extract_features(conv_log, age, days_since)
+    timer.mark("send")
 
     risk_score, risk_label = score_risk(
         pain_score=features.get("pain_score", 5),
@@ -204,50 +381,221 @@ async def process_patient_reply(patient_id: str, patient_message: str) -> dict:
         diagnosis_severity=features.get("diagnosis_severity", 2),
     )
 
-    update_fields: dict = {"risk_score": risk_score, "risk_label": risk_label}
-
-    if risk_label in ("HIGH", "CRITICAL"):
+    # New context from the patient: remaining pre-written check-ins get re-tailored at next dispatch
+    update_fields: dict = {
+        "risk_score": risk_score,
+        "risk_label": risk_label,
+        "checkin_series_stale": True,
+        "symptom_state": symptom_state,
+        "symptom_state_through": state_through,
+        "low_streak": followup.get("low_streak", 0) + 1 if risk_label == "LOW" else 0,
+    }
+    flagged = risk_label in ("HIGH", "CRITICAL")
+    if flagged:
         update_fields["status"] = "flagged"
-        
-        # Generate Gemini suggested action
+    tier = cadence_tier(risk_label, update_fields["low_streak"])
+
+    bot_entry = {"timestamp": datetime.utcnow(), "role": "bot", "message": bot_reply}
+    await asyncio.gather(
+        db.followups.update_one(
+            {"_id": followup_id},
+            {"$push": {"conversation_log": bot_entry}, "$set": update_fields},
+        ),
+        feature_store.record_history(
+            followup, changed, symptom_state, risk_score, risk_label,
+            features=features, model_version=active_versions()["production"],
+        ),
+    )
+    timer.mark("persist")
+
+    # Background stages get their own copy: the dict below is rewritten for the response
+    if tier != (followup.get("cadence") or "standard"):
+        spawn(_reschedule(
+            dict(followup), tier, f"risk {followup.get('risk_label', 'LOW')} → {risk_label}",
+        ))
+    if flagged:
+        spawn(_raise_risk_alert(
+            patient_id, patient, dict(followup), risk_score, risk_label, features, diagnosis,
+            doctor_id=(consult or {}).get("doctor_id"),
+        ))
+
+    conversation_memory.maybe_schedule_update(
+        followup_id, conv_log + [bot_entry], followup.get("summary_through"),
+    )
+
+    await _publish_timings(timer, str(followup_id))
+
+    followup["conversation_log"] = conv_log + [bot_entry]
+    followup.update(update_fields)
+    followup["_id"] = str(followup_id)
+    return followup
+
+
+async def _reschedule(followup: dict, tier: str, reason: str) -> None:
+    try:
+        await apply_cadence(followup, tier, reason)
+    except Exception as e:
+        print(f"[process_reply] Cadence change failed for {followup['_id']}: {e}")
+
+
+async def complete_followup(followup_id: str) -> dict | None:
+    """Close a followup and cancel its remaining check-ins. Returns the cadence change, if any."""
+    followup = await db.followups.find_one_and_update(
+        {"_id": ObjectId(followup_id), "status": {"$ne": "completed"}},
+        {"$set": {"status": "completed", "completed_at": datetime.utcnow()}},
+        projection={"patient_id": 1, "created_at": 1, "cadence": 1, "checkin_schedule": 1},
+    )
+    if not followup:
+        return None
+    return await apply_cadence(followup, "completed", "followup completed")
+
+
+async def _raise_risk_alert(
+    patient_id: str,
+    patient: dict | None,
+    followup: dict,
+    risk_score: float,
+    risk_label: str,
+    features: dict,
+    diagnosis: str,
+    doctor_id: str | None = None,
+) -> None:
+    """
+    Post-reply stage for HIGH/CRITICAL: suggested action and the followup.flagged event.
+    The doctor's dashboard hears about the flag from CommHub's doctor_alerts, which
+    consumes that event and dedupes / digests it; only the pediatric PainScan request
+    is pushed from here.
+    """
+    followup_id = str(followup["_id"])
+    try:
         suggested_action = await generate_suggested_action(risk_label, features, diagnosis)
-        update_fields["suggested_action"] = suggested_action
+        await db.followups.update_one(
+            {"_id": ObjectId(followup_id)}, {"$set": {"suggested_action": suggested_action}}
+        )
 
-        # Redis event → Module 4 CareGap
+        # Redis event → Module 4 CareGap and CommHub doctor alerts (dashboard + WhatsApp)
         await publish("followup.flagged", {
             "patient_id": patient_id,
             "risk_score": risk_score,
             "risk_label": risk_label,
-            "followup_id": str(followup_id),
-            "suggested_action": suggested_action
+            "followup_id": followup_id,
+            "suggested_action": suggested_action,
+            "doctor_id": doctor_id,
+            "patient_name": (patient or {}).get("name"),
+            "ts": time.time(),
         })
-        # Doctor alert via Twilio (could be doctor's number from .env / DB)
-        # Broadcast via WebSocket
-        if ws_manager:
-            await ws_manager.broadcast({
-                "type": "RISK_ALERT",
-                "topic": "recoverbot.flagged",
-                "data": {
-                    "patient_id": patient_id,
-                    "patient_name": (patient or {}).get("name", "Unknown"),
-                    "risk_score": risk_score,
-                    "risk_label": risk_label,
-                    "followup_id": str(followup_id),
-                    "suggested_action": suggested_action
-                }
-            })
-
         # Pediatric hook → PainScan
         if followup.get("is_pediatric"):
-            if ws_manager:
-                await ws_manager.broadcast({
-                    "type": "painscan.requested",
-                    "patient_id": patient_id,
-                    "followup_id": str(followup_id),
-                })
-
-    await db.followups.update_one({"_id": followup_id}, {"$set": update_fields})
-
-    final = await db.followups.find_one({"_id": followup_id})
-    final["_id"] = str(final["_id"])
-    return final
+            await gateway.publish("painscan.requested", {
+                "type": "painscan.requested",
+                "patient_id": patient_id,
+                "followup_id": followup_id,
+            }, doctor_id=doctor_id)
+    except Exception as e:
+        print(f"[process_reply] Risk alert stage failed for {followup_id}: {e}")
+
+
+# ─── Nightly re-score ────────────────────────────────────────────────────────
+
+# Stats of the most recent nightly run, exposed via GET /api/recoverbot/risk/rescore/stats
+last_rescore_stats: dict = {}
+
+
+async def rescore_active_followups() -> dict:
+    """
+    Re-score every active/flagged followup with today's days_since_discharge.
+    Reads only the fields the model needs, scores each page in one score_risk_batch
+    call and writes changed scores back with bulk_write. Followups whose symptom
+    state holds nothing but defaults (the patient never reported a symptom) are
+    skipped rather than labelled from pain=5 and friends. Followups that newly
+    cross into HIGH/CRITICAL get flagged and go through the normal alert stage.
+    """
+    global last_rescore_stats
+    started = time.perf_counter()
+    stats = {"scored": 0, "changed": 0, "escalated": 0, "skipped_unobserved": 0}
+    escalated: list[tuple[dict, float, str, dict]] = []
+    last_id = None
+
+    while True:
+        query: dict = {"status": {"$in": ["active", "flagged"]}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        page = await db.followups.find(
+            query,
+            {"patient_id": 1, "consultation_id": 1, "status": 1, "risk_score": 1, "risk_label": 1,
+             "symptom_state": 1, "created_at": 1, "is_pediatric": 1},
+        ).sort("_id", 1).to_list(length=RESCORE_PAGE_SIZE)
+        if not page:
+            break
+        last_id = page[-1]["_id"]
+        full_page = len(page) == RESCORE_PAGE_SIZE
+        observed = [f for f in page if feature_store.has_observations(f.get("symptom_state"))]
+        stats["skipped_unobserved"] += len(page) - len(observed)
+        page = observed
+        if not page:
+            if not full_page:
+                break
+            continue
+
+        patients = await _find_by_ids(db.patients, {f["patient_id"] for f in page}, {"name": 1, "age": 1})
+        features = []
+        for f in page:
+            age = (patients.get(f["patient_id"]) or {}).get("age", 30) or 30
+            features.append({
+                **feature_store.current_values(f.get("symptom_state")),
+                "age": age,
+                "days_since_discharge": _days_since(f["created_at"]),
+            })
+        rows = np.array([features_to_row(x) for x in features], dtype=np.float32)
+        scores, labels = await asyncio.to_thread(score_risk_batch, rows)
+
+        ops = []
+        for f, feats, score, label in zip(page, features, scores, labels):
+            score = float(score)
+            if label == f.get("risk_label") and abs(score - (f.get("risk_score") or 0.0)) < 1e-6:
+                continue
+            update = {"risk_score": score, "risk_label": label, "risk_rescored_at": datetime.utcnow()}
+            if label in ("HIGH", "CRITICAL") and f.get("status") == "active":
+                update["status"] = "flagged"
+                escalated.append((f, score, label, feats))
+            ops.append(UpdateOne({"_id": f["_id"]}, {"$set": update}))
+        if ops:
+            await db.followups.bulk_write(ops, ordered=False)
+
+        stats["scored"] += len(page)
+        stats["changed"] += len(ops)
+        if not full_page:
+            break
+
+    # Escalations are rare; they get the same suggested action / event / dashboard path as a reply
+    if escalated:
+        consults = await _find_by_ids(
+            db.consultations, {f.get("consultation_id") for f, *_ in escalated if f.get("consultation_id")},
+            {"diagnosis": 1, "doctor_id": 1},
+        )
+        patients = await _find_by_ids(db.patients, {f["patient_id"] for f, *_ in escalated}, {"name": 1})
+        sem = asyncio.Semaphore(CHECKIN_LLM_CONCURRENCY)
+
+        async def _alert(f, score, label, feats):
+            async with sem:
+                consult = consults.get(f.get("consultation_id")) or {}
+                await _raise_risk_alert(
+                    f["patient_id"], patients.get(f["patient_id"]), f, score, label, feats,
+                    consult.get("diagnosis", ""), doctor_id=consult.get("doctor_id"),
+                )
+
+        await asyncio.gather(*(_alert(*e) for e in escalated))
+        stats["escalated"] = len(escalated)
+
+    last_rescore_stats = {
+        **stats,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "finished_at": datetime.utcnow().isoformat(),
+    }
+    print(f"[rescore] {stats['scored']} followups scored, {stats['changed']} changed, "
+          f"{stats['escalated']} escalated, {stats['skipped_unobserved']} without reported symptoms skipped "
+          f"in {last_rescore_stats['duration_ms']}ms")
+    return last_rescore_stats
+
+
+set_rescore_handler(rescore_active_followups)
@@ -5,6 +5,7 @@ Gemini-powered conversation agent and feature extractor.
 import json
 import os
 import re
+from datetime import datetime
 import google.generativeai as genai
 from dotenv import load_dotenv
 
@@ -14,6 +15,41 @@ genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
 
 _model = genai.GenerativeModel("gemini-2.5-flash")
 
+# Verbatim turns included in prompts next to the rolling summary (see conversation_memory)
+RECENT_TURNS = int(os.getenv("CONVERSATION_RECENT_TURNS", "6"))
+# The summary is brought up to date once this many turns are not yet in it
+SUMMARY_EVERY_TURNS = int(os.getenv("CONVERSATION_SUMMARY_EVERY_TURNS", "4"))
+SUMMARY_MAX_WORDS = 150
+
+
+def format_history(
+    history: list[dict] | None,
+    summary: str | None = None,
+    recent: int = RECENT_TURNS,
+    summary_through=None,
+) -> str:
+    """
+    Rolling summary of older turns + the last `recent` turns verbatim. '' if there is neither.
+    With summary_through, turns the summary does not cover yet are kept verbatim even
+    beyond `recent` (up to recent + SUMMARY_EVERY_TURNS) so a lagging summary leaves no gap.
+    """
+    history = history or []
+    parts = []
+    if summary:
+        parts.append(f"Summary of the earlier conversation:\n{summary}")
+    turns = history[-recent:] if recent else []
+    if summary_through is not None:
+        # Seeded / legacy turns carry ISO strings; like uncovered_turns, only datetimes count
+        uncovered = [m for m in history
+                     if isinstance(m.get("timestamp"), datetime) and m["timestamp"] > summary_through]
+        if len(uncovered) > len(turns):
+            turns = uncovered[-(recent + SUMMARY_EVERY_TURNS):]
+    if turns:
+        parts.append("Recent messages:\n" + "\n".join(
+            f"[{m.get('role', '?').upper()}]: {m.get('message', '')}" for m in turns
+        ))
+    return "\n\n".join(parts)
+
 
 async def generate_opener(patient_name: str, diagnosis: str, is_pediatric: bool) -> str:
     """Generate a warm, personalised opening WhatsApp message for the patient."""
@@ -30,15 +66,106 @@ async def generate_opener(patient_name: str, diagnosis: str, is_pediatric: bool)
     return response.text.strip()
 
 
+def _offset_label(hours: float) -> str:
+    # Cadence offsets can be fractional (e.g. 27.35); patients see whole hours / days
+    hours = max(1, int(round(hours)))
+    if hours < 24:
+        return f"{hours} hour{'s' if hours > 1 else ''}"
+    if hours % (24 * 7) == 0:
+        weeks = hours // (24 * 7)
+        return f"{weeks} week{'s' if weeks > 1 else ''}"
+    days = hours // 24
+    return f"{days} day{'s' if days > 1 else ''}"
+
+
+def _fallback_checkin(patient_name: str, hours: float, is_pediatric: bool) -> str:
+    question = f"How is {patient_name} feeling today?" if is_pediatric else "How are you feeling today?"
+    return (
+        f"Hi, it's RecoverBot checking in {_offset_label(hours)} after discharge. "
+        f"{question} Please share any pain (0-10), fever, swelling, "
+        f"and whether medications are being taken as prescribed."
+    )
+
+
+async def generate_checkin_series(
+    patient_name: str,
+    diagnosis: str,
+    is_pediatric: bool,
+    offsets_hours: list[float],
+    conversation_context: list[dict] | None = None,
+    include_opener: bool = True,
+    conversation_summary: str | None = None,
+    summary_through=None,
+) -> dict:
+    """
+    Generate the opener plus one check-in message per scheduled offset in a single call.
+    With conversation_context (and its rolling summary), messages are tailored to what
+    the patient has already said.
+    Returns {"opener": str | None, "checkins": [str, ...], "fallback": bool}
+    (len(checkins) == len(offsets_hours)); fallback is True when the LLM call failed
+    and the check-ins are generic templates.
+    """
+    audience = "the child's parent or guardian" if is_pediatric else "the patient"
+    schedule = ", ".join(f"{i}: {_offset_label(h)} after discharge" for i, h in enumerate(offsets_hours))
+    context = format_history(conversation_context, conversation_summary, summary_through=summary_through)
+    if context:
+        context = f"Conversation so far:\n{context}\n\n"
+    opener_spec = (
+        '"opener": a warm opening message that says you will check in periodically '
+        "(6 hours, 24 hours, 48 hours, 3 days, 1 week, 2 weeks) and asks how they feel now, "
+        if include_opener else ""
+    )
+    prompt = (
+        f"You are RecoverBot, a caring post-discharge healthcare assistant.\n"
+        f"You are writing WhatsApp messages to {audience} whose name is {patient_name}, "
+        f"recently discharged after treatment for: {diagnosis}.\n"
+        f"{context}"
+        f"Write one check-in message for each of these times — {schedule}.\n"
+        f"Each message should fit its point in recovery, ask about pain (0-10), fever, swelling, "
+        f"wound status and medication adherence where relevant, and stay under 80 words. "
+        f"No bullet points. Plain text only.\n"
+        f"Return ONLY a valid JSON object with keys: {opener_spec}"
+        f'"checkins": an array of exactly {len(offsets_hours)} strings in the order listed.\n'
+        f"Return ONLY the JSON — no markdown, no explanation."
+    )
+    try:
+        response = await _model.generate_content_async(prompt)
+        raw = re.sub(r"```[a-z]*", "", response.text.strip()).strip("` \n")
+        data = json.loads(raw)
+        checkins = [str(m).strip() for m in data.get("checkins", [])]
+        if len(checkins) != len(offsets_hours) or not all(checkins):
+            raise ValueError(f"expected {len(offsets_hours)} check-ins, got {len(checkins)}")
+        opener = str(data.get("opener", "")).strip() if include_opener else None
+        if include_opener and not opener:
+            opener = await generate_opener(patient_name, diagnosis, is_pediatric)
+        return {"opener": opener, "checkins": checkins, "fallback": False}
+    except Exception as e:
+        print(f"[gemini] Check-in series generation failed, using templates: {e}")
+        opener = None
+        if include_opener:
+            try:
+                opener = await generate_opener(patient_name, diagnosis, is_pediatric)
+            except Exception:
+                opener = (
+                    f"Hi {patient_name}, this is RecoverBot. We'll check in over the next two weeks "
+                    f"to see how recovery is going. How are you feeling right now?"
+                )
+        return {
+            "opener": opener,
+            "checkins": [_fallback_checkin(patient_name, h, is_pediatric) for h in offsets_hours],
+            "fallback": True,
+        }
+
+
 async def continue_conversation(
     conversation_history: list[dict],
     patient_reply: str,
     diagnosis: str,
+    summary: str | None = None,
+    summary_through=None,
 ) -> str:
-    """Continue the check-in conversation based on prior context."""
-    history_text = "\n".join(
-        f"[{m['role'].upper()}]: {m['message']}" for m in conversation_history[-6:]
-    )
+    """Continue the check-in conversation based on the rolling summary and recent turns."""
+    history_text = format_history(conversation_history, summary, summary_through=summary_through)
     prompt = (
         f"You are RecoverBot, an empathetic AI post-discharge health assistant.\n"
         f"Patient diagnosis: {diagnosis}.\n\n"
@@ -58,41 +185,82 @@ async def continue_conversation(
         raise
 
 
-async def extract_features(conversation_log: list[dict], age: int, days_since_discharge: int) -> dict:
+_FEATURE_SPECS = {
+    "pain_score": "pain_score (0-10 integer)",
+    "fever_present": "fever_present (true/false)",
+    "swelling": "swelling (true/false)",
+    "medication_adherent": "medication_adherent (true/false)",
+    "diagnosis_severity": "diagnosis_severity (1=low/2=medium/3=high integer)",
+}
+
+
+async def extract_feature_updates(
+    current_features: dict,
+    new_turns: list[dict],
+    fields: list[str] | None = None,
+) -> dict | None:
     """
-    Use Gemini to extract structured symptom features from a conversation.
-    Returns a dict ready to feed into the sklearn risk model.
+    Incremental symptom extraction: given the current symptom state and only the
+    turns since it was last updated, return just the fields the new turns change.
+    `fields` restricts the question to those features (e.g. ones local rules could not resolve).
+    Prompt size stays constant regardless of conversation length. Returns the changed
+    fields ({} if nothing changed), or None when the model call or its JSON fails,
+    so the caller can tell "nothing changed" from "not extracted".
     """
-    conv_text = "\n".join(
-        f"[{m['role'].upper()}]: {m['message']}" for m in conversation_log
-    )
+    if not new_turns:
+        return {}
+    wanted = [f for f in (fields or _FEATURE_SPECS) if f in _FEATURE_SPECS]
+    if not wanted:
+        return {}
+    turns_text = "\n".join(f"[{m['role'].upper()}]: {m['message']}" for m in new_turns)
     prompt = (
-        f"Analyse the following patient check-in conversation and extract symptom data.\n\n"
-        f"{conv_text}\n\n"
-        f"Return ONLY a valid JSON object with these exact keys:\n"
-        f"pain_score (0-10 integer), fever_present (true/false), swelling (true/false), "
-        f"medication_adherent (true/false), diagnosis_severity (1=low/2=medium/3=high integer).\n"
-        f"If uncertain, use conservative estimates (e.g. pain_score=5, fever=false).\n"
+        f"You maintain structured symptom data for a post-discharge patient.\n"
+        f"Current values: {json.dumps(current_features)}\n\n"
+        f"New messages since those values were recorded:\n{turns_text}\n\n"
+        f"Return ONLY a valid JSON object containing the keys whose value the new messages "
+        f"establish or change, chosen from: {', '.join(_FEATURE_SPECS[f] for f in wanted)}.\n"
+        f"Omit keys the new messages do not mention. Return {{}} if nothing changed.\n"
         f"Return ONLY the JSON — no markdown, no explanation."
     )
     try:
         response = await _model.generate_content_async(prompt)
-        raw = response.text.strip()
-        # Strip any accidental markdown code fences
-        raw = re.sub(r"```[a-z]*", "", raw).strip("` \n")
-        features = json.loads(raw)
+        raw = re.sub(r"```[a-z]*", "", response.text.strip()).strip("` \n")
+        updates = json.loads(raw)
+        if not isinstance(updates, dict):
+            raise ValueError(f"expected a JSON object, got {type(updates).__name__}")
+        return {k: v for k, v in updates.items() if k in wanted}
     except Exception as e:
-        # Fallback if quota exhausted or JSON parse fails
-        features = {
-            "pain_score": 5,
-            "fever_present": False,
-            "swelling": False,
-            "medication_adherent": True,
-            "diagnosis_severity": 2,
-        }
-    features["age"] = age
-    features["days_since_discharge"] = days_since_discharge
-    return features
+        print(f"[gemini] Feature update extraction failed: {e}")
+        return None
+
+
+async def summarize_conversation(
+    previous_summary: str | None,
+    new_turns: list[dict],
+    diagnosis: str,
+) -> str | None:
+    """
+    Fold new turns into the rolling conversation summary.
+    Returns the updated summary, or None on failure (caller keeps the old one).
+    """
+    turns_text = "\n".join(f"[{m.get('role', '?').upper()}]: {m.get('message', '')}" for m in new_turns)
+    prompt = (
+        f"You keep a running clinical summary of a post-discharge check-in conversation "
+        f"for a patient treated for: {diagnosis or 'a recent procedure'}.\n\n"
+        f"Current summary:\n{previous_summary or '(none yet)'}\n\n"
+        f"New messages:\n{turns_text}\n\n"
+        f"Write the updated summary. Keep every clinically relevant fact: symptoms with their "
+        f"values and how they changed over time (pain 0-10, fever, swelling, wound), medication "
+        f"adherence, red flags, questions or concerns raised and advice already given. "
+        f"Drop greetings and small talk. At most {SUMMARY_MAX_WORDS} words. Plain text only."
+    )
+    try:
+        response = await _model.generate_content_async(prompt)
+        summary = response.text.strip()
+        return summary or None
+    except Exception as e:
+        print(f"[gemini] Conversation summary failed: {e}")
+        return None
 
 
 async def generate_suggested_action(risk_label: str, features: dict, diagnosis: str) -> str:
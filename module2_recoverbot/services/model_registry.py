@@ -0,0 +1,172 @@
+"""
+module2_recoverbot/services/model_registry.py
+Versioned store for risk model artifacts.
+
+Layout under RISK_MODEL_DIR (default module2_recoverbot/models):
+    <version>/model.pkl     pickled classifier
+    <version>/meta.json     version, sha256, training source/rows, metrics, params
+    registry.json           {"production": <version>, "candidate": <version> | null}
+
+Artifacts are never overwritten; promoting or rolling back only rewrites
+registry.json (tmp file + os.replace, so readers never see a partial file).
+Every load re-hashes model.pkl and refuses it if the checksum differs from
+meta.json. Workers learn about pointer changes through the `risk_model.changed`
+Redis event and reload via risk_service.reload_models().
+"""
+from __future__ import annotations
+import contextlib
+import fcntl
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+from datetime import datetime
+
+REGISTRY_DIR = pathlib.Path(os.getenv("RISK_MODEL_DIR", pathlib.Path(__file__).parent.parent / "models"))
+LEGACY_MODEL_PATH = pathlib.Path(__file__).parent.parent / "risk_model.pkl"
+
+_POINTERS_FILE = "registry.json"
+ROLES = ("production", "candidate")
+
+
+class ModelIntegrityError(Exception):
+    """Artifact on disk does not match the checksum recorded at registration."""
+
+
+def _atomic_write(path: pathlib.Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+@contextlib.contextmanager
+def _locked():
+    """Serialise pointer read-modify-write across workers sharing REGISTRY_DIR."""
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    with open(REGISTRY_DIR / ".lock", "a+") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+# ─── Pointers ────────────────────────────────────────────────────────────────
+
+def read_pointers() -> dict:
+    path = REGISTRY_DIR / _POINTERS_FILE
+    if not path.exists():
+        return {role: None for role in ROLES}
+    pointers = json.loads(path.read_text())
+    return {role: pointers.get(role) for role in ROLES}
+
+
+def set_pointer(role: str, version: str | None) -> dict:
+    """Point production/candidate at a registered version (None clears candidate)."""
+    if role not in ROLES:
+        raise ValueError(f"Unknown role {role!r}")
+    if version is not None:
+        get_meta(version)  # must exist
+    elif role == "production":
+        raise ValueError("production cannot be cleared")
+    with _locked():
+        return _write_pointer(role, version)
+
+
+def _write_pointer(role: str, version: str | None) -> dict:
+    pointers = read_pointers()
+    pointers[role] = version
+    if role == "production" and pointers.get("candidate") == version:
+        pointers["candidate"] = None
+    pointers["updated_at"] = datetime.utcnow().isoformat()
+    _atomic_write(REGISTRY_DIR / _POINTERS_FILE, json.dumps(pointers, indent=2).encode())
+    return pointers
+
+
+# ─── Artifacts ───────────────────────────────────────────────────────────────
+
+def register(clf, metadata: dict | None = None) -> dict:
+    """Store a fitted classifier as a new immutable version. Returns its meta."""
+    blob = pickle.dumps(clf, protocol=pickle.HIGHEST_PROTOCOL)
+    digest = _sha256(blob)
+    version = f"v{datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{digest[:8]}"
+    vdir = REGISTRY_DIR / version
+    vdir.mkdir(parents=True, exist_ok=False)
+
+    meta = {
+        **(metadata or {}),
+        "version": version,
+        "sha256": digest,
+        "size_bytes": len(blob),
+        "classes": [int(c) for c in getattr(clf, "classes_", [])],
+        "n_features": int(getattr(clf, "n_features_in_", 0)),
+        "created_at": datetime.utcnow().isoformat(),
+    }
+    _atomic_write(vdir / "model.pkl", blob)
+    _atomic_write(vdir / "meta.json", json.dumps(meta, indent=2, default=str).encode())
+    return meta
+
+
+def get_meta(version: str) -> dict:
+    path = REGISTRY_DIR / version / "meta.json"
+    if not path.exists():
+        raise KeyError(f"Unknown model version {version!r}")
+    return json.loads(path.read_text())
+
+
+def list_versions() -> list[dict]:
+    if not REGISTRY_DIR.exists():
+        return []
+    metas = []
+    for meta_path in REGISTRY_DIR.glob("*/meta.json"):
+        try:
+            metas.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(metas, key=lambda m: m.get("created_at", ""), reverse=True)
+
+
+def load(version: str):
+    """Load and checksum-verify a version. Returns (clf, meta)."""
+    meta = get_meta(version)
+    blob = (REGISTRY_DIR / version / "model.pkl").read_bytes()
+    digest = _sha256(blob)
+    if digest != meta.get("sha256"):
+        raise ModelIntegrityError(
+            f"Checksum mismatch for {version}: expected {meta.get('sha256')}, got {digest}"
+        )
+    return pickle.loads(blob), meta
+
+
+def ensure_production() -> str:
+    """
+    Return the production version, importing the legacy risk_model.pkl as the
+    first version when the registry is still empty.
+    """
+    production = read_pointers()["production"]
+    if production:
+        return production
+    with _locked():
+        # Another worker may have imported it while we waited for the lock
+        production = read_pointers()["production"]
+        if production:
+            return production
+        if not LEGACY_MODEL_PATH.exists():
+            raise FileNotFoundError(
+                f"No production risk model in {REGISTRY_DIR} and no {LEGACY_MODEL_PATH}. "
+                "Run: python -m module2_recoverbot.train_risk_model --promote"
+            )
+        with open(LEGACY_MODEL_PATH, "rb") as f:
+            clf = pickle.load(f)
+        meta = register(clf, {"source": "legacy", "notes": f"imported from {LEGACY_MODEL_PATH.name}"})
+        _write_pointer("production", meta["version"])
+    print(f"[model_registry] Imported {LEGACY_MODEL_PATH.name} as {meta['version']}")
+    return meta["version"]
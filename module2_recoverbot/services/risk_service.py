@@ -1,30 +1,302 @@
 """
 module2_recoverbot/services/risk_service.py
 sklearn RandomForestClassifier risk scoring service.
+
+At load time the pickled forest is compiled into flat NumPy node arrays
+(all trees concatenated). Scoring walks every row through every tree at once,
+one vectorized step per tree level, so a reply costs max_depth array
+operations instead of a predict_proba call with its per-call dispatch overhead.
+Past COMPILED_MAX_ROWS rows sklearn's own Cython traversal is faster, so large
+batches (the nightly re-score) go straight to predict_proba.
+
+Models come from model_registry. The production model (and an optional
+candidate) are held as immutable LoadedModel objects; reload_models() builds
+the new ones off to the side and swaps the module globals in one assignment,
+so in-flight scoring keeps the model it started with. When a candidate is
+loaded every batch is also scored by it (shadow mode) on a single background
+thread, off the caller's path, and the agreement with production is accumulated
+in `shadow_stats`; candidate outputs are never returned.
 """
 from __future__ import annotations
 import os
-import pickle
-import pathlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-from typing import Tuple
+from typing import Sequence, Tuple
+
+from . import model_registry
 
-_MODEL_PATH = pathlib.Path(__file__).parent.parent / "risk_model.pkl"
+# Above this many rows sklearn's batch predict_proba beats the compiled walk
+# (see bench_risk_model); below it the compiled walk avoids ~10ms of call overhead.
+COMPILED_MAX_ROWS = int(os.getenv("RISK_COMPILED_MAX_ROWS", "256"))
+
+# Shadow batches waiting for the shadow thread; beyond this new ones are dropped (and counted)
+SHADOW_MAX_PENDING = int(os.getenv("RISK_SHADOW_MAX_PENDING", "64"))
 
 _LABEL_MAP = {0: "LOW", 1: "MEDIUM", 2: "HIGH", 3: "CRITICAL"}
 
+# Column order expected by the model
+FEATURE_ORDER = (
+    "pain_score",
+    "fever_present",
+    "swelling",
+    "medication_adherent",
+    "days_since_discharge",
+    "age",
+    "diagnosis_severity",
+)
+
+
+class CompiledForest:
+    """
+    Flat-array form of a fitted RandomForestClassifier.
+    Leaves point to themselves, so a fixed number of steps (max depth) lands every
+    row on its leaf without per-row branching.
+    """
+
+    def __init__(self, clf):
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        depth = 0
+        n_classes = len(clf.classes_)
+        for est in clf.estimators_:
+            t = est.tree_
+            n = t.node_count
+            idx = np.arange(n)
+            leaf = t.children_left == -1
+            features.append(np.where(leaf, 0, t.feature))
+            thresholds.append(t.threshold)
+            lefts.append(np.where(leaf, idx, t.children_left) + offset)
+            rights.append(np.where(leaf, idx, t.children_right) + offset)
+            # Per-node class distribution, normalised as in DecisionTreeClassifier.predict_proba
+            v = t.value[:, 0, :]
+            sums = v.sum(axis=1, keepdims=True)
+            sums[sums == 0] = 1.0
+            values.append(v / sums)
+            roots.append(offset)
+            offset += n
+            depth = max(depth, int(t.max_depth))
+
+        self.feature = np.concatenate(features).astype(np.intp)
+        self.threshold = np.concatenate(thresholds).astype(np.float64)
+        self.left = np.concatenate(lefts).astype(np.intp)
+        self.right = np.concatenate(rights).astype(np.intp)
+        # children[2 * node + went_right]: one gather per level instead of two plus a where
+        self.children = np.stack([self.left, self.right], axis=1).ravel()
+        self.value = np.concatenate(values).astype(np.float64)
+        self.roots = np.asarray(roots, dtype=np.intp)
+        self.depth = depth
+        self.n_classes = n_classes
+        self.classes = np.asarray(clf.classes_)
+        self.n_features = int(clf.n_features_in_)
+
+    def predict_proba(self, X: np.ndarray, chunk_rows: int = 2048) -> np.ndarray:
+        """
+        Meant for small batches (score_risk_batch uses it up to COMPILED_MAX_ROWS):
+        every (row, tree) pair costs depth NumPy gathers, which past a few hundred
+        rows loses to sklearn's Cython traversal.
+        """
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_features = X.shape[1]
+        out = np.empty((X.shape[0], self.n_classes), dtype=np.float64)
+        n_trees = len(self.roots)
+        for start in range(0, X.shape[0], chunk_rows):
+            Xc = X[start:start + chunk_rows]
+            flat = Xc.ravel()
+            # Offset of each row in flat, so the feature lookup is a 1-D gather
+            base = (np.arange(Xc.shape[0], dtype=np.intp) * n_features)[:, None]
+            node = np.broadcast_to(self.roots, (Xc.shape[0], n_trees)).copy()
+            for _ in range(self.depth):
+                went_right = flat[base + self.feature[node]] > self.threshold[node]
+                node = self.children[2 * node + went_right]
+            out[start:start + Xc.shape[0]] = self.value[node].mean(axis=1)
+        return out
+
+
+class LoadedModel:
+    """One registry version, compiled and ready to score. Never mutated after construction."""
+
+    def __init__(self, version: str):
+        self.clf, self.meta = model_registry.load(version)
+        self.version = version
+        self.compiled = CompiledForest(self.clf)
+
+    def predict_proba(self, rows: np.ndarray) -> np.ndarray:
+        if rows.shape[0] > COMPILED_MAX_ROWS:
+            return self.clf.predict_proba(np.asarray(rows, dtype=np.float32))
+        return self.compiled.predict_proba(rows)
+
+
+_production: LoadedModel | None = None
+_candidate: LoadedModel | None = None
+_reload_lock = threading.Lock()
+
+# One thread, so shadow_stats is only ever updated from it
+_shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="risk-shadow")
+_shadow_pending = 0
+_shadow_pending_lock = threading.Lock()
+
+
+def _empty_shadow_stats(production: str | None, candidate: str | None) -> dict:
+    return {
+        "production": production,
+        "candidate": candidate,
+        "rows": 0,
+        "label_agree": 0,
+        "abs_diff_sum": 0.0,
+        "max_abs_diff": 0.0,
+        "escalations": 0,     # candidate HIGH/CRITICAL where production is not
+        "de_escalations": 0,  # the reverse
+        "shadow_ms": 0.0,
+        "dropped_batches": 0,  # skipped because SHADOW_MAX_PENDING batches were already queued
+        "since": time.time(),
+    }
+
+
+# Production vs candidate agreement since the current pair was loaded (per worker)
+shadow_stats: dict = _empty_shadow_stats(None, None)
+
+
+def reload_models() -> dict:
+    """
+    Load whatever registry.json points at. Unchanged versions are reused; a version
+    that fails to load or verify leaves the current model in place.
+    Returns {"production": version, "candidate": version | None}.
+    """
+    global _production, _candidate, shadow_stats
+    with _reload_lock:
+        pointers = model_registry.read_pointers()
+        prod_version = pointers["production"] or model_registry.ensure_production()
+        cand_version = pointers["candidate"]
+
+        production = _production
+        if production is None or production.version != prod_version:
+            try:
+                production = LoadedModel(prod_version)
+            except Exception as e:
+                if production is None:
+                    raise
+                print(f"[risk_service] Keeping {production.version}; failed to load {prod_version}: {e}")
+
+        candidate = _candidate if _candidate and _candidate.version == cand_version else None
+        if cand_version and candidate is None:
+            try:
+                candidate = LoadedModel(cand_version)
+            except Exception as e:
+                print(f"[risk_service] Shadow model {cand_version} not loaded: {e}")
+
+        if (production.version, getattr(candidate, "version", None)) != (
+            shadow_stats["production"], shadow_stats["candidate"]
+        ):
+            shadow_stats = _empty_shadow_stats(production.version, getattr(candidate, "version", None))
+        _production, _candidate = production, candidate
+        print(f"[risk_service] Production risk model {production.version}"
+              + (f", shadow {candidate.version}" if candidate else ""))
+        return {"production": production.version, "candidate": getattr(candidate, "version", None)}
+
+
+def _get_production() -> LoadedModel:
+    if _production is None:
+        reload_models()
+    return _production
+
+
+def active_versions() -> dict:
+    return {
+        "production": getattr(_production, "version", None),
+        "candidate": getattr(_candidate, "version", None),
+    }
+
+
+def _labels(proba: np.ndarray, classes: np.ndarray) -> tuple[np.ndarray, list[str]]:
+    col = {int(c): i for i, c in enumerate(classes)}
+    risk = proba[:, col[2]] + proba[:, col[3]]   # P(HIGH) + P(CRITICAL)
+    labels = [_LABEL_MAP[int(classes[i])] for i in np.argmax(proba, axis=1)]
+    return risk, labels
+
 
-def _load_model():
-    if not _MODEL_PATH.exists():
-        raise FileNotFoundError(
-            f"risk_model.pkl not found at {_MODEL_PATH}. "
-            "Run: python -m module2_recoverbot.train_risk_model"
-        )
-    with open(_MODEL_PATH, "rb") as f:
-        return pickle.load(f)
+def features_to_row(features: dict) -> list[float]:
+    return [
+        float(features.get("pain_score", 5)),
+        float(int(bool(features.get("fever_present", False)))),
+        float(int(bool(features.get("swelling", False)))),
+        float(int(bool(features.get("medication_adherent", True)))),
+        float(features.get("days_since_discharge", 1)),
+        float(features.get("age", 30)),
+        float(features.get("diagnosis_severity", 2)),
+    ]
 
 
-_clf = None  # lazy load
+def score_risk_batch(rows: np.ndarray | Sequence[dict]) -> Tuple[np.ndarray, list[str]]:
+    """
+    Score many patients in one call.
+    rows: (N, 7) array in FEATURE_ORDER, or a sequence of feature dicts.
+    Returns (risk_scores: float array (N,), risk_labels: list[str]).
+    """
+    model = _get_production()
+    candidate = _candidate
+    if not isinstance(rows, np.ndarray):
+        rows = np.array([features_to_row(r) for r in rows], dtype=np.float32).reshape(-1, len(FEATURE_ORDER))
+    if rows.shape[0] == 0:
+        return np.zeros(0), []
+    scores, labels = _labels(model.predict_proba(rows), model.compiled.classes)
+    if candidate is not None:
+        _submit_shadow(candidate, model.version, rows, scores, labels)
+    return scores, labels
+
+
+def _submit_shadow(candidate: LoadedModel, production_version: str, rows: np.ndarray,
+                   scores: np.ndarray, labels: list[str]) -> None:
+    global _shadow_pending
+    with _shadow_pending_lock:
+        if _shadow_pending >= SHADOW_MAX_PENDING:
+            shadow_stats["dropped_batches"] += 1
+            return
+        _shadow_pending += 1
+    _shadow_executor.submit(_run_shadow, candidate, production_version, rows.copy(), scores, list(labels))
+
+
+def _run_shadow(*args) -> None:
+    global _shadow_pending
+    try:
+        _shadow_score(*args)
+    finally:
+        with _shadow_pending_lock:
+            _shadow_pending -= 1
+
+
+def _shadow_score(candidate: LoadedModel, production_version: str, rows: np.ndarray,
+                  scores: np.ndarray, labels: list[str]) -> None:
+    stats = shadow_stats
+    if stats["candidate"] != candidate.version or stats["production"] != production_version:
+        return  # a reload is swapping the pair; skip rather than mix versions
+    started = time.perf_counter()
+    try:
+        c_scores, c_labels = _labels(candidate.predict_proba(rows), candidate.compiled.classes)
+    except Exception as e:
+        print(f"[risk_service] Shadow scoring with {candidate.version} failed: {e}")
+        return
+    diff = np.abs(c_scores - scores)
+    high = {"HIGH", "CRITICAL"}
+    stats["rows"] += len(labels)
+    stats["label_agree"] += sum(p == c for p, c in zip(labels, c_labels))
+    stats["abs_diff_sum"] += float(diff.sum())
+    stats["max_abs_diff"] = max(stats["max_abs_diff"], float(diff.max()))
+    stats["escalations"] += sum(c in high and p not in high for p, c in zip(labels, c_labels))
+    stats["de_escalations"] += sum(p in high and c not in high for p, c in zip(labels, c_labels))
+    stats["shadow_ms"] += (time.perf_counter() - started) * 1000
+
+
+def shadow_summary() -> dict:
+    stats = dict(shadow_stats)
+    rows = stats["rows"]
+    stats["label_agreement"] = round(stats["label_agree"] / rows, 4) if rows else None
+    stats["mean_abs_diff"] = round(stats["abs_diff_sum"] / rows, 4) if rows else None
+    stats["shadow_ms"] = round(stats["shadow_ms"], 1)
+    stats["pending_batches"] = _shadow_pending
+    return stats
 
 
 def score_risk(
@@ -39,10 +311,6 @@ def score_risk(
     """
     Returns (risk_score: float 0-1, risk_label: str).
     """
-    global _clf
-    if _clf is None:
-        _clf = _load_model()
-
     features = np.array([[
         pain_score,
         int(fever_present),
@@ -53,8 +321,5 @@ def score_risk(
         diagnosis_severity,
     ]])
 
-    proba = _clf.predict_proba(features)[0]
-    label_idx = int(np.argmax(proba))
-    risk_score = float(proba[2] + proba[3])   # P(HIGH) + P(CRITICAL)
-
-    return risk_score, _LABEL_MAP[label_idx]
+    scores, labels = score_risk_batch(features)
+    return float(scores[0]), labels[0]
@@ -1,84 +1,330 @@
 """
 module2_recoverbot/services/scheduler_service.py
-APScheduler-based check-in scheduler.
-Job IDs are stored in Redis so jobs can be cancelled if needed.
+Persistent check-in scheduler.
+
+Each check-in is a document in `checkin_slots` with an indexed `next_due_at`,
+so pending check-ins survive restarts and do not live in worker RAM. One
+worker at a time holds a Redis leader lease and polls for due slots in
+batches (an APScheduler interval job); the others stay idle until the lease
+expires. Slots whose time passed while the service was down are caught up on
+the next poll: only the latest due slot per followup is sent, older ones are
+marked `missed`.
+
+Due slots are claimed as a window (everything due up to DISPATCH_WINDOW_SECONDS
+ahead) and handed to the batch handler in one call, so followup_service can
+prefetch with `$in` and commit with `bulk_write` instead of per-slot round trips.
+
+A nightly cron job (leader only) re-scores all open followups so risk labels
+track days_since_discharge even when the patient has gone quiet.
 """
 from __future__ import annotations
-import asyncio
-import json
 import os
+import uuid
+import time
 from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-import redis.asyncio as aioredis
+from bson import ObjectId
 from dotenv import load_dotenv
+from pymongo import ASCENDING, UpdateOne
 
-load_dotenv()
+from shared.database import db
+from shared.events import get_redis
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+load_dotenv()
 
 # Offsets in hours from discharge time
 CHECKIN_OFFSETS_HOURS = [6, 24, 48, 72, 24 * 7, 24 * 14]
 
+POLL_SECONDS = int(os.getenv("CHECKIN_POLL_SECONDS", "30"))
+BATCH_SIZE = int(os.getenv("CHECKIN_BATCH_SIZE", "500"))
+DISPATCH_WINDOW_SECONDS = int(os.getenv("CHECKIN_DISPATCH_WINDOW_SECONDS", "60"))
+LEASE_SECONDS = int(os.getenv("CHECKIN_LEASE_SECONDS", "300"))
+RESCORE_HOUR_UTC = int(os.getenv("RISK_RESCORE_HOUR_UTC", "3"))
+MAX_ATTEMPTS = 3
+RETRY_DELAY = timedelta(minutes=10)
+
+LEADER_KEY = "recoverbot:scheduler:leader"
+LEADER_TTL_MS = POLL_SECONDS * 3 * 1000
+
 scheduler = AsyncIOScheduler()
 
+_worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_indexes_ready = False
+
+# Set by followup_service: async fn(slots) -> {slot_id: (outcome, error)}
+# where outcome is 'sent' | 'skipped' | 'failed'
+_checkin_batch_handler: Callable[[list[dict]], Awaitable[dict]] | None = None
+
+# Set by followup_service: async fn() -> stats dict, run nightly
+_rescore_handler: Callable[[], Awaitable[dict]] | None = None
+
+# Stats of the most recent dispatch batch, exposed via GET /api/recoverbot/scheduler/stats
+last_dispatch_stats: dict = {}
+
+
+def set_checkin_batch_handler(handler: Callable[[list[dict]], Awaitable[dict]]) -> None:
+    global _checkin_batch_handler
+    _checkin_batch_handler = handler
+
+
+def set_rescore_handler(handler: Callable[[], Awaitable[dict]]) -> None:
+    global _rescore_handler
+    _rescore_handler = handler
+
 
 def start_scheduler():
     if not scheduler.running:
+        scheduler.add_job(
+            poll_due_checkins, "interval", seconds=POLL_SECONDS,
+            id="checkin_dispatcher", max_instances=1, coalesce=True,
+            next_run_time=datetime.now(),
+        )
+        scheduler.add_job(
+            nightly_rescore, "cron", hour=RESCORE_HOUR_UTC, minute=0, timezone="UTC",
+            id="risk_rescore", max_instances=1, coalesce=True,
+        )
         scheduler.start()
 
 
-async def _store_job_ids(patient_id: str, job_ids: list[str]) -> None:
-    r = await aioredis.from_url(REDIS_URL, decode_responses=True)
-    await r.set(f"scheduler_jobs:{patient_id}", json.dumps(job_ids), ex=60 * 60 * 24 * 15)
-    await r.aclose()
+async def ensure_indexes() -> None:
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    await db.checkin_slots.create_index([("status", ASCENDING), ("next_due_at", ASCENDING)])
+    await db.checkin_slots.create_index([("followup_id", ASCENDING), ("slot_index", ASCENDING)], unique=True)
+    await db.checkin_slots.create_index([("patient_id", ASCENDING), ("status", ASCENDING)])
+    _indexes_ready = True
+
 
+# ─── Leader election ─────────────────────────────────────────────────────────
 
-async def _get_job_ids(patient_id: str) -> list[str]:
-    r = await aioredis.from_url(REDIS_URL, decode_responses=True)
-    raw = await r.get(f"scheduler_jobs:{patient_id}")
-    await r.aclose()
-    return json.loads(raw) if raw else []
+async def _acquire_leadership() -> bool:
+    """Take or renew the dispatcher lease. Only the holder polls for due slots."""
+    r = await get_redis()
+    if await r.set(LEADER_KEY, _worker_id, nx=True, px=LEADER_TTL_MS):
+        return True
+    holder = await r.get(LEADER_KEY)
+    if holder is not None and holder.decode() == _worker_id:
+        await r.pexpire(LEADER_KEY, LEADER_TTL_MS)
+        return True
+    return False
 
 
-async def schedule_checkins(patient_id: str, followup_id: str, checkin_callback) -> list[dict]:
+# ─── Scheduling ──────────────────────────────────────────────────────────────
+
+def schedule_entries(offsets_hours: list[float], base_time: datetime) -> list[dict]:
+    """The followup.checkin_schedule entries for slots at these offsets after base_time."""
+    return [{
+        "scheduled_at": (base_time + timedelta(hours=h)).isoformat(),
+        "completed_at": None,
+        "status": "pending",
+        "offset_hours": h,
+    } for h in offsets_hours]
+
+
+async def schedule_checkins(
+    patient_id: str,
+    followup_id: str,
+    offsets_hours: list[float] | None = None,
+    base_time: datetime | None = None,
+    first_index: int = 0,
+) -> list[dict]:
     """
-    Schedule 6 check-in jobs. Returns list of CheckinSlot dicts.
-    checkin_callback(patient_id, followup_id, slot_index) is the async fn to call.
+    Persist one check-in slot per offset (default CHECKIN_OFFSETS_HOURS) after
+    base_time (default now), numbered from first_index.
+    Returns list of CheckinSlot dicts to append to the followup's checkin_schedule.
     """
-    now = datetime.utcnow()
-    slots = []
-    job_ids = []
-
-    for i, offset_h in enumerate(CHECKIN_OFFSETS_HOURS):
-        run_at = now + timedelta(hours=offset_h)
-        job_id = f"checkin_{patient_id}_{i}"
+    await ensure_indexes()
 
-        scheduler.add_job(
-            checkin_callback,
-            "date",
-            run_date=run_at,
-            args=[patient_id, followup_id, i],
-            id=job_id,
-            replace_existing=True,
-        )
-        job_ids.append(job_id)
-        slots.append({
-            "scheduled_at": run_at.isoformat(),
-            "completed_at": None,
+    offsets = CHECKIN_OFFSETS_HOURS if offsets_hours is None else offsets_hours
+    now = datetime.utcnow()
+    base = base_time or now
+    slot_docs = []
+    slots = schedule_entries(offsets, base)
+    for i, offset_h in enumerate(offsets, start=first_index):
+        run_at = base + timedelta(hours=offset_h)
+        slot_docs.append({
+            "followup_id": followup_id,
+            "patient_id": patient_id,
+            "slot_index": i,
+            "offset_hours": offset_h,
+            "next_due_at": run_at,
             "status": "pending",
+            "attempts": 0,
+            "created_at": now,
         })
 
-    await _store_job_ids(patient_id, job_ids)
+    if slot_docs:
+        await db.checkin_slots.insert_many(slot_docs, ordered=False)
     return slots
 
 
-async def cancel_checkins(patient_id: str) -> int:
-    """Cancel all scheduled check-ins for a patient. Returns count cancelled."""
-    job_ids = await _get_job_ids(patient_id)
-    cancelled = 0
-    for job_id in job_ids:
-        job = scheduler.get_job(job_id)
-        if job:
-            job.remove()
-            cancelled += 1
-    return cancelled
+async def cancel_checkins(patient_id: str, followup_id: str | None = None) -> int:
+    """Cancel all pending check-ins for a patient (optionally one followup). Returns count cancelled."""
+    query: dict = {"patient_id": patient_id, "status": "pending"}
+    if followup_id:
+        query["followup_id"] = followup_id
+    result = await db.checkin_slots.update_many(
+        query, {"$set": {"status": "cancelled", "cancelled_at": datetime.utcnow()}}
+    )
+    return result.modified_count
+
+
+async def cancel_pending_slots(followup_id: str, reason: str, before_index: int | None = None) -> list[int]:
+    """
+    Cancel one followup's pending slots (only those numbered below before_index, if given).
+    Returns the slot_index of each slot actually cancelled.
+    """
+    now = datetime.utcnow()
+    query: dict = {"followup_id": followup_id, "status": "pending"}
+    if before_index is not None:
+        query["slot_index"] = {"$lt": before_index}
+    await db.checkin_slots.update_many(
+        query,
+        {"$set": {"status": "cancelled", "cancelled_at": now, "cancel_reason": reason}},
+    )
+    # Slots claimed by the dispatcher in the meantime were not touched; read back what we did cancel
+    cancelled = db.checkin_slots.find(
+        {"followup_id": followup_id, "status": "cancelled", "cancelled_at": now}, {"slot_index": 1},
+    )
+    return sorted([s["slot_index"] async for s in cancelled])
+
+
+# ─── Dispatch ────────────────────────────────────────────────────────────────
+
+async def _claim_due(now: datetime) -> list[dict]:
+    """Fetch one window of due slots (including expired leases) and lease them to this worker."""
+    window_end = now + timedelta(seconds=DISPATCH_WINDOW_SECONDS)
+    due_query = {
+        "$or": [
+            {"status": "pending", "next_due_at": {"$lte": window_end}},
+            {"status": "dispatching", "leased_until": {"$lt": now}},
+        ]
+    }
+    batch = await db.checkin_slots.find(due_query).sort("next_due_at", ASCENDING).to_list(length=BATCH_SIZE)
+    if not batch:
+        return []
+    await db.checkin_slots.update_many(
+        {"_id": {"$in": [s["_id"] for s in batch]}},
+        {"$set": {"status": "dispatching", "leased_until": now + timedelta(seconds=LEASE_SECONDS),
+                  "leased_by": _worker_id}},
+    )
+    return batch
+
+
+def _collapse_missed(batch: list[dict]) -> tuple[list[dict], list[dict]]:
+    """Keep only the latest due slot per followup; earlier ones were missed during downtime."""
+    latest: dict[str, dict] = {}
+    missed = []
+    for slot in batch:
+        prev = latest.get(slot["followup_id"])
+        if prev is None or slot["slot_index"] > prev["slot_index"]:
+            if prev is not None:
+                missed.append(prev)
+            latest[slot["followup_id"]] = slot
+        else:
+            missed.append(slot)
+    return list(latest.values()), missed
+
+
+async def _mark_missed(slots: list[dict], now: datetime) -> None:
+    if not slots:
+        return
+    await db.checkin_slots.update_many(
+        {"_id": {"$in": [s["_id"] for s in slots]}},
+        {"$set": {"status": "missed", "missed_at": now}},
+    )
+    await db.followups.bulk_write([
+        UpdateOne(
+            {"_id": ObjectId(s["followup_id"])},
+            {"$set": {f"checkin_schedule.{s['slot_index']}.status": "missed"}},
+        )
+        for s in slots
+    ], ordered=False)
+
+
+async def _commit_results(slots: list[dict], results: dict) -> dict:
+    """Write every slot's outcome back in one bulk_write. Returns outcome counts."""
+    now = datetime.utcnow()
+    counts = {"sent": 0, "skipped": 0, "failed": 0}
+    ops = []
+    for slot in slots:
+        outcome, error = results.get(slot["_id"], ("failed", "no result from handler"))
+        counts[outcome] = counts.get(outcome, 0) + 1
+        if outcome == "failed":
+            attempts = slot.get("attempts", 0) + 1
+            ops.append(UpdateOne({"_id": slot["_id"]}, {"$set": {
+                "status": "failed" if attempts >= MAX_ATTEMPTS else "pending",
+                "attempts": attempts,
+                "next_due_at": now + RETRY_DELAY,
+                "last_error": str(error)[:300],
+            }}))
+        else:
+            ops.append(UpdateOne({"_id": slot["_id"]}, {"$set": {
+                "status": "completed" if outcome == "sent" else "skipped",
+                "completed_at": now,
+            }}))
+    if ops:
+        await db.checkin_slots.bulk_write(ops, ordered=False)
+    return counts
+
+
+async def _dispatch_batch(slots: list[dict]) -> dict:
+    try:
+        return await _checkin_batch_handler(slots)
+    except Exception as e:
+        print(f"[scheduler] Batch handler error: {e}")
+        return {s["_id"]: ("failed", str(e)) for s in slots}
+
+
+async def poll_due_checkins() -> None:
+    """Interval job: if this worker is leader, drain due slots window by window."""
+    global last_dispatch_stats
+    if _checkin_batch_handler is None:
+        return
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        print(f"[scheduler] Index setup failed: {e}")
+        return
+
+    while True:
+        now = datetime.utcnow()
+        if not await _acquire_leadership():
+            return
+        batch = await _claim_due(now)
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        to_send, missed = _collapse_missed(batch)
+        await _mark_missed(missed, now)
+        results = await _dispatch_batch(to_send)
+        counts = await _commit_results(to_send, results)
+
+        last_dispatch_stats = {
+            "batch_size": len(batch),
+            "dispatched": len(to_send),
+            "missed": len(missed),
+            **counts,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "finished_at": datetime.utcnow().isoformat(),
+        }
+        print(f"[scheduler] Batch of {len(batch)}: {counts['sent']} sent, {counts['skipped']} skipped, "
+              f"{counts['failed']} failed, {len(missed)} missed in {last_dispatch_stats['duration_ms']}ms")
+        if len(batch) < BATCH_SIZE:
+            return
+
+
+async def nightly_rescore() -> None:
+    """Cron job: the dispatcher leader re-scores every open followup."""
+    if _rescore_handler is None:
+        return
+    try:
+        if not await _acquire_leadership():
+            return
+        await _rescore_handler()
+    except Exception as e:
+        print(f"[scheduler] Nightly re-score failed: {e}")
@@ -0,0 +1,168 @@
+"""
+module2_recoverbot/services/symptom_rules.py
+Deterministic symptom extractor for patient replies.
+
+Handles the trivially structured cases ("pain is 3", "no fever", "took my meds")
+with regexes, number parsing and a short negation window, and only reports a
+field when every mention of it in the message agrees and none of them sits in
+a hedged clause ("not sure", "maybe", "I think"). Anything it cannot resolve
+is left to the LLM (see feature_store).
+"""
+from __future__ import annotations
+import re
+
+_NUMBER_WORDS = {
+    "zero": 0, "none": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+_NUM = r"(\d+(?:\.\d+)?|" + "|".join(_NUMBER_WORDS) + r")"
+
+_NEGATIONS = {"no", "not", "none", "never", "without", "nil", "zero", "dont", "didnt", "doesnt",
+              "havent", "hasnt", "isnt", "arent", "wasnt", "cant", "neither", "nor"}
+_NEGATION_WINDOW = 5
+_CLAUSE_BREAK = re.compile(r"[,.;!?]|\bbut\b|\bthough\b|\bhowever\b")
+# Uncertainty in the same clause as a mention: the field is left to the LLM
+_HEDGES = re.compile(
+    r"\b(?:not (?:sure|certain)|unsure|uncertain|maybe|perhaps|possibly|probably|might|may be|"
+    r"i think|i guess|i suppose|i believe|(?:don'?t|do not|dont) know|no idea|can'?t tell|hard to (?:say|tell)|"
+    r"not really sure|kind of|sort of|kinda|sorta|seems?|seemed)\b"
+)
+# "fever is gone", "swelling went away"
+_RESOLVED_AFTER = re.compile(r"^\W*(?:is|has|have|had)?\s*(?:gone|went away|resolved|disappeared|subsided|settled)\b")
+
+_PAIN_SCORE_PATTERNS = [
+    re.compile(rf"\bpain\w*\s+(?:is|was|at|of|level|score|about|around|=|:)?\s*(?:is|of|at|about|around|=|:)?\s*{_NUM}\b(?!\s*(?:days?|hours?|weeks?|am|pm|%))"),
+    re.compile(rf"\b{_NUM}\s*(?:/|out of)\s*10\b"),
+    re.compile(rf"\b(?:rate|rated|rating)\s+(?:it|my pain|the pain)?\s*(?:a|an|as)?\s*{_NUM}\b"),
+]
+_NO_PAIN = re.compile(r"\b(?:no pain|pain[- ]free|not in (?:any )?pain|(?:doesn'?t|does not|don'?t) hurt|pain (?:is )?gone)\b")
+
+_FEVER_TERMS = re.compile(r"\b(?:fever\w*|febrile|temperature|temp|chills)\b")
+_TEMP_VALUE = re.compile(r"\b(?:temp(?:erature)?|fever)\D{0,12}?(\d{2,3}(?:\.\d)?)\s*°?\s*([cf])?\b")
+
+_SWELLING_TERMS = re.compile(r"\b(?:swell\w*|swollen|puffy|puffiness)\b")
+
+# "missed one dose", "skipped a few of my pills", "forgot my evening tablets"
+_MED_QUANTITY = (
+    r"(?:(?:all|any|one|a|an|some|several|a few|a couple|two|three|\d+)\s+(?:of\s+)?)?"
+    r"(?:(?:my|the|his|her|their)\s+)?"
+    r"(?:(?:morning|afternoon|evening|night|nightly|bedtime|last|today'?s|yesterday'?s)\s+)?"
+)
+_MED_TAKEN = re.compile(
+    r"\b(?:took|taken|taking|take|had|finished|on)\s+(?:all\s+)?(?:my|the|his|her|their)?\s*"
+    r"(?:meds|medicines?|medications?|tablets?|pills?|antibiotics?|doses?)\b"
+)
+_MED_MISSED = re.compile(
+    r"\b(?:missed|forgot|forgotten|skipped|stopped|ran out of|run out of|not taking|haven'?t taken|"
+    r"didn'?t take|did not take|have not taken|not taken)\s+(?:to take\s+)?" + _MED_QUANTITY +
+    r"(?:meds|medicines?|medications?|tablets?|pills?|antibiotics?|doses?)\b"
+)
+
+
+def _num(token: str) -> float | None:
+    if token in _NUMBER_WORDS:
+        return float(_NUMBER_WORDS[token])
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _negated(text: str, start: int, end: int) -> bool:
+    clause = _CLAUSE_BREAK.split(text[:start])[-1]
+    before = re.findall(r"[a-z']+", clause)[-_NEGATION_WINDOW:]
+    if any(w.replace("'", "") in _NEGATIONS for w in before):
+        return True
+    return bool(_RESOLVED_AFTER.match(text[end:end + 30]))
+
+
+def _hedged(text: str, patterns: list[re.Pattern]) -> bool:
+    """Whether any mention matched by patterns shares a clause with a hedge."""
+    for pattern in patterns:
+        for m in pattern.finditer(text):
+            before = _CLAUSE_BREAK.split(text[:m.start()])[-1]
+            after = _CLAUSE_BREAK.split(text[m.end():])[0]
+            if _HEDGES.search(before + text[m.start():m.end()] + after):
+                return True
+    return False
+
+
+def _polarity(text: str, pattern: re.Pattern) -> bool | None:
+    """True/False if every mention agrees (present/negated), None if absent or mixed."""
+    votes = {not _negated(text, m.start(), m.end()) for m in pattern.finditer(text)}
+    return votes.pop() if len(votes) == 1 else None
+
+
+def _pain_score(text: str) -> int | None:
+    values = set()
+    if _NO_PAIN.search(text):
+        values.add(0)
+    for pattern in _PAIN_SCORE_PATTERNS:
+        for m in pattern.finditer(text):
+            v = _num(m.group(1))
+            if v is not None and 0 <= v <= 10:
+                values.add(int(round(v)))
+    return values.pop() if len(values) == 1 else None
+
+
+def _fever(text: str) -> bool | None:
+    readings = set()
+    for m in _TEMP_VALUE.finditer(text):
+        v = float(m.group(1))
+        unit = m.group(2) or ("f" if v > 50 else "c")
+        readings.add(v >= (100.4 if unit == "f" else 38.0))
+    if len(readings) == 1:
+        return readings.pop()
+    if readings:
+        return None
+    polarity = _polarity(text, _FEVER_TERMS)
+    # A bare "temperature" mention without a value or negation is not evidence of fever
+    if polarity and not re.search(r"\b(?:fever\w*|febrile|chills)\b", text):
+        return None
+    return polarity
+
+
+def _adherence(text: str) -> bool | None:
+    missed = bool(_MED_MISSED.search(text))
+    taken = any(not _negated(text, m.start(), m.end()) for m in _MED_TAKEN.finditer(text)
+                if not _MED_MISSED.search(text[max(0, m.start() - 20):m.end()]))
+    if missed and not taken:
+        return False
+    if taken and not missed:
+        return True
+    return None
+
+
+def extract_rule_features(message: str) -> dict:
+    """Return only the features this message states unambiguously."""
+    text = (message or "").lower().replace("’", "'")
+    found: dict = {}
+    pain = _pain_score(text)
+    if pain is not None and not _hedged(text, _PAIN_SCORE_PATTERNS + [_NO_PAIN]):
+        found["pain_score"] = pain
+    fever = _fever(text)
+    if fever is not None and not _hedged(text, [_FEVER_TERMS, _TEMP_VALUE]):
+        found["fever_present"] = fever
+    swelling = _polarity(text, _SWELLING_TERMS)
+    if swelling is not None and not _hedged(text, [_SWELLING_TERMS]):
+        found["swelling"] = swelling
+    adherent = _adherence(text)
+    if adherent is not None and not _hedged(text, [_MED_TAKEN, _MED_MISSED]):
+        found["medication_adherent"] = adherent
+    return found
+
+
+# Words suggesting a message carries information about a field the rules did not resolve
+FIELD_CUES = {
+    "pain_score": re.compile(r"\b(?:pain\w*|hurt\w*|ache\w*|aching|sore\w*|agony|tender\w*|discomfort)\b"),
+    "fever_present": re.compile(r"\b(?:fever\w*|febrile|temp\w*|chills|hot|shiver\w*|sweat\w*)\b"),
+    "swelling": re.compile(r"\b(?:swell\w*|swollen|puff\w*|bloat\w*|lump)\b"),
+    "medication_adherent": re.compile(r"\b(?:med\w*|pills?|tablets?|doses?|antibiotics?|prescription)\b"),
+    "diagnosis_severity": re.compile(r"\b(?:wors\w*|bad|severe|terrible|awful|better|improv\w*|bleed\w*|pus|wound|infect\w*)\b"),
+}
+
+
+def unresolved_mentions(message: str, resolved: set[str]) -> list[str]:
+    """Fields the message appears to talk about that the rules could not resolve."""
+    text = (message or "").lower()
+    return [f for f, cue in FIELD_CUES.items() if f not in resolved and cue.search(text)]
@@ -1,13 +1,30 @@
 """
 module2_recoverbot/train_risk_model.py
-Run this once to generate risk_model.pkl.
-Usage: python -m module2_recoverbot.train_risk_model
+Train a risk model and register it as a new version in the model registry.
+Usage:
+    python -m module2_recoverbot.train_risk_model                      # synthetic data only
+    python -m module2_recoverbot.train_risk_model --source outcomes    # real outcomes + synthetic prior
+    python -m module2_recoverbot.train_risk_model --shadow             # ...and load it as shadow candidate
+    python -m module2_recoverbot.train_risk_model --promote            # ...or make it production directly
+
+Real outcomes are followups with a clinician-recorded `outcome_label`
+(POST /api/recoverbot/followups/{id}/outcome). Every symptom_features history
+row of such a followup becomes one training row labelled with that outcome.
+The holdout that gates promotion is split by followup (all rows of a followup
+land on the same side) and holds real outcome rows only; the synthetic prior
+is always training data.
 """
-import pickle
+import argparse
+import asyncio
+from datetime import datetime
+
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
+from sklearn.metrics import classification_report, recall_score
+from sklearn.model_selection import GroupShuffleSplit, train_test_split
+
+from module2_recoverbot.services import model_registry
+from module2_recoverbot.services.risk_service import FEATURE_ORDER, _LABEL_MAP
 
 # ── Synthetic training data ───────────────────────────────────────────────────
 # Features (in order):
@@ -17,43 +34,215 @@ from sklearn.metrics import classification_report
 #
 # Labels: 0=LOW, 1=MEDIUM, 2=HIGH, 3=CRITICAL
 
-rng = np.random.default_rng(42)
-
-def _generate(n: int, pain_range, fever_p, swell_p, adhere_p, days_range, age_range, sev_range, label):
-    rows = []
-    for _ in range(n):
-        rows.append([
-            rng.integers(*pain_range),
-            int(rng.random() < fever_p),
-            int(rng.random() < swell_p),
-            int(rng.random() < adhere_p),
-            rng.integers(*days_range),
-            rng.integers(*age_range),
-            rng.integers(*sev_range),
-            label,
-        ])
-    return rows
-
-data = (
-    _generate(400, (0, 4),  0.05, 0.05, 0.95, (1,15), (18,80), (1,2), 0) +  # LOW
-    _generate(300, (3, 6),  0.2,  0.3,  0.7,  (1,15), (18,80), (1,3), 1) +  # MEDIUM
-    _generate(200, (6, 9),  0.5,  0.5,  0.4,  (1,15), (18,80), (2,4), 2) +  # HIGH
-    _generate(100, (8, 11), 0.8,  0.7,  0.1,  (1,15), (18,80), (2,4), 3)    # CRITICAL
-)
-
-arr = np.array(data)
-X, y = arr[:, :7], arr[:, 7]
-
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
-clf = RandomForestClassifier(n_estimators=200, max_depth=10, random_state=42)
-clf.fit(X_train, y_train)
-
-print(classification_report(y_test, clf.predict(X_test),
-                            target_names=["LOW", "MEDIUM", "HIGH", "CRITICAL"]))
-
-MODEL_PATH = "module2_recoverbot/risk_model.pkl"
-with open(MODEL_PATH, "wb") as f:
-    pickle.dump(clf, f)
-
-print(f"✅  Model saved to {MODEL_PATH}")
+# label: (n, pain_range, fever_p, swell_p, adhere_p, days_range, age_range, sev_range)
+_PROFILES = {
+    0: (400, (0, 4),  0.05, 0.05, 0.95, (1, 15), (18, 80), (1, 2)),
+    1: (300, (3, 6),  0.2,  0.3,  0.7,  (1, 15), (18, 80), (1, 3)),
+    2: (200, (6, 9),  0.5,  0.5,  0.4,  (1, 15), (18, 80), (2, 4)),
+    3: (100, (8, 11), 0.8,  0.7,  0.1,  (1, 15), (18, 80), (2, 4)),
+}
+
+_LABEL_IDS = {v: k for k, v in _LABEL_MAP.items()}
+
+MODEL_PARAMS = {"n_estimators": 200, "max_depth": 10, "random_state": 42}
+
+
+def synthetic_dataset(scale: float = 1.0, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    X_parts, y_parts = [], []
+    for label, (n, pain, fever_p, swell_p, adhere_p, days, age, sev) in _PROFILES.items():
+        n = max(1, int(n * scale))
+        X_parts.append(np.column_stack([
+            rng.integers(*pain, n),
+            rng.random(n) < fever_p,
+            rng.random(n) < swell_p,
+            rng.random(n) < adhere_p,
+            rng.integers(*days, n),
+            rng.integers(*age, n),
+            rng.integers(*sev, n),
+        ]).astype(np.float32))
+        y_parts.append(np.full(n, label))
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+# ── Real outcomes ─────────────────────────────────────────────────────────────
+
+async def export_outcomes() -> tuple[np.ndarray, np.ndarray, np.ndarray, int]:
+    """
+    Pull labelled followups and their feature history from Mongo.
+    Returns (X, y, followup_ids per row, n_followups).
+    """
+    from bson import ObjectId
+    from shared.database import db
+
+    followups = await db.followups.find(
+        {"outcome_label": {"$in": list(_LABEL_IDS)}},
+        {"outcome_label": 1, "patient_id": 1, "created_at": 1, "symptom_state": 1},
+    ).to_list(length=None)
+    if not followups:
+        return np.zeros((0, len(FEATURE_ORDER)), np.float32), np.zeros(0, int), np.zeros(0, object), 0
+
+    by_id = {str(f["_id"]): f for f in followups}
+    patient_oids = []
+    for f in followups:
+        try:
+            patient_oids.append(ObjectId(f["patient_id"]))
+        except Exception:
+            pass
+    ages = {
+        str(p["_id"]): p.get("age") or 30
+        async for p in db.patients.find({"_id": {"$in": patient_oids}}, {"age": 1})
+    }
+
+    history = await db.symptom_features.find(
+        {"followup_id": {"$in": list(by_id)}},
+        {"followup_id": 1, "features": 1, "created_at": 1},
+    ).to_list(length=None)
+
+    # One row per history entry; followups without history contribute their final state
+    records = [(h["followup_id"], h.get("features") or {}, h.get("created_at")) for h in history]
+    with_history = {h["followup_id"] for h in history}
+    for fid, f in by_id.items():
+        if fid not in with_history:
+            state = f.get("symptom_state") or {}
+            records.append((fid, {k: v.get("value") for k, v in state.items()}, None))
+
+    fids = [r[0] for r in records]
+    feats = [r[1] for r in records]
+    created = np.array([by_id[fid]["created_at"] for fid in fids], dtype="datetime64[s]")
+    observed = np.array([r[2] or datetime.utcnow() for r in records], dtype="datetime64[s]")
+    days_at_row = np.maximum(1, (observed - created).astype("timedelta64[D]").astype(int))
+
+    defaults = {"pain_score": 5, "fever_present": 0, "swelling": 0, "medication_adherent": 1,
+                "diagnosis_severity": 2}
+    X = np.empty((len(records), len(FEATURE_ORDER)), np.float32)
+    for j, name in enumerate(FEATURE_ORDER):
+        if name == "days_since_discharge":
+            stored = [f.get(name) for f in feats]
+            X[:, j] = [s if s is not None else d for s, d in zip(stored, days_at_row)]
+        elif name == "age":
+            X[:, j] = [f.get("age") or ages.get(by_id[fid]["patient_id"], 30) for fid, f in zip(fids, feats)]
+        else:
+            X[:, j] = [float(f.get(name) if f.get(name) is not None else defaults[name]) for f in feats]
+    y = np.array([_LABEL_IDS[by_id[fid]["outcome_label"]] for fid in fids])
+    return X, y, np.array(fids, dtype=object), len(followups)
+
+
+# ── Training ──────────────────────────────────────────────────────────────────
+
+def _evaluate(clf, X_test, y_test) -> dict:
+    pred = clf.predict(X_test)
+    high = y_test >= 2
+    return {
+        "accuracy": round(float((pred == y_test).mean()), 4),
+        "high_risk_recall": round(float(recall_score(high, pred >= 2, zero_division=0)), 4),
+        "test_rows": int(len(y_test)),
+    }
+
+
+def holdout_split(y: np.ndarray, groups: np.ndarray | None = None, eligible: np.ndarray | None = None,
+                  test_size: float = 0.2, seed: int = 42) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (train, test) row indices. Only `eligible` rows (bool mask, default all) can
+    be held out; the rest always train. With groups (followup id per row) the
+    holdout takes whole groups, so no followup is on both sides. Without groups
+    the split is stratified when every class has at least two rows.
+    """
+    candidates = np.flatnonzero(np.ones(len(y), bool) if eligible is None else eligible)
+    if groups is not None:
+        if len(set(groups[candidates])) < 2:
+            raise ValueError("need outcomes from at least 2 followups to hold any out")
+        splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=seed)
+        _, test_pos = next(splitter.split(candidates, groups=groups[candidates]))
+        test = candidates[test_pos]
+    else:
+        _, counts = np.unique(y[candidates], return_counts=True)
+        stratify = y[candidates] if len(counts) > 1 and counts.min() >= 2 else None
+        _, test = train_test_split(candidates, test_size=test_size, random_state=seed, stratify=stratify)
+    train_mask = np.ones(len(y), bool)
+    train_mask[test] = False
+    return np.flatnonzero(train_mask), np.sort(test)
+
+
+def train(X: np.ndarray, y: np.ndarray, sample_weight: np.ndarray,
+          groups: np.ndarray | None = None, holdout_eligible: np.ndarray | None = None,
+          ) -> tuple[RandomForestClassifier, dict]:
+    train_idx, test_idx = holdout_split(y, groups, holdout_eligible)
+    X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+    w_train = sample_weight[train_idx]
+    clf = RandomForestClassifier(**MODEL_PARAMS)
+    clf.fit(X_train, y_train, sample_weight=w_train)
+
+    present = sorted(set(y_test))
+    print(classification_report(y_test, clf.predict(X_test), labels=present,
+                                target_names=[_LABEL_MAP[int(c)] for c in present], zero_division=0))
+    metrics = _evaluate(clf, X_test, y_test)
+
+    # Same holdout through the current production model, for the promotion decision
+    production = model_registry.read_pointers()["production"]
+    if production:
+        try:
+            current, _ = model_registry.load(production)
+            metrics["production_on_holdout"] = {"version": production, **_evaluate(current, X_test, y_test)}
+        except Exception as e:
+            print(f"Could not evaluate production {production}: {e}")
+    return clf, metrics
+
+
+async def _announce(pointers: dict) -> None:
+    from shared.events import publish
+    await publish("risk_model.changed", pointers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", choices=["synthetic", "outcomes"], default="synthetic")
+    parser.add_argument("--synthetic-weight", type=float, default=0.25,
+                        help="sample weight of synthetic rows when training on outcomes")
+    parser.add_argument("--min-outcome-rows", type=int, default=200)
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--shadow", action="store_true", help="load the new version as shadow candidate")
+    group.add_argument("--promote", action="store_true", help="make the new version production")
+    args = parser.parse_args()
+
+    X, y = synthetic_dataset()
+    weights = np.ones(len(y))
+    groups, holdout_eligible = None, None
+    meta = {"source": "synthetic", "synthetic_rows": int(len(y)), "outcome_rows": 0, "outcome_followups": 0}
+
+    if args.source == "outcomes":
+        X_real, y_real, fids, n_followups = asyncio.run(export_outcomes())
+        print(f"Exported {len(y_real)} outcome rows from {n_followups} followups")
+        if len(y_real) < args.min_outcome_rows:
+            raise SystemExit(f"Need at least {args.min_outcome_rows} outcome rows, got {len(y_real)}")
+        # Synthetic rows stay in as a down-weighted prior for classes the outcomes barely cover,
+        # but only ever as training data: the holdout is real followups, split by followup
+        X = np.concatenate([X_real, X])
+        y = np.concatenate([y_real, y])
+        weights = np.concatenate([np.ones(len(y_real)), np.full(len(weights), args.synthetic_weight)])
+        groups = np.concatenate([fids, np.array([f"synthetic-{i}" for i in range(len(weights) - len(y_real))],
+                                                dtype=object)])
+        holdout_eligible = np.arange(len(y)) < len(y_real)
+        meta.update(source="outcomes", outcome_rows=int(len(y_real)), outcome_followups=n_followups,
+                    synthetic_weight=args.synthetic_weight)
+
+    try:
+        clf, metrics = train(X, y, weights, groups, holdout_eligible)
+    except ValueError as e:
+        raise SystemExit(f"Cannot train: {e}")
+    meta.update(metrics=metrics, params=MODEL_PARAMS, feature_order=list(FEATURE_ORDER),
+                label_counts={_LABEL_MAP[int(k)]: int(v) for k, v in zip(*np.unique(y, return_counts=True))})
+    registered = model_registry.register(clf, meta)
+    print(f"✅  Registered {registered['version']} in {model_registry.REGISTRY_DIR}")
+
+    if args.shadow or args.promote:
+        pointers = model_registry.set_pointer("production" if args.promote else "candidate", registered["version"])
+        try:
+            asyncio.run(_announce(pointers))
+        except Exception as e:
+            print(f"Could not publish risk_model.changed ({e}); workers pick it up on restart")
+        print(f"✅  {'Promoted to production' if args.promote else 'Loaded as shadow candidate'}")
+
+
+if __name__ == "__main__":
+    main()
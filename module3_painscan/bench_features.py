@@ -0,0 +1,86 @@
+"""
+module3_painscan/bench_features.py
+Compare the vectorized landmark features against the old per-pair loop.
+Usage: python -m module3_painscan.bench_features
+
+Checks both give the same features, then times per-frame feature extraction
+for the loop (pt()/dist() closures over MediaPipe landmark objects), the
+vectorized path (landmarks_to_array + feature_matrix) and a batched
+feature_matrix call over a buffered window of frames.
+"""
+import time
+
+import numpy as np
+
+from module3_painscan.services.facial_features import FEATURE_NAMES, feature_matrix, landmarks_to_array
+
+N_LANDMARKS = 478
+
+
+class _Landmark:
+    __slots__ = ("x", "y")
+
+    def __init__(self, x, y):
+        self.x, self.y = x, y
+
+
+def _loop_features(landmarks) -> dict:
+    """extract_landmarks' feature code before vectorization, kept as the reference."""
+    def pt(idx):
+        return np.array([landmarks[idx].x, landmarks[idx].y])
+
+    def dist(idx1, idx2):
+        return np.linalg.norm(pt(idx1) - pt(idx2))
+
+    ys = [lm.y for lm in landmarks]
+    xs = [lm.x for lm in landmarks]
+    face_height = max(ys) - min(ys)
+    face_width = max(xs) - min(xs)
+    if face_height == 0: face_height = 0.01
+    if face_width == 0: face_width = 0.01
+    return {
+        "brow_lower": dist(105, 336) / face_width,
+        "brow_furrow": dist(10, 151) / face_height,
+        "eye_squint": (dist(159, 145) / face_height + dist(386, 374) / face_height) / 2.0,
+        "upper_lip_raise": dist(2, 0) / face_height,
+        "mouth_stretch": dist(61, 291) / face_width,
+        "mouth_open": dist(13, 14) / face_height,
+        "lip_drop": (dist(61, 206) / face_height + dist(291, 426) / face_height) / 2.0,
+    }
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    frames = [rng.uniform(0.1, 0.9, (N_LANDMARKS, 2)) for _ in range(300)]
+    objects = [[_Landmark(x, y) for x, y in f] for f in frames]
+
+    ref = np.array([[_loop_features(o)[k] for k in FEATURE_NAMES] for o in objects])
+    vec = np.array([feature_matrix(landmarks_to_array(o)) for o in objects])
+    batch = feature_matrix(np.stack(frames))
+    print(f"max |loop - vectorized| {np.abs(ref - vec).max():.2e}, |loop - batched| {np.abs(ref - batch).max():.2e}")
+
+    lm = objects[0]
+    points = landmarks_to_array(lm)
+    loop_us = _time(lambda: _loop_features(lm), 200) * 1000
+    convert_us = _time(lambda: landmarks_to_array(lm), 200) * 1000
+    vec_us = _time(lambda: feature_matrix(points), 200) * 1000
+    print(f"per frame: loop {loop_us:.1f} us | vectorized {convert_us + vec_us:.1f} us "
+          f"({convert_us:.1f} array conversion + {vec_us:.1f} features)")
+
+    for n in (30, 300):
+        stack = np.stack(frames[:n])
+        batch_ms = _time(lambda: feature_matrix(stack), 20)
+        print(f"batch of {n:>3}: {batch_ms:.3f} ms ({batch_ms * 1000 / n:.2f} us/frame)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+module3_painscan/bench_pain_model.py
+Time pain scoring per frame vs one call over a buffered window.
+Usage: python -m module3_painscan.bench_pain_model
+
+Uses pain_model.pkl when present, otherwise fits a stand-in SVC
+(probability=True) on synthetic features labelled by the heuristic. Checks
+that the vectorized heuristic matches the old per-frame if-chain, then times
+1 to 3000 rows for: the model called once per frame, the model called once
+per window (PainModel.predict), and the vectorized heuristic.
+"""
+import time
+
+import numpy as np
+
+from module3_painscan.services import pain_model
+from module3_painscan.services.facial_features import FEATURE_NAMES
+
+
+def _if_chain(f: dict) -> int:
+    """predict_score before the scoring engine, kept as the reference."""
+    score = 0
+    if f["brow_lower"] < 0.12: score += 1
+    if f["brow_lower"] < 0.09: score += 2
+    if f["eye_squint"] < 0.05: score += 1
+    if f["eye_squint"] < 0.035: score += 2
+    if f["mouth_open"] > 0.08: score += 1
+    if f["mouth_open"] > 0.15: score += 1
+    if f["mouth_stretch"] > 0.40: score += 1
+    if f["lip_drop"] > 0.18: score += 1
+    return min(max(int(score), 0), 10)
+
+
+def _random_features(n: int, rng) -> np.ndarray:
+    lo = np.array([0.05, 0.02, 0.02, 0.02, 0.30, 0.00, 0.10])
+    hi = np.array([0.16, 0.10, 0.08, 0.08, 0.50, 0.20, 0.25])
+    return rng.uniform(lo, hi, (n, len(FEATURE_NAMES)))
+
+
+def _stand_in_model(rng) -> pain_model.PainModel:
+    from sklearn.svm import SVC
+    X = _random_features(2_000, rng)
+    y = (pain_model.heuristic_scores(X) >= pain_model.PAIN_CLASS_THRESHOLD).astype(int)
+    return pain_model.PainModel(SVC(kernel="rbf", probability=True, random_state=0).fit(X, y))
+
+
+def _time(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    check = _random_features(5_000, rng)
+    ref = np.array([_if_chain(dict(zip(FEATURE_NAMES, row))) for row in check])
+    print(f"heuristic mismatches vs if-chain over 5k rows: {int((ref != pain_model.heuristic_scores(check)).sum())}")
+
+    model = pain_model.model
+    if model is None:
+        print("pain_model.pkl not found, using a stand-in SVC")
+        model = _stand_in_model(rng)
+
+    print(f"{'rows':>6} {'per-frame ms':>13} {'one call ms':>12} {'heuristic ms':>13}")
+    for n, repeat in ((1, 50), (30, 20), (300, 5), (3_000, 3)):
+        X = _random_features(n, rng)
+        loop_n = min(n, 100)
+        per_frame = _time(lambda: [model.predict(X[i:i + 1]) for i in range(loop_n)], 1) * n / loop_n
+        batch = _time(lambda: model.predict(X), repeat)
+        heuristic = _time(lambda: pain_model.heuristic_scores(X), repeat)
+        print(f"{n:>6,} {per_frame:>13.2f} {batch:>12.2f} {heuristic:>13.3f}")
+
+
+if __name__ == "__main__":
+    main()
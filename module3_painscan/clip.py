@@ -0,0 +1,172 @@
+"""
+module3_painscan/clip.py
+Offline PainScan for uploaded video clips (mp4 / webm), for caregivers whose
+connection cannot hold a live session.
+
+Frames are sampled at a fixed rate rather than decoded one by one: when the
+next sample is more than SEEK_MIN_GAP source frames ahead the reader seeks
+(CAP_PROP_POS_FRAMES) instead of decoding everything in between; short gaps
+are skipped with grab(), which avoids the colour conversion of read(). Clips
+without a usable frame count (MediaRecorder webm often reports none) are read
+sequentially and sampled by timestamp. Decoding runs in a thread, one segment
+ahead of analysis, and every segment goes through the inference pool as a
+batch (service.BatchAnalysis), so segments use the pool's workers in parallel
+and only about two segments of frames are ever held in memory.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import time
+
+import cv2
+
+from .service import BatchAnalysis
+
+# At least rppg.MIN_SAMPLE_FPS (8), so clips get a heart rate; lower sample_fps skips it
+DEFAULT_SAMPLE_FPS = 10.0
+MAX_SAMPLE_FPS = 15.0
+MAX_CLIP_SECONDS = float(os.getenv("PAINSCAN_MAX_CLIP_SECONDS", "120"))
+# Frames wider than this are downscaled while decoding (detection runs at 300x300 anyway)
+CLIP_MAX_WIDTH = int(os.getenv("PAINSCAN_CLIP_MAX_WIDTH", "640"))
+SEGMENT_FRAMES = 32
+# Below this many source frames to the next sample, grab() forward instead of seeking
+SEEK_MIN_GAP = 8
+# How long a segment waits for pool capacity before the clip is given up on
+SHED_RETRY_SECONDS = 30.0
+
+
+class ClipError(ValueError):
+    pass
+
+
+class ClipReader:
+    def __init__(self, path: str, sample_fps: float = DEFAULT_SAMPLE_FPS):
+        self.cap = cv2.VideoCapture(path)
+        if not self.cap.isOpened():
+            raise ClipError("Could not open video")
+        self.sample_fps = min(max(sample_fps, 0.1), MAX_SAMPLE_FPS)
+        self.src_fps = float(self.cap.get(cv2.CAP_PROP_FPS) or 0)
+        self.frame_count = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+        self.seekable = self.src_fps > 0 and self.frame_count > 0
+        self.duration = self.frame_count / self.src_fps if self.seekable else None
+        if self.seekable:
+            # Sampling faster than the source only repeats frames and overstates the capture rate
+            self.sample_fps = min(self.sample_fps, self.src_fps)
+        if self.duration is not None and self.duration > MAX_CLIP_SECONDS:
+            self.cap.release()
+            raise ClipError(f"Clip longer than {int(MAX_CLIP_SECONDS)} s")
+        self.stats = {"sampled": 0, "seeks": 0, "grabbed": 0, "failed": 0}
+        self._k = 0            # index of the next sample
+        self._pos = 0          # index of the next source frame the decoder will return
+        self._done = False
+        self.last_ts = 0.0
+
+    def _shrink(self, image):
+        h, w = image.shape[:2]
+        if w <= CLIP_MAX_WIDTH:
+            return image
+        return cv2.resize(image, (CLIP_MAX_WIDTH, int(h * CLIP_MAX_WIDTH / w)), interpolation=cv2.INTER_AREA)
+
+    def _next_seek(self):
+        idx = int(round(self._k * self.src_fps / self.sample_fps))
+        if idx >= self.frame_count:
+            return None
+        gap = idx - self._pos
+        if gap > SEEK_MIN_GAP:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, idx)
+            self.stats["seeks"] += 1
+        else:
+            for _ in range(max(0, gap)):
+                self.cap.grab()
+            self.stats["grabbed"] += max(0, gap)
+        ok, image = self.cap.read()
+        self._pos = idx + 1
+        if not ok:
+            self.stats["failed"] += 1
+            return None
+        return idx / self.src_fps, image
+
+    def _next_sequential(self):
+        target = self._k / self.sample_fps
+        while True:
+            if not self.cap.grab():
+                return None
+            ts = (self.cap.get(cv2.CAP_PROP_POS_MSEC) or 0) / 1000.0
+            if ts > MAX_CLIP_SECONDS:
+                raise ClipError(f"Clip longer than {int(MAX_CLIP_SECONDS)} s")
+            if ts + 1e-6 >= target:
+                ok, image = self.cap.retrieve()
+                if not ok:
+                    self.stats["failed"] += 1
+                    return None
+                return ts, image
+            self.stats["grabbed"] += 1
+
+    def read(self, n: int = SEGMENT_FRAMES) -> tuple[list, list]:
+        """Next up to n sampled frames (downscaled BGR) and their timestamps (s); empty at the end."""
+        images, timestamps = [], []
+        while not self._done and len(images) < n:
+            sample = self._next_seek() if self.seekable else self._next_sequential()
+            if sample is None:
+                self._done = True
+                break
+            ts, image = sample
+            self._k += 1
+            self.last_ts = ts
+            images.append(self._shrink(image))
+            timestamps.append(ts)
+        self.stats["sampled"] += len(images)
+        return images, timestamps
+
+    def release(self) -> None:
+        self.cap.release()
+
+
+async def analyze_clip(path: str, sample_fps: float = DEFAULT_SAMPLE_FPS) -> dict:
+    """
+    Sample and analyse a whole clip. Returns BatchAnalysis.finish() plus
+    "clip" metadata (duration, frames sampled, seeks, processing time and its
+    ratio to clip length). Raises ClipError for unreadable / too long clips or
+    when the pool stays saturated for SHED_RETRY_SECONDS.
+    """
+    started = time.perf_counter()
+    reader = await asyncio.to_thread(ClipReader, path, sample_fps)
+    analysis = BatchAnalysis()
+    pending = None
+    try:
+        pending = asyncio.create_task(asyncio.to_thread(reader.read))
+        while True:
+            images, timestamps = await pending
+            pending = None
+            if not images:
+                break
+            pending = asyncio.create_task(asyncio.to_thread(reader.read))
+            waited = 0.0
+            while not await analysis.add(images, timestamps):
+                if waited >= SHED_RETRY_SECONDS:
+                    raise ClipError("PainScan is busy, try again shortly")
+                await asyncio.sleep(0.25)
+                waited += 0.25
+    finally:
+        if pending is not None:
+            # The read runs in a thread and cannot be cancelled; let it finish before releasing
+            try:
+                await pending
+            except Exception:
+                pass
+        reader.release()
+
+    if not analysis.frames:
+        raise ClipError("No frames could be decoded")
+    result = analysis.finish()
+    elapsed = time.perf_counter() - started
+    duration = reader.duration if reader.duration is not None else reader.last_ts
+    result["clip"] = {
+        "duration_s": round(duration, 2),
+        "sample_fps": reader.sample_fps,
+        "seekable": reader.seekable,
+        **reader.stats,
+        "processing_s": round(elapsed, 2),
+        "realtime_factor": round(elapsed / duration, 3) if duration else None,
+    }
+    return result
@@ -0,0 +1,323 @@
+"""
+module3_painscan/inference_pool.py
+Process pool for PainScan face detection + landmarks, off the API event loop.
+
+Each worker process loads its own face detector and landmarker once (pool
+initializer) and runs service.detect_and_extract. Decoded frames travel
+through a fixed set of shared-memory slots instead of being pickled: the API
+process copies the frame into a free slot and sends only (slot name, shape);
+the worker maps the same memory and returns a few numbers (face box, features,
+stage timings). The number of slots bounds the work in flight; when every slot
+is busy the frame is shed straight away instead of queueing, so latency stays
+flat under load and callers get {"shed": True}.
+
+Config: PAINSCAN_WORKERS (default cores - 1, min 1; 0 = run in a thread in the
+API process, one frame or batch at a time since the models are shared), PAINSCAN_SLOTS_PER_WORKER (2), PAINSCAN_SLOT_BYTES (one 1080p BGR frame).
+"""
+from __future__ import annotations
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+
+import cv2
+import numpy as np
+
+WORKERS = int(os.getenv("PAINSCAN_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+SLOTS_PER_WORKER = int(os.getenv("PAINSCAN_SLOTS_PER_WORKER", "2"))
+SLOT_BYTES = int(os.getenv("PAINSCAN_SLOT_BYTES", str(1920 * 1080 * 3)))
+START_METHOD = os.getenv("PAINSCAN_START_METHOD", "spawn")
+
+LATENCY_SAMPLES = 500
+
+
+# ─── Worker side ──────────────────────────────────────────────────────────────
+
+_attached: dict[str, SharedMemory] = {}
+
+
+def _attach(name: str) -> SharedMemory:
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            shm = SharedMemory(name=name, track=False)   # Python 3.13+
+        except TypeError:
+            shm = SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _init_worker() -> None:
+    from . import service
+    service.load_models()
+
+
+def _worker_infer(slot_name: str, shape: tuple, roi: tuple | None = None) -> dict:
+    from . import service
+    shm = _attach(slot_name)
+    image = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    return service.detect_and_extract(image, roi)
+
+
+def _worker_infer_batch(slot_name: str, shape: tuple) -> list:
+    from . import service
+    shm = _attach(slot_name)
+    frames = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf)
+    return service.detect_and_extract_batch(frames)
+
+
+# Thread mode shares one landmarker / detector, which are not safe to call concurrently
+_thread_lock = threading.Lock()
+
+
+def _thread_infer(image: np.ndarray, roi: tuple | None = None) -> dict:
+    from . import service
+    with _thread_lock:
+        return service.detect_and_extract(image, roi)
+
+
+def _thread_infer_batch(frames: list) -> list:
+    from . import service
+    with _thread_lock:
+        return service.detect_and_extract_batch(frames)
+
+
+def _scale_box(box: tuple | None, sx: float, sy: float) -> tuple | None:
+    if box is None:
+        return None
+    x0, y0, x1, y1 = box
+    return (int(x0 * sx), int(y0 * sy), int(x1 * sx), int(y1 * sy))
+
+
+# ─── API side ─────────────────────────────────────────────────────────────────
+
+class InferencePool:
+    def __init__(self, workers: int = WORKERS, slots_per_worker: int = SLOTS_PER_WORKER):
+        self.workers = workers
+        self.capacity = max(1, workers * slots_per_worker) if workers else max(1, slots_per_worker)
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots: list[SharedMemory] = []
+        self._free: list[int] = []
+        self._inflight = 0
+        self._latencies: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.started = False
+        self.stats = {"submitted": 0, "completed": 0, "shed": 0, "failed": 0, "resized": 0, "restarts": 0,
+                      "batch_frames": 0}
+
+    def start(self) -> None:
+        if self.started:
+            return
+        if self.workers > 0:
+            self._slots = [SharedMemory(create=True, size=SLOT_BYTES) for _ in range(self.capacity)]
+            self._free = list(range(self.capacity))
+            self._executor = self._new_executor()
+        self.started = True
+        mode = f"{self.workers} worker process(es)" if self.workers else "in-process thread"
+        print(f"[painscan] Inference pool: {mode}, {self.capacity} slot(s)")
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(START_METHOD),
+            initializer=_init_worker,
+        )
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        """
+        Replace a pool whose worker died. Every call in flight on it fails at
+        once, so only the first to get here swaps it; the rest see a new executor.
+        """
+        if self._executor is not broken:
+            return
+        self.stats["restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for shm in self._slots:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._slots, self._free = [], []
+        self.started = False
+
+    @property
+    def queue_depth(self) -> int:
+        return self._inflight
+
+    def _fit(self, image: np.ndarray) -> np.ndarray:
+        """Downscale frames larger than a slot (aspect kept)."""
+        if image.nbytes <= SLOT_BYTES:
+            return image
+        scale = (SLOT_BYTES / image.nbytes) ** 0.5
+        h, w = image.shape[:2]
+        self.stats["resized"] += 1
+        return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+    async def infer(self, image: np.ndarray, roi: tuple | None = None) -> dict:
+        """
+        Detection + landmarks for one BGR frame, optionally within a tracking roi
+        (see tracking.py). Returns service.detect_and_extract's dict, or
+        {"shed": True} when the pool is at capacity.
+        Boxes are in the coordinates of the frame passed in.
+        """
+        if not self.started:
+            self.start()
+        if self._inflight >= self.capacity or (self.workers and not self._free):
+            self.stats["shed"] += 1
+            return {"shed": True}
+
+        self._inflight += 1
+        self.stats["submitted"] += 1
+        started = time.perf_counter()
+        slot = None
+        executor = self._executor
+        try:
+            if not self.workers:
+                result = await asyncio.to_thread(_thread_infer, image, roi)
+            else:
+                fitted = self._fit(np.ascontiguousarray(image, dtype=np.uint8))
+                slot = self._free.pop()
+                shm = self._slots[slot]
+                np.ndarray(fitted.shape, dtype=np.uint8, buffer=shm.buf)[...] = fitted
+                sx, sy = image.shape[1] / fitted.shape[1], image.shape[0] / fitted.shape[0]
+                if fitted is not image:
+                    roi = _scale_box(roi, 1 / sx, 1 / sy)
+                loop = asyncio.get_running_loop()
+                result = await loop.run_in_executor(executor, _worker_infer, shm.name, fitted.shape, roi)
+                if fitted is not image:
+                    result["face_box"] = _scale_box(result.get("face_box"), sx, sy)
+                    result["landmark_box"] = _scale_box(result.get("landmark_box"), sx, sy)
+        except BrokenProcessPool:
+            # A worker died (e.g. native crash); replace the pool and drop this frame
+            self.stats["failed"] += 1
+            self._restart(executor)
+            return {"shed": True}
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"[painscan] Inference failed: {e}")
+            return {"face_box": None, "features": None, "timings": {}}
+        finally:
+            self._inflight -= 1
+            if slot is not None:
+                self._free.append(slot)
+
+        self.stats["completed"] += 1
+        self._latencies.append((time.perf_counter() - started) * 1000)
+        return result
+
+    def _chunks(self, frames: list) -> list[tuple[list[int], np.ndarray]]:
+        """Split frames into runs of consecutive same-shape frames that fit one slot together."""
+        chunks, idx, run = [], [], []
+        for i, frame in enumerate(frames):
+            if run and (frame.shape != run[0].shape or (len(run) + 1) * frame.nbytes > SLOT_BYTES):
+                chunks.append((idx, np.stack(run)))
+                idx, run = [], []
+            idx.append(i)
+            run.append(frame)
+        if run:
+            chunks.append((idx, np.stack(run)))
+        return chunks
+
+    async def _run_chunks(self, executor: ProcessPoolExecutor, slot: int, queue: deque, out: list) -> None:
+        shm = self._slots[slot]
+        loop = asyncio.get_running_loop()
+        while queue:
+            idx, stack = queue.popleft()
+            np.ndarray(stack.shape, dtype=np.uint8, buffer=shm.buf)[...] = stack
+            results = await loop.run_in_executor(executor, _worker_infer_batch, shm.name, stack.shape)
+            for i, result in zip(idx, results):
+                out[i] = result
+
+    async def infer_batch(self, images: list) -> list | dict:
+        """
+        detect_and_extract over a burst of consecutive frames. Frames are packed
+        several to a slot and the runs are spread over the slots free right now
+        (at least one, else {"shed": True} for the whole batch), so a batch uses
+        the idle workers in parallel but never more than the pool's capacity.
+        Returns one result per image, boxes in that image's coordinates.
+        """
+        if not self.started:
+            self.start()
+        if not images:
+            return []
+        if self._inflight >= self.capacity or (self.workers and not self._free):
+            self.stats["shed"] += 1
+            return {"shed": True}
+
+        self.stats["submitted"] += 1
+        self.stats["batch_frames"] += len(images)
+        if not self.workers:
+            self._inflight += 1
+            try:
+                results = await asyncio.to_thread(_thread_infer_batch, images)
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"[painscan] Batch inference failed: {e}")
+                return {"shed": True}
+            finally:
+                self._inflight -= 1
+        else:
+            fitted = [self._fit(np.ascontiguousarray(img, dtype=np.uint8)) for img in images]
+            queue = deque(self._chunks(fitted))
+            slots = [self._free.pop() for _ in range(min(len(queue), len(self._free), self.capacity - self._inflight))]
+            self._inflight += len(slots)
+            results = [None] * len(images)
+            executor = self._executor
+            try:
+                await asyncio.gather(*(self._run_chunks(executor, slot, queue, results) for slot in slots))
+            except BrokenProcessPool:
+                self.stats["failed"] += 1
+                self._restart(executor)
+                return {"shed": True}
+            except Exception as e:
+                self.stats["failed"] += 1
+                print(f"[painscan] Batch inference failed: {e}")
+                return {"shed": True}
+            finally:
+                self._inflight -= len(slots)
+                self._free.extend(slots)
+            for img, fit, result in zip(images, fitted, results):
+                if fit is not img:
+                    sx, sy = img.shape[1] / fit.shape[1], img.shape[0] / fit.shape[0]
+                    result["face_box"] = _scale_box(result.get("face_box"), sx, sy)
+                    result["landmark_box"] = _scale_box(result.get("landmark_box"), sx, sy)
+
+        # Latency percentiles stay per frame; batches only count as completed
+        self.stats["completed"] += 1
+        return results
+
+    def summary(self) -> dict:
+        lat = sorted(self._latencies)
+        pick = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))], 2) if lat else None
+        return {
+            "mode": "process" if self.workers else "thread",
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self._inflight,
+            "latency_ms": {"p50": pick(0.5), "p95": pick(0.95), "samples": len(lat)},
+            **self.stats,
+        }
+
+
+pool = InferencePool()
+
+
+def start_pool() -> None:
+    """Create the slots and spawn the workers. Called in @app.on_event('startup')."""
+    pool.start()
+
+
+def shutdown_pool() -> None:
+    """Stop the workers and unlink the shared-memory slots. Called on shutdown."""
+    pool.shutdown()
@@ -0,0 +1,79 @@
+"""
+module3_painscan/pacing.py
+Frame-rate / resolution targets for PainScan clients, driven by inference load.
+
+Instead of accepting whatever a client sends and shedding the excess, the
+server tells each streaming client how fast and how large to capture
+({"type": "pace", "fps", "max_width", "jpeg_quality", "heart_rate"} on the
+session socket).
+Targets come from TIERS by the pool's smoothed load (in-flight / capacity,
+pinned to 1.0 whenever a frame was shed), and a session whose own frames take
+longer than its interval is capped further. Targets without
+headroom above rppg.MIN_SAMPLE_FPS (the overload tier, or a slow session's
+cap), or sessions whose frames are analysed slower than it, carry
+"heart_rate": False, since rPPG reports nothing at that rate; the tiers
+below overload stay at RPPG_TARGET_FPS or above. The same max_width is the decode floor: JPEGs
+wider than it are decoded with IMREAD_REDUCED_COLOR_2/4 (see
+service.bytes_to_image), since detection works on a 300x300 resize anyway.
+"""
+from __future__ import annotations
+import math
+import os
+
+from .services.rppg import MIN_SAMPLE_FPS as RPPG_MIN_FPS
+
+# Nominal fps that keeps rPPG working: superseded, shed and rejected frames and
+# capture jitter mean fewer frames are analysed than the client is asked for
+RPPG_TARGET_FPS = math.ceil(RPPG_MIN_FPS * 1.25)
+
+# (load below, target) - first matching tier wins
+TIERS = (
+    (0.5, {"fps": 10, "max_width": 640, "jpeg_quality": 0.8}),
+    (0.8, {"fps": RPPG_TARGET_FPS, "max_width": 480, "jpeg_quality": 0.7}),   # still fast enough for rPPG
+    (float("inf"), {"fps": 3, "max_width": 320, "jpeg_quality": 0.6}),
+)
+MIN_FPS = 2
+# Seconds between pace changes sent to one client, so tiers do not flap
+PACE_MIN_INTERVAL = float(os.getenv("PAINSCAN_PACE_INTERVAL", "2.0"))
+LOAD_SMOOTHING = 0.2
+
+
+class LoadMonitor:
+    def __init__(self, alpha: float = LOAD_SMOOTHING):
+        self.alpha = alpha
+        self.load = 0.0
+        self._shed_seen = 0
+
+    def sample(self) -> float:
+        """Update and return the smoothed pool load (0 = idle, 1 = every slot busy)."""
+        from .inference_pool import pool
+
+        instant = pool.queue_depth / max(1, pool.capacity)
+        if pool.stats["shed"] > self._shed_seen:
+            self._shed_seen = pool.stats["shed"]
+            instant = 1.0
+        self.load += self.alpha * (min(instant, 1.0) - self.load)
+        return self.load
+
+
+monitor = LoadMonitor()
+
+
+def target_for(load: float, frame_ms: float | None = None, analysed_fps: float | None = None) -> dict:
+    """
+    Capture target for a pool load; frame_ms (a session's mean per-frame
+    analysis time) caps fps so one session does not outrun its own results.
+    "heart_rate" says whether rPPG can report: the target leaves headroom above
+    its minimum rate and, when known, the rate frames were actually analysed
+    at over the rPPG window (analysed_fps) reaches it.
+    """
+    target = next(dict(t) for limit, t in TIERS if load < limit)
+    if frame_ms:
+        target["fps"] = max(MIN_FPS, min(target["fps"], int(1000.0 / frame_ms)))
+    target["heart_rate"] = target["fps"] >= RPPG_TARGET_FPS and (analysed_fps is None or analysed_fps >= RPPG_MIN_FPS)
+    return target
+
+
+def decode_width() -> int:
+    """Decode floor for stateless requests (no session target) at the current load."""
+    return target_for(monitor.sample())["max_width"]
@@ -1,13 +1,20 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, File, Form, UploadFile, WebSocket, WebSocketDisconnect
 from typing import List, Optional
-from pydantic import BaseModel
-import numpy as np
+from pydantic import BaseModel, ValidationError
+import asyncio
+import json
+import os
+import tempfile
 from datetime import datetime
 
 from shared.database import db
 from shared.events import publish
 from shared.models import APIResponse
-from .service import process_frame
+from .clip import DEFAULT_SAMPLE_FPS, ClipError, analyze_clip
+from .pacing import decode_width, monitor
+from .service import analyze_batch, base64_to_image, process_frame, process_frame_bytes, weighted_percentile
+from .services.audio_analysis import analyze_audio
+from .session import AUDIO, DEFAULT_SAMPLE_RATE, FRAME, ProtocolError, parse_packet, parse_sample_rate, sessions
 
 router = APIRouter()
 
@@ -15,10 +22,20 @@ class FrameInput(BaseModel):
     image: str
     audio_chunk: Optional[str] = None
 
+class BatchInput(BaseModel):
+    frames: List[str]                         # base64 images, in capture order
+    timestamps: Optional[List[float]] = None  # capture time (s) per frame; default from fps
+    fps: float = 10.0
+    audio_chunk: Optional[str] = None
+    patient_id: Optional[str] = None
+    followup_id: Optional[str] = None
+    save: bool = False                        # store the summary like /score
+
 class ScoreInput(BaseModel):
     patient_id: str
     followup_id: str
     frame_scores: List[int]
+    frame_weights: Optional[List[float]] = None   # per-frame quality weight (1 = good frame)
     
     # Multimodal Tracking
     resp_rate: Optional[float] = None
@@ -31,18 +48,109 @@ class ScoreInput(BaseModel):
 @router.post("/analyze-frame", response_model=APIResponse)
 async def analyze_frame(payload: FrameInput):
     result = await process_frame(payload.image, payload.audio_chunk)
+    if result.get("shed"):
+        return APIResponse(success=False, message="Server busy, retry shortly", data={"face_detected": False, "shed": True})
+    if result.get("rejected"):
+        return APIResponse(success=False, message=result["quality"]["guidance"], data=result)
     if not result.get("face_detected"):
         return APIResponse(success=False, message="Move closer", data={"face_detected": False})
     
     return APIResponse(success=True, message="Face tracked", data=result)
 
+MAX_BATCH_FRAMES = int(os.getenv("PAINSCAN_MAX_BATCH_FRAMES", "120"))
+
+@router.post("/analyze-batch", response_model=APIResponse)
+async def analyze_frame_batch(payload: BatchInput):
+    """
+    Analyse a short burst of frames in one request (for caregivers who cannot
+    stream live). Returns per-frame results and a fused summary over the burst;
+    with save=true and patient/followup ids the summary is stored like /score.
+    """
+    if not payload.frames:
+        return APIResponse(success=False, message="No frames", data=None)
+    if len(payload.frames) > MAX_BATCH_FRAMES:
+        return APIResponse(success=False, message=f"At most {MAX_BATCH_FRAMES} frames per batch", data=None)
+    if payload.timestamps is not None and len(payload.timestamps) != len(payload.frames):
+        return APIResponse(success=False, message="timestamps must match frames", data=None)
+    timestamps = payload.timestamps or [i / max(payload.fps, 0.1) for i in range(len(payload.frames))]
+
+    min_width = decode_width()
+    images = await asyncio.to_thread(lambda: [base64_to_image(f, min_width) for f in payload.frames])
+    audio_data = await analyze_audio(payload.audio_chunk) if payload.audio_chunk else None
+    result = await analyze_batch(images, timestamps, audio_data)
+    if result.get("shed"):
+        return APIResponse(success=False, message="Server busy, retry shortly", data={"shed": True})
+
+    summary = result["summary"]
+    if payload.save and summary["frame_scores"]:
+        try:
+            fields = {k: v for k, v in summary.items() if k in ScoreInput.model_fields}
+            score_input = ScoreInput(patient_id=payload.patient_id, followup_id=payload.followup_id, **fields)
+        except ValidationError:
+            return APIResponse(success=False, message="patient_id and followup_id are required to save", data=result)
+        result["saved"] = await save_score(score_input)
+    if not summary["frame_scores"]:
+        return APIResponse(success=False, message="Move closer", data=result)
+    return APIResponse(success=True, message=f"Analysed {len(images)} frames", data=result)
+
+MAX_CLIP_BYTES = int(os.getenv("PAINSCAN_MAX_CLIP_BYTES", str(50 * 1024 * 1024)))
+
+@router.post("/analyze-clip", response_model=APIResponse)
+async def analyze_video_clip(
+    file: UploadFile = File(...),
+    patient_id: str = Form(...),
+    followup_id: str = Form(...),
+    sample_fps: float = Form(DEFAULT_SAMPLE_FPS),
+):
+    """
+    Offline assessment of an uploaded short video (mp4 / webm): frames are
+    sampled at sample_fps, analysed in batches (see clip.py) and the result is
+    stored as a pain_scores document exactly like /score.
+    """
+    suffix = os.path.splitext(file.filename or "")[1].lower() or ".mp4"
+    if suffix not in (".mp4", ".webm", ".mov", ".m4v"):
+        return APIResponse(success=False, message="Upload an mp4 or webm video", data=None)
+
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as f:
+        temp_path = f.name
+        while chunk := await file.read(1024 * 1024):
+            size += len(chunk)
+            if size > MAX_CLIP_BYTES:
+                break
+            f.write(chunk)
+    try:
+        if size > MAX_CLIP_BYTES:
+            return APIResponse(success=False, message=f"Clip larger than {MAX_CLIP_BYTES // (1024 * 1024)} MB", data=None)
+        result = await analyze_clip(temp_path, sample_fps)
+    except ClipError as e:
+        return APIResponse(success=False, message=str(e), data=None)
+    finally:
+        os.remove(temp_path)
+
+    summary = result["summary"]
+    if not summary["frame_scores"]:
+        return APIResponse(success=False, message="No face found in the clip", data=result)
+    fields = {k: v for k, v in summary.items() if k in ScoreInput.model_fields}
+    result["saved"] = await save_score(ScoreInput(patient_id=patient_id, followup_id=followup_id, **fields))
+    print(f"[painscan] Clip for {patient_id}: {result['clip']['sampled']} frames, "
+          f"{result['clip']['processing_s']}s for {result['clip']['duration_s']}s of video")
+    return APIResponse(success=True, message="Clip analysed and pain score saved", data=result)
+
 @router.post("/score", response_model=APIResponse)
 async def submit_score(payload: ScoreInput):
+    doc = await save_score(payload)
+    return APIResponse(success=True, message="Pain score saved", data=doc)
+
+async def save_score(payload: ScoreInput) -> dict:
+    """Aggregate frame scores, store the pain_scores doc and publish the pain events."""
     if not payload.frame_scores:
         score = 0
     else:
-        # Final aggregation logic across frames favors the top quartile (75%)
-        score = int(np.percentile(payload.frame_scores, 75))
+        # Final aggregation logic across frames favors the top quartile (75%);
+        # degraded frames count less when quality weights are sent
+        weights = payload.frame_weights if payload.frame_weights and len(payload.frame_weights) == len(payload.frame_scores) else None
+        score = weighted_percentile(payload.frame_scores, weights, 75)
         
     doc = {
         "patient_id": payload.patient_id,
@@ -90,7 +198,7 @@ async def submit_score(payload: ScoreInput):
         if not payload.cry_intensity or payload.cry_intensity < 0.2:
             await publish("silent_distress.detected", event_payload)
     
-    return APIResponse(success=True, message="Pain score saved", data=doc)
+    return doc
 
 @router.get("/history/{patient_id}", response_model=APIResponse)
 async def get_history(patient_id: str):
@@ -99,3 +207,123 @@ async def get_history(patient_id: str):
     for doc in docs:
         doc["_id"] = str(doc["_id"])
     return APIResponse(success=True, message="History retrieved", data=docs)
+
+
+# ─── Streaming session ────────────────────────────────────────────────────────
+
+async def _send(ws: WebSocket, session, message: dict):
+    async with session.send_lock:
+        await ws.send_text(json.dumps(message, default=str))
+
+async def _analyse_session_frames(ws: WebSocket, session):
+    """Analyse frames in capture order and stream each result back."""
+    while True:
+        seq, ts, frame = await session.next_frame()
+        try:
+            min_width = session.target["max_width"] if session.target else None
+            result = await process_frame_bytes(frame, session.audio_features(), session.signals, ts, session.tracker, min_width)
+        except Exception as e:
+            print(f"[painscan] Session {session.id} frame {seq} failed: {e}")
+            result = {"face_detected": False}
+        session.record(seq, ts, result)
+        message = {"type": "result", "seq": seq, "ts": ts, **result}
+        if result.get("shed"):
+            message["message"] = "Server busy"
+        elif result.get("quality", {}).get("guidance"):
+            message["message"] = result["quality"]["guidance"]
+        elif not result.get("face_detected"):
+            message["message"] = "Move closer"
+        await _send(ws, session, message)
+        target = session.pace(monitor.sample())
+        if target is not None:
+            await _send(ws, session, {"type": "pace", **target})
+
+@router.websocket("/ws/session")
+async def scan_session_ws(
+    ws: WebSocket,
+    patient_id: Optional[str] = None,
+    followup_id: Optional[str] = None,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+):
+    """
+    Streaming assessment. Binary packets carry frames / PCM audio (see session.py);
+    text messages are actions: {"action": "start", patient_id, followup_id, sample_rate},
+    {"action": "finish"} (saves the score like /score and closes), {"action": "ping"}.
+    """
+    await ws.accept()
+    try:
+        session = sessions.create(patient_id, followup_id, sample_rate)
+    except (RuntimeError, ProtocolError) as e:
+        await ws.send_text(json.dumps({"type": "error", "message": str(e)}))
+        await ws.close(code=1008 if isinstance(e, ProtocolError) else 1013)
+        return
+    await _send(ws, session, {"type": "session", "session_id": session.id})
+    await _send(ws, session, {"type": "pace", **session.pace(monitor.sample())})
+    analyser = asyncio.create_task(_analyse_session_frames(ws, session))
+    try:
+        while True:
+            msg = await ws.receive()
+            if msg["type"] == "websocket.disconnect":
+                break
+            if msg.get("bytes") is not None:
+                try:
+                    kind, seq, ts, payload = parse_packet(msg["bytes"])
+                except ProtocolError as e:
+                    await _send(ws, session, {"type": "error", "message": str(e)})
+                    continue
+                if kind == FRAME:
+                    session.accept_frame(seq, ts, payload)
+                elif kind == AUDIO:
+                    session.add_audio(seq, payload)
+                continue
+
+            try:
+                action = json.loads(msg.get("text") or "{}")
+            except ValueError:
+                continue
+            if not isinstance(action, dict):
+                await _send(ws, session, {"type": "error", "message": "text messages must be JSON objects"})
+                continue
+            if action.get("action") == "start":
+                session.patient_id = action.get("patient_id", session.patient_id)
+                session.followup_id = action.get("followup_id", session.followup_id)
+                try:
+                    session.sample_rate = parse_sample_rate(action.get("sample_rate") or session.sample_rate)
+                except ProtocolError as e:
+                    await _send(ws, session, {"type": "error", "message": str(e)})
+            elif action.get("action") == "ping":
+                await _send(ws, session, {"type": "pong", "stats": session.stats,
+                                          "tracking": session.tracker.summary(),
+                                          "stage_ms": session.stage_latencies()})
+            elif action.get("action") == "finish":
+                if not await session.drain(analyser):
+                    print(f"[painscan] Session {session.id} finished without draining; saving analysed frames")
+                try:
+                    doc = await save_score(ScoreInput(**session.summary()))
+                except ValidationError:
+                    await _send(ws, session, {"type": "error", "message": "patient_id and followup_id are required"})
+                    continue
+                await _send(ws, session, {"type": "saved", "data": doc, "stats": session.stats})
+                break
+    except WebSocketDisconnect:
+        pass
+    finally:
+        analyser.cancel()
+        sessions.close(session.id)
+        try:
+            await ws.close()
+        except Exception:
+            pass
+
+@router.get("/sessions/stats", response_model=APIResponse)
+async def session_stats():
+    """Active streaming sessions on this worker with frame / audio counters."""
+    return APIResponse(success=True, message="Session stats", data=sessions.summary())
+
+@router.get("/pool/stats", response_model=APIResponse)
+async def pool_stats():
+    """Inference pool occupancy, shed / failed counts, round-trip latency and the current capture target."""
+    from .inference_pool import pool
+    from .pacing import target_for
+    data = {**pool.summary(), "load": round(monitor.load, 3), "target": target_for(monitor.load)}
+    return APIResponse(success=True, message="Inference pool stats", data=data)
@@ -1,67 +1,131 @@
+import asyncio
 import cv2
 import base64
 import numpy as np
 import mediapipe as mp
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
-import joblib
 import os
-import asyncio
+import threading
+import time
 
 # Multimodal Services
-from .services.respiration import estimate_respiration
 from .services.audio_analysis import analyze_audio
-from .services.agitation import compute_agitation
-from .services.rppg import estimate_rppg
 from .services.fusion_engine import fuse_modalities
+from .services.facial_features import feature_matrix, features_dict, landmarks_to_array
+from .services.pain_model import features_to_matrix, score_matrix
+from .services.frame_quality import assess_frame
 
 MODEL_DIR = os.path.join(os.path.dirname(__file__), "models")
 PROTOTXT = os.path.join(MODEL_DIR, "deploy.prototxt")
 CAFFEMODEL = os.path.join(MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
 MP_MODEL_PATH = os.path.join(MODEL_DIR, "face_landmarker.task")
-SVM_MODEL_PATH = os.path.join(os.path.dirname(__file__), "pain_model.pkl")
-
-# Initialize MediaPipe Face Landmarker
-base_options = python.BaseOptions(model_asset_path=MP_MODEL_PATH)
-options = vision.FaceLandmarkerOptions(
-    base_options=base_options,
-    output_face_blendshapes=False,
-    output_facial_transformation_matrixes=False,
-    num_faces=1
-)
-face_landmarker = vision.FaceLandmarker.create_from_options(options)
-
-# Load OpenCV Face Detector
-try:
-    net = cv2.dnn.readNetFromCaffe(PROTOTXT, CAFFEMODEL)
-except Exception:
-    net = None
-
-# Load SVM Model
-try:
-    svm_model = joblib.load(SVM_MODEL_PATH)
-except Exception:
-    svm_model = None
-
-def base64_to_image(b64_string: str):
+
+# Tracking fit checks (see _tracked_fit_ok): landmarks within TRACK_EDGE of the
+# ROI border, or spanning less than TRACK_MIN_FILL of it, trigger a full detection
+TRACK_EDGE = 0.02
+TRACK_MIN_FILL = 0.35
+# Padding around the landmark box for tracked face boxes and signal_box
+TRACK_BOX_PAD = 0.1
+
+# Face detector and landmarker are per-process and loaded on first use, so the
+# API process never loads them when inference runs in the pool workers
+# (inference_pool.py); each worker loads its own copy in its initializer.
+# In thread mode the pool serialises inference on them (see _thread_infer).
+net = None
+face_landmarker = None
+_models_loaded = False
+_load_lock = threading.Lock()
+
+def load_models():
+    if _models_loaded:
+        return
+    with _load_lock:
+        if not _models_loaded:
+            _load_models()
+
+def _load_models():
+    global net, face_landmarker, _models_loaded
+    # Initialize MediaPipe Face Landmarker
+    base_options = python.BaseOptions(model_asset_path=MP_MODEL_PATH)
+    options = vision.FaceLandmarkerOptions(
+        base_options=base_options,
+        output_face_blendshapes=False,
+        output_facial_transformation_matrixes=False,
+        num_faces=1
+    )
+    face_landmarker = vision.FaceLandmarker.create_from_options(options)
+
+    # Load OpenCV Face Detector
+    try:
+        net = cv2.dnn.readNetFromCaffe(PROTOTXT, CAFFEMODEL)
+    except Exception:
+        net = None
+    _models_loaded = True
+
+# JPEG start-of-frame markers (carry the image size); C4 / C8 / CC are other segments
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def jpeg_size(data) -> tuple | None:
+    """(width, height) from a JPEG's SOF header without decoding, or None if not a JPEG."""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i, n = 2, len(data)
+    while i + 9 < n:
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        if marker in _JPEG_SOF:
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return width, height
+        i += 2 + ((data[i + 2] << 8) | data[i + 3])
+    return None
+
+def bytes_to_image(data: bytes, min_width: int = None):
+    """
+    Decode an encoded image (JPEG/PNG/WebP) into a BGR array, or None.
+    With min_width, a JPEG at least 2x / 4x wider is decoded at 1/2 / 1/4 size
+    by libjpeg itself (IMREAD_REDUCED_COLOR_*), which is much cheaper than a
+    full decode followed by a resize.
+    """
+    np_arr = np.frombuffer(data, np.uint8)
+    if np_arr.size == 0:
+        return None
+    flag = cv2.IMREAD_COLOR
+    if min_width:
+        size = jpeg_size(data)
+        if size is not None:
+            if size[0] >= 4 * min_width:
+                flag = cv2.IMREAD_REDUCED_COLOR_4
+            elif size[0] >= 2 * min_width:
+                flag = cv2.IMREAD_REDUCED_COLOR_2
+    return cv2.imdecode(np_arr, flag)
+
+def base64_to_image(b64_string: str, min_width: int = None):
     if b64_string.startswith("data:"):
         # e.g. "data:image/jpeg;base64,....." -> get the latter part
         b64_string = b64_string.split(",")[1]
     
     try:
-        img_data = base64.b64decode(b64_string)
-        np_arr = np.frombuffer(img_data, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
-        return img
+        return bytes_to_image(base64.b64decode(b64_string), min_width)
     except Exception:
         # Gracefully handle improperly padded or invalid b64 strings
         return None
 
-def detect_face(image):
+def detect_face_box(image):
+    """Padded (startX, startY, endX, endY) of the most confident face, or None."""
+    load_models()
+    h, w = image.shape[:2]
     if not hasattr(net, "empty") or net.empty():
-        return image
+        return (0, 0, w, h)
         
-    h, w = image.shape[:2]
     blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
     net.setInput(blob)
     detections = net.forward()
@@ -88,9 +152,18 @@ def detect_face(image):
     startX = max(0, startX - pad_x)
     endX = min(w, endX + pad_x)
     
+    return (startX, startY, endX, endY)
+
+def detect_face(image):
+    box = detect_face_box(image)
+    if box is None:
+        return None
+    startX, startY, endX, endY = box
     return image[startY:endY, startX:endX]
 
-def extract_landmarks(image):
+def face_landmarks(image):
+    """MediaPipe landmarks of the single face in image as an (N, 2) array of x, y (0-1 of image), or None."""
+    load_models()
     rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
     mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb)
     
@@ -103,112 +176,205 @@ def extract_landmarks(image):
     if not results.face_landmarks:
         return None
     
-    landmarks = results.face_landmarks[0]
-    
-    def pt(idx):
-        return np.array([landmarks[idx].x, landmarks[idx].y])
-    
-    def dist(idx1, idx2):
-        return np.linalg.norm(pt(idx1) - pt(idx2))
-
-    # Calculate Face Bounding Box for Normalization
-    ys = [lm.y for lm in landmarks]
-    xs = [lm.x for lm in landmarks]
-    face_height = max(ys) - min(ys)
-    face_width = max(xs) - min(xs)
-    if face_height == 0: face_height = 0.01
-    if face_width == 0: face_width = 0.01
-
-    # Heuristic Features based on Facial Action Coding System (FACS)
-    
-    # AU4 - Brow Lowerer (Corrugator)
-    left_brow_lower = dist(105, 336) / face_width # Distance between inner brows
-    brow_furrow = dist(10, 151) / face_height # Distance from nasal root to mid forehead
+    return landmarks_to_array(results.face_landmarks[0])
 
-    # AU6 / AU7 - Cheek Raiser / Lid Tightener (Squinting/Crying)
-    left_eye_height = dist(159, 145) / face_height
-    right_eye_height = dist(386, 374) / face_height
-    eye_squint = (left_eye_height + right_eye_height) / 2.0
+def extract_landmarks(image):
+    points = face_landmarks(image)
+    if points is None:
+        return None
+    return landmark_features(points)
 
-    # AU10 - Upper Lip Raiser (Disgust/Pain)
-    nasolabial_fold = dist(2, 0) / face_height # Distance from nose tip to upper lip
+def landmark_features(points):
+    """FACS heuristic features (see services/facial_features.py) from an (N, 2) landmark array."""
+    return features_dict(feature_matrix(points))
 
-    # AU20/26 - Lip Stretcher / Jaw Drop (Crying / Screaming)
-    mouth_width = dist(61, 291) / face_width
-    mouth_height = dist(13, 14) / face_height
-    
-    # Additional Crying indicators
-    # Pulling down of lip corners (AU15)
-    left_lip_corner_drop = dist(61, 206) / face_height
-    right_lip_corner_drop = dist(291, 426) / face_height
-    lip_corner_drop = (left_lip_corner_drop + right_lip_corner_drop) / 2.0
-
-    features = {
-        "brow_lower": left_brow_lower,
-        "brow_furrow": brow_furrow,
-        "eye_squint": eye_squint,
-        "upper_lip_raise": nasolabial_fold,
-        "mouth_stretch": mouth_width,
-        "mouth_open": mouth_height,
-        "lip_drop": lip_corner_drop
-    }
-    
-    return features
+def landmark_box(points, crop_box):
+    """Tight box around the landmarks in full-frame pixels; crop_box is the region they were found in."""
+    x0, y0, x1, y1 = crop_box
+    (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+    cw, ch = x1 - x0, y1 - y0
+    return (int(x0 + min_x * cw), int(y0 + min_y * ch), int(x0 + max_x * cw), int(y0 + max_y * ch))
+
+def _tracked_fit_ok(points):
+    """
+    Sanity of a landmark fit inside a tracking ROI. The landmarker only returns
+    faces above its presence threshold, so this checks geometry instead: the
+    face must lie inside the ROI (not cut by an edge) and fill a reasonable part
+    of it, otherwise the ROI has drifted and a full detection is needed.
+    """
+    lo, hi = points.min(axis=0), points.max(axis=0)
+    if (lo < TRACK_EDGE).any() or (hi > 1 - TRACK_EDGE).any():
+        return False
+    return bool(((hi - lo) >= TRACK_MIN_FILL).all())
+
+def _pad_box(box, pad, w, h):
+    startX, startY, endX, endY = box
+    pad_x, pad_y = int((endX - startX) * pad), int((endY - startY) * pad)
+    return (max(0, startX - pad_x), max(0, startY - pad_y), min(w, endX + pad_x), min(h, endY + pad_y))
+
+def signal_box(result, shape):
+    """
+    Face region for the temporal signals (rPPG skin, respiration head height).
+    Always the padded landmark box, whether the frame was tracked or re-detected:
+    the SSD box is larger and offset from it, and switching between the two
+    every REDETECT_EVERY frames would put a periodic step into the signals.
+    """
+    box = result.get("landmark_box")
+    if box is None:
+        return None
+    h, w = shape[:2]
+    return _pad_box(box, TRACK_BOX_PAD, w, h)
+
+def _locate(image, roi=None):
+    """Face box, landmark box and (N, 2) landmarks for one frame; see detect_and_extract."""
+    h, w = image.shape[:2]
+    timings = {}
+    if roi is not None:
+        t0 = time.perf_counter()
+        rx0, ry0, rx1, ry1 = roi
+        points = face_landmarks(image[ry0:ry1, rx0:rx1]) if rx1 > rx0 and ry1 > ry0 else None
+        timings["track_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+        if points is not None and _tracked_fit_ok(points):
+            tight = landmark_box(points, roi)
+            return {
+                "face_box": _pad_box(tight, TRACK_BOX_PAD, w, h),
+                "landmark_box": tight,
+                "tracked": True,
+                "timings": timings,
+            }, points
+
+    t0 = time.perf_counter()
+    face_box = detect_face_box(image)
+    t1 = time.perf_counter()
+    points = None
+    if face_box is not None:
+        face_box = tuple(int(v) for v in face_box)
+        startX, startY, endX, endY = face_box
+        points = face_landmarks(image[startY:endY, startX:endX])
+    t2 = time.perf_counter()
+    timings["detect_ms"] = round((t1 - t0) * 1000, 2)
+    timings["landmarks_ms"] = round((t2 - t1) * 1000, 2)
+    return {
+        "face_box": face_box,
+        "landmark_box": landmark_box(points, face_box) if points is not None else None,
+        "tracked": False,
+        "timings": timings,
+    }, points
+
+def detect_and_extract(image, roi=None):
+    """
+    Detection + landmark stage for one decoded frame; this is what runs in an
+    inference pool worker. With roi (a tracking region from the previous frame)
+    the SSD is skipped and landmarks run on the ROI; if that fit fails
+    _tracked_fit_ok the frame falls back to full detection.
+    Returns {"face_box", "landmark_box", "features", "tracked", "timings"}, with
+    face_box / features None when no face was found.
+    """
+    result, points = _locate(image, roi)
+    result["features"] = landmark_features(points) if points is not None else None
+    return result
+
+def detect_and_extract_batch(frames):
+    """
+    detect_and_extract over consecutive frames (a list or an (F, H, W, 3) array):
+    a FaceTracker carries the face from frame to frame, and the features of all
+    frames are computed in one feature_matrix call.
+    """
+    from .tracking import FaceTracker
+
+    tracker = FaceTracker()
+    results, points, found = [], [], []
+    for i, image in enumerate(frames):
+        roi = tracker.roi(image.shape)
+        result, pts = _locate(image, roi)
+        tracker.update(image.shape, roi, result)
+        result["features"] = None
+        if pts is not None:
+            points.append(pts)
+            found.append(i)
+        results.append(result)
+    if points:
+        for i, row in zip(found, feature_matrix(np.stack(points))):
+            results[i]["features"] = features_dict(row)
+    return results
 
 def predict_score(features):
-    score = 0
-    
-    # Heuristics rules tailored for identifying crying & distress
-    
-    # 1. Brow Lowering / Furrowing (Max +3)
-    # The inner brows are pulled together and down
-    if features["brow_lower"] < 0.12: score += 1
-    if features["brow_lower"] < 0.09: score += 2
-    
-    # 2. Eye Squeeze / Squinting (Max +3)
-    # Eyes are tightly shut or squinted while crying
-    if features["eye_squint"] < 0.05: score += 1
-    if features["eye_squint"] < 0.035: score += 2
-    
-    # 3. Mouth Open / Stretched (Max +3)
-    # Crying/wailing usually involves an open, stretched mouth
-    if features["mouth_open"] > 0.08: score += 1
-    if features["mouth_open"] > 0.15: score += 1
-    if features["mouth_stretch"] > 0.40: score += 1
-    
-    # 4. Lip Corner Depression (Max +1)
-    # Frowning / sad expression
-    if features["lip_drop"] > 0.18: score += 1
-    
-    # Ensures score is capped cleanly between 0 and 10
-    final_score = min(max(int(score), 0), 10)
-    
-    return final_score
+    """Pain score 0-10 for one feature dict (trained model, else the FACS heuristic); see score_features."""
+    return int(score_matrix(features_to_matrix([features]))["scores"][0])
 
-async def process_frame(b64_string: str, audio_chunk_b64: str = None):
-    image = base64_to_image(b64_string)
-    if image is None:
-        return {"face_detected": False}
-        
-    face_crop = detect_face(image)
-    if face_crop is None:
-        return {"face_detected": False}
-        
-    features = extract_landmarks(face_crop)
-    if features is None:
-        return {"face_detected": False}
+def score_features(features: list) -> dict:
+    """
+    Scores for a list of feature dicts in one model call (services/pain_model.py):
+    {"scores": [int], "probabilities": [float] or None, "source": "model" | "heuristic"}.
+    """
+    if not features:
+        return {"scores": [], "probabilities": None, "source": None}
+    scored = score_matrix(features_to_matrix(features))
+    probabilities = scored["probabilities"]
+    return {
+        "scores": [int(v) for v in scored["scores"]],
+        "probabilities": [round(float(p), 3) for p in probabilities] if probabilities is not None else None,
+        "source": scored["source"],
+    }
+
+async def analyze_image(image, audio_data: dict = None, signals=None, ts: float = None, tracker=None):
+    """
+    Full per-frame pipeline on a decoded image; audio_data is an analyze_audio/analyze_pcm result.
+    signals is the session's PhysioSignals: respiration, agitation and rPPG need a
+    temporal window, so without one (single stateless frame) they are left out.
+    tracker is the session's FaceTracker; with it most frames skip the SSD.
+    Detection and landmarks run in the inference pool and the signal updates in a
+    thread, so the event loop only awaits. When the pool is at capacity the frame
+    is shed: {"face_detected": False, "shed": True}.
+    Frames failing the quality gate (services/frame_quality.py) never reach the
+    pool: {"face_detected": False, "rejected": True, "quality": ...}; degraded
+    frames are analysed with quality_weight < 1.
+    Stage latencies are returned under "timings".
+    """
+    from .inference_pool import pool
+
+    timings = {}
+    t0 = time.perf_counter()
+
+    def prepare():
+        if signals is not None:
+            signals.update_motion(ts, image)
+        return assess_frame(image)
+
+    quality = await asyncio.to_thread(prepare)
+    timings["quality_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    if quality["status"] == "rejected":
+        return {"face_detected": False, "rejected": True, "quality": quality, "timings": timings}
+
+    roi = tracker.roi(image.shape) if tracker is not None else None
+    t1 = time.perf_counter()
+    inference = await pool.infer(image, roi)
+    timings["inference_ms"] = round((time.perf_counter() - t1) * 1000, 2)
+    if inference.get("shed"):
+        return {"face_detected": False, "shed": True}
+    if tracker is not None:
+        tracker.update(image.shape, roi, inference)
+    timings.update(inference.get("timings") or {})
+    face_box, features = inference.get("face_box"), inference.get("features")
+    if face_box is None or features is None:
+        if tracker is not None:
+            tracker.reset()
+        return {"face_detected": False, "timings": timings}
         
-    face_score = predict_score(features)
+    scored = score_features([features])
+    face_score = scored["scores"][0]
     
-    # Run Multimodal Inference Concurrently for Latency (<150ms)
-    results = await asyncio.gather(
-        estimate_respiration(image, face_crop),
-        analyze_audio(audio_chunk_b64),
-        compute_agitation(image),
-        estimate_rppg(face_crop)
-    )
-    
-    resp_data, audio_data, agitation_data, rppg_data = results
+    if signals is not None:
+        t2 = time.perf_counter()
+        box = signal_box(inference, image.shape)
+        if box is not None:
+            x0, y0, x1, y1 = box
+            await asyncio.to_thread(signals.update_face, ts, image, box, image[y0:y1, x0:x1])
+        resp_data, agitation_data, rppg_data = await asyncio.to_thread(signals.estimate)
+        timings["signals_ms"] = round((time.perf_counter() - t2) * 1000, 2)
+    else:
+        resp_data, agitation_data, rppg_data = {}, {}, {}
+    audio_data = audio_data or {"cry_intensity": None, "distress_audio": False}
     
     # Fuse All Modalities
     fusion_result = fuse_modalities(face_score, resp_data, audio_data, agitation_data, rppg_data)
@@ -216,15 +382,198 @@ async def process_frame(b64_string: str, audio_chunk_b64: str = None):
     # Assemble unified response object
     payload = {
         "face_detected": True,
+        "face_score": face_score,
+        "score_source": scored["source"],
         "score": fusion_result["final_pain_score"],
         "risk_level": fusion_result["risk_level"],
         "modalities_used": fusion_result["modalities_used"],
+        "tracked": bool(inference.get("tracked")),
+        "quality_weight": quality["weight"],
+        "timings": timings,
     }
+    if quality["status"] != "ok":
+        payload["quality"] = quality
     
+    if scored["probabilities"] is not None: payload["pain_probability"] = scored["probabilities"][0]
+
     # Safely attach optional physiological measurements
     if resp_data.get("resp_rate") is not None: payload["resp_rate"] = resp_data["resp_rate"]
     if audio_data.get("cry_intensity") is not None: payload["cry_intensity"] = audio_data["cry_intensity"]
     if agitation_data.get("agitation_score") is not None: payload["agitation_score"] = agitation_data["agitation_score"]
-    if rppg_data.get("heart_rate") is not None: payload["heart_rate"] = rppg_data["heart_rate"]
-        
+    if rppg_data.get("heart_rate") is not None:
+        payload["heart_rate"] = rppg_data["heart_rate"]
+        payload["pulse_confidence"] = rppg_data["pulse_confidence"]
+
+    timings["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
     return payload
+
+def weighted_percentile(values: list, weights: list | None, q: float) -> int:
+    """
+    q-th percentile of frame scores where each frame counts by its quality
+    weight; with no or uniform weights this is int(np.percentile(values, q)).
+    """
+    if not weights or len(set(weights)) <= 1:
+        return int(np.percentile(values, q))
+    order = np.argsort(values)
+    v = np.asarray(values, dtype=np.float64)[order]
+    w = np.asarray(weights, dtype=np.float64)[order]
+    cum = np.cumsum(w)
+    return int(v[np.searchsorted(cum, q / 100.0 * cum[-1])])
+
+class BatchAnalysis:
+    """
+    Analysis of one recording fed in consecutive segments (a burst, or the
+    decoded parts of an uploaded clip). Each add() runs detection + landmarks
+    for the segment in one pool call and pushes its frames into the signal
+    buffers, so the images can be dropped right after; finish() fuses the
+    per-frame results with rPPG, respiration and agitation over the latest
+    signal window.
+    """
+
+    def __init__(self):
+        from .session import PhysioSignals
+        self.signals = PhysioSignals()
+        self.frames: list[dict] = []
+        self.face_scores: list[int] = []
+        self.inference_ms = 0.0
+        self.signals_ms = 0.0
+        self.score_source = None
+        self.rejected = 0
+
+    async def add(self, images: list, timestamps: list) -> bool:
+        """Analyse one segment (decoded images, None for undecodable). False if shed by the pool."""
+        from .inference_pool import pool
+
+        t0 = time.perf_counter()
+        valid = [i for i, image in enumerate(images) if image is not None]
+        quality = await asyncio.to_thread(lambda: {i: assess_frame(images[i]) for i in valid})
+        accepted = [i for i in valid if quality[i]["status"] != "rejected"]
+        inference = await pool.infer_batch([images[i] for i in accepted])
+        if isinstance(inference, dict) and inference.get("shed"):
+            return False
+        by_index = dict(zip(accepted, inference))
+        t1 = time.perf_counter()
+
+        def update_signals():
+            for i in valid:
+                image, found = images[i], by_index.get(i, {})
+                self.signals.update_motion(timestamps[i], image)
+                box = signal_box(found, image.shape) if found.get("features") is not None else None
+                if box is not None:
+                    x0, y0, x1, y1 = box
+                    self.signals.update_face(timestamps[i], image, box, image[y0:y1, x0:x1])
+
+        await asyncio.to_thread(update_signals)
+        self.inference_ms += (t1 - t0) * 1000
+        self.signals_ms += (time.perf_counter() - t1) * 1000
+
+        offset = len(self.frames)
+        with_face = [i for i in accepted if by_index[i].get("features") is not None]
+        # The whole segment is scored in one model call
+        scored = score_features([by_index[i]["features"] for i in with_face])
+        face_scores = dict(zip(with_face, scored["scores"]))
+        probabilities = dict(zip(with_face, scored["probabilities"])) if scored["probabilities"] else {}
+        self.score_source = scored["source"] or self.score_source
+        for i, ts in enumerate(timestamps):
+            found = by_index.get(i)
+            frame = {"index": offset + i, "ts": ts, "face_detected": False}
+            if i not in quality:
+                frame["invalid"] = True
+            elif found is None:
+                frame.update({"rejected": True, "reasons": quality[i]["reasons"]})
+                self.rejected += 1
+            elif i in face_scores:
+                frame.update({
+                    "face_detected": True,
+                    "face_score": face_scores[i],
+                    "tracked": bool(found.get("tracked")),
+                    "quality_weight": quality[i]["weight"],
+                })
+                if quality[i]["status"] != "ok":
+                    frame["reasons"] = quality[i]["reasons"]
+                if i in probabilities:
+                    frame["pain_probability"] = probabilities[i]
+            self.frames.append(frame)
+        return True
+
+    def finish(self, audio_data: dict = None) -> dict:
+        """
+        {"frames": [per-frame result], "summary": fused result} where summary
+        has the /score fields (frame_scores, resp_rate, ...).
+        """
+        t0 = time.perf_counter()
+        resp_data, agitation_data, rppg_data = self.signals.estimate()
+        audio_data = audio_data or {"cry_intensity": None, "distress_audio": False}
+
+        frame_scores, frame_weights = [], []
+        for frame in self.frames:
+            if frame["face_detected"]:
+                fused = fuse_modalities(frame["face_score"], resp_data, audio_data, agitation_data, rppg_data)
+                frame["score"] = fused["final_pain_score"]
+                frame_scores.append(frame["score"])
+                frame_weights.append(frame["quality_weight"])
+
+        summary = {"frame_scores": frame_scores, "frame_weights": frame_weights,
+                   "frames_with_face": len(frame_scores), "frames_rejected": self.rejected,
+                   "frame_count": len(self.frames), "score_source": self.score_source}
+        if frame_scores:
+            # Same top-quartile aggregation /score applies to frame scores
+            face_scores = [f["face_score"] for f in self.frames if f["face_detected"]]
+            fused = fuse_modalities(weighted_percentile(face_scores, frame_weights, 75),
+                                    resp_data, audio_data, agitation_data, rppg_data)
+            summary.update({
+                "score": fused["final_pain_score"],
+                "risk_level": fused["risk_level"],
+                "modalities_used": fused["modalities_used"],
+            })
+            if resp_data.get("resp_rate") is not None: summary["resp_rate"] = resp_data["resp_rate"]
+            if audio_data.get("cry_intensity") is not None: summary["cry_intensity"] = audio_data["cry_intensity"]
+            if agitation_data.get("agitation_score") is not None: summary["agitation_score"] = agitation_data["agitation_score"]
+            if rppg_data.get("heart_rate") is not None:
+                summary["heart_rate"] = rppg_data["heart_rate"]
+                summary["pulse_confidence"] = rppg_data["pulse_confidence"]
+            probabilities = [f["pain_probability"] for f in self.frames if "pain_probability" in f]
+            if probabilities:
+                summary["pain_probability"] = round(float(np.mean(probabilities)), 3)
+        summary["timings"] = {
+            "inference_ms": round(self.inference_ms, 2),
+            "signals_ms": round(self.signals_ms + (time.perf_counter() - t0) * 1000, 2),
+        }
+        return {"frames": self.frames, "summary": summary}
+
+async def analyze_batch(images: list, timestamps: list, audio_data: dict = None):
+    """
+    A burst of consecutive frames (decoded, None for undecodable) analysed in one
+    go; see BatchAnalysis. Returns BatchAnalysis.finish(), or {"shed": True}
+    when the pool is at capacity.
+    """
+    t0 = time.perf_counter()
+    analysis = BatchAnalysis()
+    if not await analysis.add(images, timestamps):
+        return {"shed": True}
+    result = analysis.finish(audio_data)
+    result["summary"]["timings"]["total_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return result
+
+async def process_frame(b64_string: str, audio_chunk_b64: str = None):
+    from .pacing import decode_width
+    image = await asyncio.to_thread(base64_to_image, b64_string, decode_width())
+    if image is None:
+        return {"face_detected": False}
+    return await analyze_image(image, await analyze_audio(audio_chunk_b64))
+
+async def process_frame_bytes(data: bytes, audio_data: dict = None, signals=None, ts: float = None, tracker=None,
+                              min_width: int = None):
+    """
+    Same as process_frame for a raw (binary) encoded frame, e.g. from the session
+    WebSocket; min_width is the session's negotiated decode width (see pacing.py).
+    """
+    t0 = time.perf_counter()
+    image = await asyncio.to_thread(bytes_to_image, data, min_width)
+    if image is None:
+        return {"face_detected": False}
+    decode_ms = round((time.perf_counter() - t0) * 1000, 2)
+    result = await analyze_image(image, audio_data, signals, ts, tracker)
+    if "timings" in result:
+        result["timings"]["decode_ms"] = decode_ms
+    return result
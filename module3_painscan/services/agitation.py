@@ -1,17 +1,30 @@
 import numpy as np
 
-async def compute_agitation(image: np.ndarray) -> dict:
+from .signal_buffers import RingBuffer
+
+WINDOW_SECONDS = 3.0
+# Mean absolute frame difference (0-255 grey levels) that maps to agitation 10
+FULL_SCALE_MOTION = 12.0
+MOTION_SIZE = (64, 48)
+
+
+def motion_energy(prev_small: np.ndarray, small: np.ndarray) -> float:
+    '''Mean absolute difference between two consecutive downscaled grayscale frames.'''
+    return float(np.abs(small.astype(np.int16) - prev_small.astype(np.int16)).mean())
+
+
+def compute_agitation(buffer: RingBuffer) -> dict:
     '''
-    Utilizes MediaPipe Pose or bounding box shift dynamics to detect excessive
-    limb motion, guarding postures, or general restlessness indexing.
+    Restlessness over the last WINDOW_SECONDS from whole-frame motion energy
+    (buffer channel 0 = motion_energy per frame), scaled to 0-10.
     '''
     try:
-        if image is None or image.size == 0:
+        if buffer.count < 3:
             return {"agitation_score": None}
 
-        # Emulating the pose landmark velocity distance / frame
-        agitation = np.random.uniform(0.0, 10.0) 
-        
+        _, motion = buffer.window(WINDOW_SECONDS)
+        agitation = min(10.0, 10.0 * float(motion[:, 0].mean()) / FULL_SCALE_MOTION)
+
         return {
             "agitation_score": round(agitation, 1)
         }
@@ -28,3 +28,47 @@ async def analyze_audio(audio_chunk_b64: str) -> dict:
         }
     except Exception:
         return {"cry_intensity": None, "distress_audio": False}
+
+
+# Infant cry fundamental frequency range (Hz) and the level treated as full intensity
+CRY_F0_RANGE = (250.0, 700.0)
+FULL_SCALE_DBFS = -10.0
+SILENCE_DBFS = -50.0
+
+
+def analyze_pcm(samples: np.ndarray, sample_rate: int) -> dict:
+    '''
+    Cry / distress intensity from raw mono PCM (int16 or float in [-1, 1]), typically
+    the last second of audio streamed over the session WebSocket.
+    Intensity = loudness (dBFS mapped to 0-1) x voicing (normalised autocorrelation
+    peak inside the cry pitch range), so loud broadband noise scores lower than crying.
+    '''
+    try:
+        if samples is None or len(samples) < sample_rate // 10:
+            return {"cry_intensity": None, "distress_audio": False}
+
+        x = samples.astype(np.float32)
+        if samples.dtype == np.int16:
+            x /= 32768.0
+        x -= x.mean()
+
+        rms = float(np.sqrt(np.mean(x * x)))
+        dbfs = 20.0 * float(np.log10(max(rms, 1e-9)))
+        loudness = min(1.0, max(0.0, (dbfs - SILENCE_DBFS) / (FULL_SCALE_DBFS - SILENCE_DBFS)))
+
+        # Autocorrelation via FFT; peak within the cry pitch lags
+        n = len(x)
+        spec = np.fft.rfft(x, 2 * n)
+        ac = np.fft.irfft(spec * np.conj(spec))[:n]
+        lo = int(sample_rate / CRY_F0_RANGE[1])
+        hi = min(n - 1, int(sample_rate / CRY_F0_RANGE[0]))
+        voicing = float(ac[lo:hi].max() / ac[0]) if ac[0] > 0 and hi > lo else 0.0
+        voicing = min(1.0, max(0.0, voicing))
+
+        intensity = float(loudness * voicing)
+        return {
+            "cry_intensity": round(intensity, 2),
+            "distress_audio": bool(intensity > 0.8),
+        }
+    except Exception:
+        return {"cry_intensity": None, "distress_audio": False}
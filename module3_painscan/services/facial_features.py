@@ -0,0 +1,62 @@
+import numpy as np
+
+# FACS-based pain/crying features, each the mean of one or more landmark-pair
+# distances normalised by face width or height (MediaPipe 478-point mesh indices).
+#   brow_lower       AU4   inner brow distance                 / width
+#   brow_furrow      AU4   nasal root to mid forehead          / height
+#   eye_squint       AU6/7 upper to lower lid, both eyes       / height
+#   upper_lip_raise  AU10  nose tip to upper lip               / height
+#   mouth_stretch    AU20  mouth corners                       / width
+#   mouth_open       AU26  inner lips                          / height
+#   lip_drop         AU15  lip corner to chin-side point, both / height
+FEATURE_PAIRS = {
+    "brow_lower": ([(105, 336)], "width"),
+    "brow_furrow": ([(10, 151)], "height"),
+    "eye_squint": ([(159, 145), (386, 374)], "height"),
+    "upper_lip_raise": ([(2, 0)], "height"),
+    "mouth_stretch": ([(61, 291)], "width"),
+    "mouth_open": ([(13, 14)], "height"),
+    "lip_drop": ([(61, 206), (291, 426)], "height"),
+}
+FEATURE_NAMES = list(FEATURE_PAIRS)
+
+# Flattened pair index arrays and the (pairs -> features) averaging matrix,
+# built once so a frame's features are one gather, one norm and one matmul.
+_pairs = [(pair, name) for name, (pairs, _) in FEATURE_PAIRS.items() for pair in pairs]
+PAIR_A = np.array([a for (a, _), _ in _pairs])
+PAIR_B = np.array([b for (_, b), _ in _pairs])
+# 0 = normalise by face width, 1 = by face height
+PAIR_AXIS = np.array([0 if FEATURE_PAIRS[name][1] == "width" else 1 for _, name in _pairs])
+COMBINE = np.zeros((len(_pairs), len(FEATURE_NAMES)))
+for i, (_, name) in enumerate(_pairs):
+    COMBINE[i, FEATURE_NAMES.index(name)] = 1.0 / len(FEATURE_PAIRS[name][0])
+del _pairs
+
+
+def landmarks_to_array(landmarks) -> np.ndarray:
+    '''MediaPipe NormalizedLandmark list -> (N, 2) float array of x, y (done once per frame).'''
+    n = len(landmarks)
+    points = np.empty((n, 2))
+    points[:, 0] = np.fromiter((lm.x for lm in landmarks), np.float64, n)
+    points[:, 1] = np.fromiter((lm.y for lm in landmarks), np.float64, n)
+    return points
+
+
+def feature_matrix(points: np.ndarray) -> np.ndarray:
+    '''
+    Features for one face (points (N, 2) -> (len(FEATURE_NAMES),)) or a batch of
+    frames (points (F, N, 2) -> (F, len(FEATURE_NAMES))), columns in FEATURE_NAMES order.
+    '''
+    points = np.asarray(points, dtype=np.float64)
+    # Reducing over N along a contiguous axis is several times faster than over axis -2 of (N, 2)
+    xy = np.swapaxes(points, -1, -2).copy()                     # (..., 2, N)
+    size = xy.max(axis=-1) - xy.min(axis=-1)                    # (..., 2): width, height
+    size[size == 0] = 0.01
+    d = points[..., PAIR_A, :] - points[..., PAIR_B, :]         # (..., pairs, 2)
+    d = np.hypot(d[..., 0], d[..., 1])
+    return (d / size[..., PAIR_AXIS]) @ COMBINE
+
+
+def features_dict(row: np.ndarray) -> dict:
+    '''One feature_matrix row as the {name: value} dict the scoring code takes.'''
+    return {name: float(v) for name, v in zip(FEATURE_NAMES, row)}
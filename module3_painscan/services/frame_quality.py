@@ -0,0 +1,89 @@
+import cv2
+import numpy as np
+
+# Quality is judged on a small grayscale copy: enough for focus / exposure / blur
+# and far cheaper than the detector it protects.
+QUALITY_SIZE = (160, 120)
+
+# Laplacian variance on QUALITY_SIZE (sharp webcam faces sit well above 100)
+BLUR_REJECT = 15.0
+BLUR_DEGRADE = 40.0
+# Exposure: mean grey level and share of near-black / near-white pixels
+DARK_LEVEL, BRIGHT_LEVEL = 25, 235
+MEAN_REJECT_DARK, MEAN_REJECT_BRIGHT = 35.0, 225.0
+MEAN_DEGRADE_DARK, MEAN_DEGRADE_BRIGHT = 60.0, 200.0
+CLIPPED_REJECT = 0.6
+CLIPPED_DEGRADE = 0.3
+# Directional blur: ratio of horizontal to vertical gradient energy (either way);
+# still faces sit around 1-2, smearing along one axis pushes it up
+MOTION_DEGRADE = 3.0
+MOTION_REJECT = 6.0
+
+# Weight a degraded frame's score carries in the session aggregate
+DEGRADED_WEIGHT = 0.5
+
+GUIDANCE = {
+    "blurry": "Image is blurry - wipe the lens and hold the camera steady",
+    "motion_blur": "Hold the camera still",
+    "dark": "Too dark - move to a brighter spot or turn on a light",
+    "overexposed": "Too bright - avoid direct light or a window behind the child",
+}
+
+
+def assess_frame(image: np.ndarray) -> dict:
+    '''
+    Cheap pre-inference quality check of a BGR frame:
+      - sharpness: variance of the Laplacian
+      - exposure: mean level and clipped dark / bright share of the histogram
+      - motion blur: strong imbalance between horizontal and vertical gradient
+        energy (smearing along the motion direction flattens one of them)
+    Returns {"status": "ok" | "degraded" | "rejected", "weight", "reasons",
+    "guidance", "metrics"}; rejected frames should skip detection entirely.
+    '''
+    small = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), QUALITY_SIZE, interpolation=cv2.INTER_AREA)
+
+    sharpness = float(cv2.Laplacian(small, cv2.CV_64F).var())
+    hist = np.bincount(small.ravel(), minlength=256) / small.size
+    mean = float(hist @ np.arange(256))
+    dark = float(hist[:DARK_LEVEL].sum())
+    bright = float(hist[BRIGHT_LEVEL:].sum())
+    gx = cv2.Sobel(small, cv2.CV_64F, 1, 0, ksize=3)
+    gy = cv2.Sobel(small, cv2.CV_64F, 0, 1, ksize=3)
+    ex, ey = float((gx * gx).mean()), float((gy * gy).mean())
+    anisotropy = max(ex, ey) / max(min(ex, ey), 1e-6)
+
+    rejected, degraded = [], []
+    if mean < MEAN_REJECT_DARK or dark > CLIPPED_REJECT:
+        rejected.append("dark")
+    elif mean < MEAN_DEGRADE_DARK or dark > CLIPPED_DEGRADE:
+        degraded.append("dark")
+    if mean > MEAN_REJECT_BRIGHT or bright > CLIPPED_REJECT:
+        rejected.append("overexposed")
+    elif mean > MEAN_DEGRADE_BRIGHT or bright > CLIPPED_DEGRADE:
+        degraded.append("overexposed")
+    # A dark frame has little texture anyway, so only judge focus when exposure is usable
+    if not rejected:
+        if anisotropy > MOTION_REJECT:
+            rejected.append("motion_blur")
+        elif sharpness < BLUR_REJECT:
+            rejected.append("blurry")
+        elif anisotropy > MOTION_DEGRADE:
+            degraded.append("motion_blur")
+        elif sharpness < BLUR_DEGRADE:
+            degraded.append("blurry")
+
+    reasons = rejected or degraded
+    status = "rejected" if rejected else "degraded" if degraded else "ok"
+    return {
+        "status": status,
+        "weight": 0.0 if rejected else DEGRADED_WEIGHT if degraded else 1.0,
+        "reasons": reasons,
+        "guidance": GUIDANCE[reasons[0]] if reasons else None,
+        "metrics": {
+            "sharpness": round(sharpness, 1),
+            "brightness": round(mean, 1),
+            "dark_share": round(dark, 3),
+            "bright_share": round(bright, 3),
+            "anisotropy": round(anisotropy, 2),
+        },
+    }
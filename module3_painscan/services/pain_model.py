@@ -0,0 +1,112 @@
+import os
+
+import joblib
+import numpy as np
+
+from .facial_features import FEATURE_NAMES
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "pain_model.pkl")
+# Models over 0-10 pain classes: probability mass at or above this score counts as pain
+PAIN_CLASS_THRESHOLD = 4
+
+
+class PainModel:
+    '''
+    The trained pain classifier (pain_model.pkl: an sklearn SVC or pipeline
+    over the FEATURE_NAMES columns) applied to whole feature matrices.
+    Two label layouts are understood:
+      - binary (no pain / pain): score = 10 x P(pain)
+      - pain scores 0-10 as classes: score = expected class under the probabilities
+    Probabilities come from the model's own Platt calibration (SVC probability=True
+    or a CalibratedClassifierCV); a model without predict_proba gets a logistic
+    of its decision function and is reported as uncalibrated.
+    '''
+
+    def __init__(self, model):
+        n_features = getattr(model, "n_features_in_", len(FEATURE_NAMES))
+        if n_features != len(FEATURE_NAMES):
+            raise ValueError(f"pain model expects {n_features} features, landmarks give {len(FEATURE_NAMES)}")
+        names = getattr(model, "feature_names_in_", None)
+        # Column order the model was trained with (models fitted on a DataFrame record it)
+        self.columns = np.array([FEATURE_NAMES.index(n) for n in names]) if names is not None else None
+        self.model = model
+        self.classes = np.asarray(model.classes_)
+        self.binary = len(self.classes) == 2
+        # SVC(probability=False) raises AttributeError on predict_proba, so hasattr is the test
+        self.calibrated = hasattr(model, "predict_proba")
+        if not self.binary and not np.issubdtype(self.classes.dtype, np.number):
+            raise ValueError("multi-class pain model needs numeric (0-10) classes")
+
+    def predict(self, X: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        '''(scores 0-10 as ints, P(pain) per row) for an (F, len(FEATURE_NAMES)) matrix, in one call.'''
+        if self.columns is not None:
+            X = X[:, self.columns]
+        if self.calibrated:
+            proba = self.model.predict_proba(X)
+        else:
+            decision = np.asarray(self.model.decision_function(X), dtype=np.float64)
+            if self.binary:
+                p1 = 1.0 / (1.0 + np.exp(-decision))
+                proba = np.column_stack([1.0 - p1, p1])
+            else:
+                e = np.exp(decision - decision.max(axis=1, keepdims=True))
+                proba = e / e.sum(axis=1, keepdims=True)
+
+        if self.binary:
+            p_pain = proba[:, 1]
+            scores = 10.0 * p_pain
+        else:
+            values = self.classes.astype(np.float64)
+            scores = proba @ values
+            p_pain = proba[:, values >= PAIN_CLASS_THRESHOLD].sum(axis=1)
+        return np.clip(np.rint(scores), 0, 10).astype(int), p_pain
+
+
+def load_model(path: str = MODEL_PATH) -> PainModel | None:
+    try:
+        return PainModel(joblib.load(path))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[painscan] Pain model not used, falling back to heuristic: {e}")
+        return None
+
+
+def heuristic_scores(X: np.ndarray) -> np.ndarray:
+    '''
+    The FACS threshold rules (originally predict_score's if-chain) over a feature
+    matrix: brow lowering and eye squeeze up to +3 each, mouth open / stretched
+    up to +3, lip corner depression +1.
+    '''
+    col = {name: X[:, i] for i, name in enumerate(FEATURE_NAMES)}
+    score = (
+        (col["brow_lower"] < 0.12).astype(int) + 2 * (col["brow_lower"] < 0.09)
+        + (col["eye_squint"] < 0.05) + 2 * (col["eye_squint"] < 0.035)
+        + (col["mouth_open"] > 0.08) + (col["mouth_open"] > 0.15) + (col["mouth_stretch"] > 0.40)
+        + (col["lip_drop"] > 0.18)
+    )
+    return np.clip(score, 0, 10)
+
+
+model = load_model()
+
+
+def score_matrix(X: np.ndarray) -> dict:
+    '''
+    Pain scores for every row of a feature matrix in one call:
+    {"scores": int array, "probabilities": P(pain) array or None, "source": "model" | "heuristic"}.
+    The heuristic is used when no usable model is loaded or the model call fails.
+    '''
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    if model is not None:
+        try:
+            scores, probabilities = model.predict(X)
+            return {"scores": scores, "probabilities": probabilities, "source": "model"}
+        except Exception as e:
+            print(f"[painscan] Pain model failed, using heuristic: {e}")
+    return {"scores": heuristic_scores(X), "probabilities": None, "source": "heuristic"}
+
+
+def features_to_matrix(features: list) -> np.ndarray:
+    '''Feature dicts (extract_landmarks output) -> (F, len(FEATURE_NAMES)) matrix.'''
+    return np.array([[f[name] for name in FEATURE_NAMES] for f in features], dtype=np.float64).reshape(-1, len(FEATURE_NAMES))
@@ -1,31 +1,72 @@
 import numpy as np
 
-async def estimate_respiration(image: np.ndarray, face_box: tuple = None) -> dict:
+from .signal_buffers import RingBuffer, detrend, dominant_frequency, native_rate, resample_uniform
+
+# Breathing band 0.1-1.0 Hz = 6-60 breaths/min (covers infant rates)
+RESP_BAND_HZ = (0.1, 1.0)
+# Nyquist: slower capture aliases faster breathing into the band, so no rate is reported below it
+MIN_SAMPLE_FPS = 2.0 * RESP_BAND_HZ[1]
+WINDOW_SECONDS = 15.0
+MIN_SECONDS = 8.0
+RESAMPLE_POINTS = 128
+# Share of breathing-band power in the peak; broadband noise alone sits around 0.3
+MIN_CONFIDENCE = 0.5
+
+
+def respiration_sample(gray: np.ndarray, face_box: tuple) -> np.ndarray:
+    '''
+    Two breathing-related motion signals for one frame:
+      - vertical centre of the face box (head rises and falls with breathing)
+      - mean brightness of the chest region below the face (shading shifts as it moves)
+    gray is the full frame in grayscale; face_box is (x0, y0, x1, y1) in its pixels.
+    '''
+    h, w = gray.shape[:2]
+    x0, y0, x1, y1 = face_box
+    fw, fh = x1 - x0, y1 - y0
+    cx0, cx1 = max(0, int(x0 - 0.5 * fw)), min(w, int(x1 + 0.5 * fw))
+    cy0, cy1 = min(h, int(y1)), min(h, int(y1 + 1.5 * fh))
+    chest = gray[cy0:cy1, cx0:cx1]
+    chest_mean = float(chest.mean()) if chest.size else np.nan
+    return np.array([(y0 + y1) / (2.0 * h), chest_mean])
+
+
+def estimate_respiration(buffer: RingBuffer) -> dict:
     '''
-    Extracts an estimated respiration rate from lower-face/chest optical flow ROI.
-    For this integration, we simulate the optical flow logic securely under <150ms constraints
-    using basic localized variance modeling since we're processing per-frame async.
+    Respiration rate from the last WINDOW_SECONDS of respiration_sample() rows:
+    each signal is detrended and its dominant breathing-band frequency found by
+    FFT; the more periodic of the two (higher confidence) is reported. Nothing
+    is reported when the rows were captured slower than MIN_SAMPLE_FPS.
     '''
     try:
-        if image is None or image.size == 0:
+        if buffer.count < 8 or buffer.duration() < MIN_SECONDS:
             return {"resp_rate": None, "resp_distress": False}
 
-        # Mocking the FFT / Bandpass 0.1-0.7Hz flow for integration constraints
-        # True extraction requires a 10s buffer, so we estimate per frame variance 
-        # relative to common pediatric breathing norms (20-30 bpm).
-        
-        # A simple variance mapped to a stable standard normal baseline.
-        variance_metric = np.var(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)) if 'cv2' in globals() else np.random.normal(25, 5)
-        
-        # Cap to realistic human bounds (10 - 60)
-        resp_rate = max(10, min(60, 20 + (variance_metric % 15)))
-        
+        ts, signals = buffer.window(WINDOW_SECONDS)
+        if native_rate(ts) < MIN_SAMPLE_FPS:
+            return {"resp_rate": None, "resp_distress": False}
+        usable = [c for c in range(signals.shape[1]) if not np.isnan(signals[:, c]).any()]
+        if not usable:
+            return {"resp_rate": None, "resp_distress": False}
+        signals, fs = resample_uniform(ts, signals[:, usable], RESAMPLE_POINTS)
+        signals = detrend(signals)
+
+        best_freq, best_conf = None, 0.0
+        for c in range(signals.shape[1]):
+            freq, conf = dominant_frequency(signals[:, c], fs, RESP_BAND_HZ)
+            if freq is not None and conf > best_conf:
+                best_freq, best_conf = freq, conf
+        if best_freq is None or best_conf < MIN_CONFIDENCE:
+            return {"resp_rate": None, "resp_distress": False}
+
+        resp_rate = best_freq * 60.0
+
         # Distress flag if > 40 breaths per min (Tachypnea)
         distress = resp_rate > 40
-        
+
         return {
             "resp_rate": round(resp_rate, 1),
-            "resp_distress": distress
+            "resp_distress": distress,
+            "resp_confidence": round(best_conf, 2)
         }
     except Exception:
         return {"resp_rate": None, "resp_distress": False}
@@ -1,29 +1,66 @@
 import numpy as np
-import cv2
 
-async def estimate_rppg(image: np.ndarray, face_box: tuple = None) -> dict:
+from .signal_buffers import RingBuffer, detrend, dominant_frequency, native_rate, resample_uniform
+
+# Pulse band 0.7-4 Hz = 42-240 bpm (covers infant heart rates)
+PULSE_BAND_HZ = (0.7, 4.0)
+# Nyquist: slower capture aliases faster pulses into the band, so no rate is reported below it
+MIN_SAMPLE_FPS = 2.0 * PULSE_BAND_HZ[1]
+WINDOW_SECONDS = 10.0
+MIN_SECONDS = 5.0
+RESAMPLE_POINTS = 256
+# Below this share of pulse-band power in the peak the rate is not reported (noise sits near 0.15-0.3)
+MIN_CONFIDENCE = 0.4
+
+
+def skin_rgb_means(face_crop: np.ndarray) -> np.ndarray | None:
     '''
-    Extracts heart rate using remote photoplethysmography (rPPG) from RGB channels
-    across the facial ROI. 
+    Mean R, G, B of the central face region (forehead to cheeks), leaving out
+    hair, background and the mouth, which move independently of the pulse.
+    '''
+    if face_crop is None or face_crop.size == 0:
+        return None
+    h, w = face_crop.shape[:2]
+    roi = face_crop[int(h * 0.15):int(h * 0.65), int(w * 0.2):int(w * 0.8)]
+    if roi.size == 0:
+        return None
+    b, g, r = roi.reshape(-1, 3).mean(axis=0)
+    return np.array([r, g, b])
+
+
+def estimate_rppg(buffer: RingBuffer) -> dict:
+    '''
+    Heart rate by remote photoplethysmography over the last WINDOW_SECONDS of
+    skin RGB means (buffer channels: R, G, B), using the POS projection
+    (Wang et al. 2017): temporally normalise each channel, project onto the
+    plane orthogonal to skin tone, then take the dominant pulse-band frequency.
+    pulse_confidence is the share of pulse-band power in that peak; below
+    MIN_CONFIDENCE, or when the frames were captured slower than
+    MIN_SAMPLE_FPS, no heart rate is reported.
     '''
     try:
-        if image is None or image.size == 0:
+        if buffer.count < 8 or buffer.duration() < MIN_SECONDS:
+            return {"heart_rate": None, "pulse_confidence": 0}
+
+        ts, rgb = buffer.window(WINDOW_SECONDS)
+        if native_rate(ts) < MIN_SAMPLE_FPS:
             return {"heart_rate": None, "pulse_confidence": 0}
+        rgb, fs = resample_uniform(ts, rgb, RESAMPLE_POINTS)
+        mean = rgb.mean(axis=0)
+        if np.any(mean <= 0):
+            return {"heart_rate": None, "pulse_confidence": 0}
+        cn = detrend(rgb / mean)
+
+        s1 = cn[:, 1] - cn[:, 2]                      # G - B
+        s2 = cn[:, 1] + cn[:, 2] - 2.0 * cn[:, 0]     # G + B - 2R
+        std2 = s2.std()
+        pulse = s1 + (s1.std() / std2) * s2 if std2 > 0 else s1
 
-        # rPPG usually isolates the Green channel, calculates mean spatial values
-        # over time, detrends, and applies FFT to find the dominant frequency (0.7-4Hz).
-        # We mock the FFT pipeline constraint since we only receive single discrete frames
-        # in /analyze-frame right now, meaning true temporal batching cannot occur within
-        # the route isolation constraint.
-
-        green_mean = np.mean(image[:, :, 1])
-        hr = max(60.0, min(140.0, 60.0 + (green_mean % 40)))
-        
-        # If signal variance is too low/high, confidence drops
-        confidence = min(1.0, max(0.2, (np.var(image[:, :, 1]) % 100) / 100.0))
-        
+        freq, confidence = dominant_frequency(pulse, fs, PULSE_BAND_HZ)
+        if freq is None or confidence < MIN_CONFIDENCE:
+            return {"heart_rate": None, "pulse_confidence": round(confidence, 2)}
         return {
-            "heart_rate": round(hr, 1),
+            "heart_rate": round(freq * 60.0, 1),
             "pulse_confidence": round(confidence, 2)
         }
     except Exception:
@@ -0,0 +1,124 @@
+'''
+Fixed-size temporal buffers and the shared spectral estimator behind rPPG and
+respiration. Buffers never grow or reallocate: every sample is written twice
+(slot i and i + capacity) so the newest `count` samples are always one
+contiguous slice, and window() returns views instead of copies.
+'''
+
+import numpy as np
+
+
+class RingBuffer:
+    def __init__(self, capacity: int, channels: int):
+        self.capacity = capacity
+        self.channels = channels
+        self._ts = np.zeros(2 * capacity)
+        self._data = np.zeros((2 * capacity, channels))
+        self._next = 0
+        self.count = 0
+
+    def push(self, ts: float, values) -> None:
+        i, j = self._next, self._next + self.capacity
+        self._ts[i] = self._ts[j] = ts
+        self._data[i] = self._data[j] = values
+        self._next = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, seconds: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+        '''(timestamps, samples) views of the newest samples, optionally only the last `seconds`.'''
+        end = self._next + self.capacity
+        ts = self._ts[end - self.count:end]
+        data = self._data[end - self.count:end]
+        if seconds is not None and self.count:
+            start = int(np.searchsorted(ts, ts[-1] - seconds))
+            ts, data = ts[start:], data[start:]
+        return ts, data
+
+    def duration(self) -> float:
+        if self.count < 2:
+            return 0.0
+        ts, _ = self.window()
+        return float(ts[-1] - ts[0])
+
+    def clear(self) -> None:
+        self._next = 0
+        self.count = 0
+
+
+# Per-length constants, computed once per estimator length: linear detrend projection and Hann taper
+_DETREND: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+_HANN: dict[int, np.ndarray] = {}
+
+
+def _detrend_basis(n: int) -> tuple[np.ndarray, np.ndarray]:
+    if n not in _DETREND:
+        basis = np.vstack([np.ones(n), np.linspace(-1.0, 1.0, n)])   # (2, n)
+        _DETREND[n] = (basis, np.linalg.pinv(basis))                  # pinv: (n, 2)
+    return _DETREND[n]
+
+
+def _hann(n: int) -> np.ndarray:
+    if n not in _HANN:
+        _HANN[n] = np.hanning(n)
+    return _HANN[n]
+
+
+def native_rate(ts: np.ndarray) -> float:
+    '''Mean rate (Hz) the samples were actually captured at, from their count and time span.'''
+    span = float(ts[-1] - ts[0]) if len(ts) > 1 else 0.0
+    return (len(ts) - 1) / span if span > 0 else 0.0
+
+
+def resample_uniform(ts: np.ndarray, data: np.ndarray, n: int) -> tuple[np.ndarray, float]:
+    '''
+    Linear-interpolate irregularly timed samples (m, channels) onto n uniform
+    points. A fixed n per estimator keeps the detrend/taper constants cached.
+    Returns (resampled (n, channels), sample rate in Hz). The returned rate is
+    the grid's, not the capture rate: interpolation adds no information above
+    native_rate(ts) / 2, so callers check that against their band first.
+    '''
+    grid = np.linspace(ts[0], ts[-1], n)
+    out = np.empty((n, data.shape[1]))
+    for c in range(data.shape[1]):
+        out[:, c] = np.interp(grid, ts, data[:, c])
+    return out, (n - 1) / (ts[-1] - ts[0])
+
+
+def detrend(x: np.ndarray) -> np.ndarray:
+    '''Remove the least-squares linear trend along axis 0 (works for (n,) and (n, channels)).'''
+    basis, pinv = _detrend_basis(len(x))
+    return x - basis.T @ (x.T @ pinv).T
+
+
+def dominant_frequency(x: np.ndarray, fs: float, band: tuple[float, float]) -> tuple[float | None, float]:
+    '''
+    Strongest frequency of a detrended 1-D signal inside `band` (Hz), via a
+    zero-padded Hann-windowed FFT with parabolic peak refinement.
+    Returns (frequency_hz, confidence) where confidence is the share of in-band
+    power inside the peak's main lobe (+-2 / window length), 0..1.
+    '''
+    n = len(x)
+    peak_width_hz = 2.0 * fs / n
+    nfft = max(1024, 1 << (n - 1).bit_length())
+    power = np.abs(np.fft.rfft(x * _hann(n), nfft)) ** 2
+    freqs = np.fft.rfftfreq(nfft, 1.0 / fs)
+    lo, hi = np.searchsorted(freqs, band[0]), np.searchsorted(freqs, band[1], side="right")
+    if hi - lo < 3:
+        return None, 0.0
+    in_band = power[lo:hi]
+    total = float(in_band.sum())
+    if total <= 0:
+        return None, 0.0
+    k = int(np.argmax(in_band))
+
+    # Parabolic interpolation between FFT bins
+    offset = 0.0
+    if 0 < k < len(in_band) - 1:
+        a, b, c = in_band[k - 1], in_band[k], in_band[k + 1]
+        denom = a - 2 * b + c
+        if denom != 0:
+            offset = 0.5 * (a - c) / denom
+    peak_hz = float(freqs[lo + k] + offset * (freqs[1] - freqs[0]))
+
+    near = np.abs(freqs[lo:hi] - peak_hz) <= peak_width_hz
+    return peak_hz, float(in_band[near].sum() / total)
@@ -0,0 +1,327 @@
+"""
+module3_painscan/session.py
+PainScan streaming sessions: binary wire format and per-session state.
+
+A client opens /api/painscan/ws/session and sends binary packets:
+    header  !BId   kind (1 = JPEG frame, 2 = PCM audio), sequence number, capture time (s)
+    payload        encoded frame bytes | little-endian int16 mono PCM
+Frames and audio have separate sequence counters. Frames are analysed one at a
+time in capture order; if the client sends faster than analysis keeps up, only
+the newest waiting frame is kept (older ones are superseded, never queued), so
+results stay live instead of falling behind. Late frames (seq not newer than
+the last accepted) are dropped as stale; gaps in either counter are counted
+as lost. Audio is kept as a rolling AUDIO_WINDOW_SECONDS window that each frame
+analysis reads, PhysioSignals keeps the ring buffers behind rPPG,
+respiration and agitation, and FaceTracker lets most frames skip detection. Sessions live in this worker's SessionStore for the
+lifetime of the socket.
+"""
+from __future__ import annotations
+import asyncio
+import os
+import struct
+import time
+import uuid
+from collections import deque
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from .services.agitation import MOTION_SIZE, compute_agitation, motion_energy
+from .services.audio_analysis import analyze_pcm
+from .services.respiration import estimate_respiration, respiration_sample
+from .services.rppg import (
+    MIN_SECONDS as RPPG_MIN_SECONDS, WINDOW_SECONDS as RPPG_WINDOW_SECONDS, estimate_rppg, skin_rgb_means,
+)
+from .services.signal_buffers import RingBuffer, native_rate
+from .pacing import PACE_MIN_INTERVAL, target_for
+from .tracking import FaceTracker
+
+FRAME, AUDIO = 1, 2
+HEADER = struct.Struct("!BId")
+
+AUDIO_WINDOW_SECONDS = 1.0
+DEFAULT_SAMPLE_RATE = 16000
+SAMPLE_RATE_RANGE = (4000, 96000)
+MAX_SESSIONS = int(os.getenv("PAINSCAN_MAX_SESSIONS", "64"))
+MAX_FRAME_BYTES = int(os.getenv("PAINSCAN_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+# Ring buffer capacity in frames: 20 s at up to 30 fps
+SIGNAL_CAPACITY = 600
+# Per-frame (score, weight) pairs kept for the final /score submission: 10 min at 10 fps
+MAX_FRAME_RESULTS = int(os.getenv("PAINSCAN_MAX_FRAME_RESULTS", "6000"))
+# How long "finish" waits for in-flight analysis before saving what it has
+DRAIN_TIMEOUT_SECONDS = 10.0
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def parse_packet(data: bytes) -> tuple[int, int, float, memoryview]:
+    """Split a binary packet into (kind, seq, capture_ts, payload)."""
+    if len(data) < HEADER.size:
+        raise ProtocolError("packet shorter than header")
+    kind, seq, ts = HEADER.unpack_from(data)
+    if kind not in (FRAME, AUDIO):
+        raise ProtocolError(f"unknown packet kind {kind}")
+    payload = memoryview(data)[HEADER.size:]
+    if kind == FRAME and len(payload) > MAX_FRAME_BYTES:
+        raise ProtocolError("frame too large")
+    if kind == AUDIO and len(payload) % 2:
+        raise ProtocolError("odd-length PCM payload (expected int16 samples)")
+    return kind, seq, ts, payload
+
+
+def parse_sample_rate(value) -> int:
+    """Validate a client-supplied PCM sample rate (Hz)."""
+    try:
+        rate = int(value)
+    except (TypeError, ValueError):
+        raise ProtocolError(f"invalid sample_rate {value!r}")
+    if not SAMPLE_RATE_RANGE[0] <= rate <= SAMPLE_RATE_RANGE[1]:
+        raise ProtocolError(f"sample_rate must be between {SAMPLE_RATE_RANGE[0]} and {SAMPLE_RATE_RANGE[1]} Hz")
+    return rate
+
+
+class PhysioSignals:
+    """
+    Temporal signals for one session, each in a fixed-size RingBuffer:
+        rgb     skin R, G, B means of the face ROI           -> rPPG heart rate
+        resp    face-box centre height, chest ROI brightness -> respiration rate
+        motion  whole-frame motion energy                    -> agitation
+    Per frame this costs one push per buffer plus one FFT per estimate over the
+    window; nothing grows with session length.
+    """
+
+    def __init__(self, capacity: int = SIGNAL_CAPACITY):
+        self.rgb = RingBuffer(capacity, 3)
+        self.resp = RingBuffer(capacity, 2)
+        self.motion = RingBuffer(capacity, 1)
+        self._prev_small: np.ndarray | None = None
+
+    def update_motion(self, ts: float, image: np.ndarray) -> None:
+        small = cv2.resize(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), MOTION_SIZE, interpolation=cv2.INTER_AREA)
+        if self._prev_small is not None:
+            self.motion.push(ts, motion_energy(self._prev_small, small))
+        self._prev_small = small
+
+    def update_face(self, ts: float, image: np.ndarray, face_box: tuple, face_crop: np.ndarray) -> None:
+        rgb = skin_rgb_means(face_crop)
+        if rgb is not None:
+            self.rgb.push(ts, rgb)
+        self.resp.push(ts, respiration_sample(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), face_box))
+
+    def analysed_fps(self) -> float | None:
+        """Rate face samples actually arrived at over the rPPG window, None until it spans MIN_SECONDS."""
+        if self.rgb.duration() < RPPG_MIN_SECONDS:
+            return None
+        ts, _ = self.rgb.window(RPPG_WINDOW_SECONDS)
+        return native_rate(ts)
+
+    def estimate(self) -> tuple[dict, dict, dict]:
+        """(respiration, agitation, rppg) results over the current windows."""
+        return estimate_respiration(self.resp), compute_agitation(self.motion), estimate_rppg(self.rgb)
+
+
+class ScanSession:
+    """State for one streaming assessment."""
+
+    def __init__(self, patient_id: str | None, followup_id: str | None, sample_rate: int = DEFAULT_SAMPLE_RATE):
+        self.id = uuid.uuid4().hex
+        self.patient_id = patient_id
+        self.followup_id = followup_id
+        self.sample_rate = sample_rate
+        self.started_at = time.time()
+        # (score, quality_weight) per analysed frame with a face, newest MAX_FRAME_RESULTS only
+        self.results: deque[tuple[int, float]] = deque(maxlen=MAX_FRAME_RESULTS)
+        self.latest: dict | None = None        # last analysed frame with a face
+        self.last_frame_seq = -1
+        self.last_audio_seq = -1
+        self.send_lock = asyncio.Lock()
+        self.signals = PhysioSignals()
+        self.tracker = FaceTracker()
+        self._stage_ms: dict[str, list] = {}       # stage -> [total ms, frames]
+        self.quality_reasons: dict[str, int] = {}   # rejected / degraded frames per reason
+        self.target: dict | None = None             # capture target last sent to the client
+        self._pace_sent_at = 0.0
+        self.stats = {
+            "frames_received": 0,
+            "frames_analysed": 0,
+            "frames_superseded": 0,
+            "frames_stale": 0,
+            "frames_lost": 0,
+            "no_face": 0,
+            "shed": 0,
+            "rejected": 0,
+            "degraded": 0,
+            "audio_chunks": 0,
+            "audio_lost": 0,
+            "pace_changes": 0,
+        }
+        self._pending: Optional[tuple[int, float, bytes]] = None
+        self._frame_ready = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._audio: deque[np.ndarray] = deque()
+        self._audio_samples = 0
+
+    # ── Intake ────────────────────────────────────────────────────────────
+
+    def accept_frame(self, seq: int, ts: float, payload) -> bool:
+        self.stats["frames_received"] += 1
+        if seq <= self.last_frame_seq:
+            self.stats["frames_stale"] += 1
+            return False
+        if self.last_frame_seq >= 0:
+            self.stats["frames_lost"] += seq - self.last_frame_seq - 1
+        self.last_frame_seq = seq
+        if self._pending is not None:
+            self.stats["frames_superseded"] += 1
+        self._pending = (seq, ts, bytes(payload))
+        self._idle.clear()
+        self._frame_ready.set()
+        return True
+
+    def add_audio(self, seq: int, payload) -> None:
+        if seq <= self.last_audio_seq:
+            return
+        if self.last_audio_seq >= 0:
+            self.stats["audio_lost"] += seq - self.last_audio_seq - 1
+        self.last_audio_seq = seq
+        self.stats["audio_chunks"] += 1
+        chunk = np.frombuffer(payload, dtype="<i2")
+        self._audio.append(chunk)
+        self._audio_samples += len(chunk)
+        keep = int(self.sample_rate * AUDIO_WINDOW_SECONDS)
+        while self._audio and self._audio_samples - len(self._audio[0]) >= keep:
+            self._audio_samples -= len(self._audio.popleft())
+
+    def audio_features(self) -> dict | None:
+        """Cry intensity over the rolling audio window, or None when no audio was streamed."""
+        if not self._audio:
+            return None
+        return analyze_pcm(np.concatenate(self._audio), self.sample_rate)
+
+    # ── Analysis loop ─────────────────────────────────────────────────────
+
+    async def next_frame(self) -> tuple[int, float, bytes]:
+        while self._pending is None:
+            self._idle.set()
+            self._frame_ready.clear()
+            await self._frame_ready.wait()
+        frame, self._pending = self._pending, None
+        return frame
+
+    async def drain(self, analyser: asyncio.Task | None = None, timeout: float = DRAIN_TIMEOUT_SECONDS) -> bool:
+        """
+        Wait until the frame being analysed and any waiting frame are done.
+        Gives up after timeout, or as soon as the analyser task (if given) has
+        ended, since nothing would ever set idle then. Returns whether it drained.
+        """
+        idle = asyncio.ensure_future(self._idle.wait())
+        waits = [idle] + ([analyser] if analyser is not None else [])
+        try:
+            await asyncio.wait(waits, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            idle.cancel()
+        return self._idle.is_set()
+
+    def record(self, seq: int, ts: float, result: dict) -> None:
+        if result.get("shed"):
+            self.stats["shed"] += 1
+            return
+        self.stats["frames_analysed"] += 1
+        for stage, ms in (result.get("timings") or {}).items():
+            acc = self._stage_ms.setdefault(stage, [0.0, 0])
+            acc[0] += ms
+            acc[1] += 1
+        quality = result.get("quality")
+        if quality:
+            self.stats["rejected" if quality["status"] == "rejected" else "degraded"] += 1
+            for reason in quality["reasons"]:
+                self.quality_reasons[reason] = self.quality_reasons.get(reason, 0) + 1
+        if result.get("rejected"):
+            return
+        if not result.get("face_detected"):
+            self.stats["no_face"] += 1
+            return
+        self.results.append((int(result["score"]), result.get("quality_weight", 1.0)))
+        self.latest = result
+
+    def pace(self, load: float) -> dict | None:
+        """
+        Capture target for the client at this pool load (see pacing.py) when it
+        differs from the last one sent and PACE_MIN_INTERVAL has passed, else None.
+        """
+        stages = self.stage_latencies()
+        frame_ms = (stages.get("total_ms") or 0) + (stages.get("decode_ms") or 0)
+        target = target_for(load, frame_ms or None, self.signals.analysed_fps())
+        now = time.monotonic()
+        if target == self.target or (self.target is not None and now - self._pace_sent_at < PACE_MIN_INTERVAL):
+            return None
+        if self.target is not None:
+            self.stats["pace_changes"] += 1
+        self.target, self._pace_sent_at = target, now
+        return target
+
+    # ── Summary ───────────────────────────────────────────────────────────
+
+    def summary(self) -> dict:
+        """Fields of a /score submission built from the analysed frames."""
+        out = {
+            "patient_id": self.patient_id,
+            "followup_id": self.followup_id,
+            "frame_scores": [score for score, _ in self.results],
+            "frame_weights": [weight for _, weight in self.results],
+        }
+        if self.latest:
+            latest = self.latest
+            for key in ("resp_rate", "heart_rate", "cry_intensity", "agitation_score",
+                        "risk_level", "modalities_used"):
+                if latest.get(key) is not None:
+                    out[key] = latest[key]
+        return out
+
+    def info(self) -> dict:
+        return {
+            "session_id": self.id,
+            "patient_id": self.patient_id,
+            "followup_id": self.followup_id,
+            "duration_s": round(time.time() - self.started_at, 1),
+            **self.stats,
+            "quality_reasons": self.quality_reasons,
+            "target": self.target,
+            "tracking": self.tracker.summary(),
+            "stage_ms": self.stage_latencies(),
+        }
+
+    def stage_latencies(self) -> dict:
+        """Mean milliseconds per pipeline stage over the analysed frames."""
+        return {stage: round(total / n, 2) for stage, (total, n) in self._stage_ms.items() if n}
+
+
+class SessionStore:
+    def __init__(self):
+        self.sessions: dict[str, ScanSession] = {}
+        self.completed = 0
+
+    def create(self, patient_id: str | None, followup_id: str | None, sample_rate: int) -> ScanSession:
+        if len(self.sessions) >= MAX_SESSIONS:
+            raise RuntimeError("Too many concurrent PainScan sessions")
+        session = ScanSession(patient_id, followup_id, parse_sample_rate(sample_rate))
+        self.sessions[session.id] = session
+        return session
+
+    def close(self, session_id: str) -> None:
+        if self.sessions.pop(session_id, None) is not None:
+            self.completed += 1
+
+    def summary(self) -> dict:
+        return {
+            "active": len(self.sessions),
+            "completed": self.completed,
+            "sessions": [s.info() for s in self.sessions.values()],
+        }
+
+
+sessions = SessionStore()
@@ -0,0 +1,82 @@
+"""
+module3_painscan/tracking.py
+Face tracking for PainScan sessions, so the SSD detector runs only now and then.
+
+A child in front of the camera barely moves between frames, so the landmark
+box of the previous frame (widened by TRACK_MARGIN) is a good region to run the
+landmarker on directly. The tracker hands that ROI to the inference worker,
+which skips detection when the landmarks fit well inside it. A full detection
+runs when there is no ROI yet, every REDETECT_EVERY frames, after a failed fit,
+or when the box leaves the plausible range (too small, or jumped in size).
+State lives in the API process (one tracker per session); workers stay stateless.
+"""
+from __future__ import annotations
+import os
+
+REDETECT_EVERY = int(os.getenv("PAINSCAN_REDETECT_EVERY", "10"))
+# ROI = landmark box widened by this share of its size on every side
+TRACK_MARGIN = 0.3
+# Landmark box side below this share of the frame side is too small to track
+MIN_FACE_FRACTION = 0.08
+# Box area changing by more than this factor between frames means a bad fit
+MAX_SCALE_CHANGE = 1.8
+
+
+class FaceTracker:
+    def __init__(self, redetect_every: int = REDETECT_EVERY):
+        self.redetect_every = max(1, redetect_every)
+        self.box: tuple | None = None
+        self.shape: tuple | None = None
+        self.since_detect = 0
+        self.stats = {"frames": 0, "tracked": 0, "detected": 0, "track_lost": 0, "out_of_range": 0}
+
+    def roi(self, shape: tuple) -> tuple | None:
+        """Region to run the landmarker on for a frame of this shape, or None for a full detection."""
+        if self.box is None or shape[:2] != self.shape or self.since_detect >= self.redetect_every:
+            return None
+        h, w = shape[:2]
+        x0, y0, x1, y1 = self.box
+        mx, my = int((x1 - x0) * TRACK_MARGIN), int((y1 - y0) * TRACK_MARGIN)
+        return (max(0, x0 - mx), max(0, y0 - my), min(w, x1 + mx), min(h, y1 + my))
+
+    def update(self, shape: tuple, roi: tuple | None, result: dict) -> None:
+        """Record the worker result for a frame analysed with roi (None = full detection requested)."""
+        self.stats["frames"] += 1
+        if result.get("tracked"):
+            self.stats["tracked"] += 1
+            self.since_detect += 1
+        else:
+            self.stats["detected"] += 1
+            self.since_detect = 0
+            if roi is not None:
+                self.stats["track_lost"] += 1
+
+        box = result.get("landmark_box")
+        if box is not None and not self._in_range(shape, box, bool(result.get("tracked"))):
+            self.stats["out_of_range"] += 1
+            box = None
+        self.box, self.shape = box, shape[:2]
+
+    def _in_range(self, shape: tuple, box: tuple, tracked: bool) -> bool:
+        h, w = shape[:2]
+        x0, y0, x1, y1 = box
+        bw, bh = x1 - x0, y1 - y0
+        if bw < MIN_FACE_FRACTION * w or bh < MIN_FACE_FRACTION * h:
+            return False
+        if tracked and self.box is not None:
+            px0, py0, px1, py1 = self.box
+            prev_area = max(1, (px1 - px0) * (py1 - py0))
+            change = (bw * bh) / prev_area
+            if change > MAX_SCALE_CHANGE or change < 1 / MAX_SCALE_CHANGE:
+                return False
+        return True
+
+    def reset(self) -> None:
+        self.box, self.shape, self.since_detect = None, None, 0
+
+    def summary(self) -> dict:
+        frames = self.stats["frames"]
+        return {
+            **self.stats,
+            "skip_ratio": round(self.stats["tracked"] / frames, 3) if frames else 0.0,
+        }
@@ -3,6 +3,7 @@ module5_orchestrator/decision_engine.py
 Routes classified intent to the appropriate module action via Redis events or direct action.
 """
 import os
+import time
 from datetime import datetime, timezone
 from shared.database import db
 from shared.events import publish
@@ -107,6 +108,7 @@ async def execute_decision(patient_id: str, intent: str, patient: dict,
             "message": message,
             "severity": "CRITICAL",
             "source": "orchestrator",
+            "ts": time.time(),
         })
         # Immediate WhatsApp back to patient
         if phone:
@@ -7,6 +7,8 @@ import os
 import re
 import google.generativeai as genai
 
+from module2_recoverbot.services.gemini_service import format_history
+
 genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
 _model = genai.GenerativeModel("gemini-2.5-flash")
 
@@ -29,17 +31,16 @@ async def classify_intent(
     recent_history: list[dict] | None = None,
     is_pediatric: bool = False,
     age: int = 0,
+    conversation_summary: str | None = None,
+    summary_through=None,
 ) -> dict:
     """
     Classify the intent of a patient WhatsApp message.
+    recent_history / conversation_summary / summary_through come from the active
+    followup (RecoverBot's rolling summary + its last turns).
     Returns: { intent, confidence, reasoning, suggested_module }
     """
-    history_text = ""
-    if recent_history:
-        history_text = "\n".join(
-            f"[{m.get('role','?').upper()}]: {m.get('message','')}"
-            for m in recent_history[-4:]
-        )
+    history_text = format_history(recent_history, conversation_summary, recent=4, summary_through=summary_through)
 
     intent_list = "\n".join(
         f"- {k}: {v}" for k, v in INTENT_DESCRIPTIONS.items()
@@ -60,7 +61,7 @@ Patient: {patient_name}, Age: {age}
 Diagnosis: {diagnosis}
 {pediatric_note}
 
-{"Recent conversation:" + chr(10) + history_text if history_text else ""}
+{"Conversation context:" + chr(10) + history_text if history_text else ""}
 
 New message: "{message}"
 
@@ -11,6 +11,7 @@ from datetime import datetime
 from shared.database import db
 from shared.models import APIResponse
 from module5_orchestrator.intent_classifier import classify_intent, INTENT_TO_MODULE
+from module2_recoverbot.services.conversation_memory import context_projection
 from module5_orchestrator.decision_engine import store_decision, execute_decision
 
 router = APIRouter()
@@ -51,10 +52,7 @@ async def analyze_message(req: AnalyzeMessageRequest):
         raise HTTPException(status_code=404, detail="Patient not found")
 
     # Get recent conversation history from followups
-    followup = await db.followups.find_one({"patient_id": req.patient_id})
-    recent_history = []
-    if followup:
-        recent_history = followup.get("conversation_log", [])[-4:]
+    followup = await db.followups.find_one({"patient_id": req.patient_id}, context_projection(recent=4)) or {}
 
     diagnosis = ""
     consult = await db.consultations.find_one({"patient_id": req.patient_id})
@@ -66,9 +64,11 @@ async def analyze_message(req: AnalyzeMessageRequest):
         message=req.message,
         patient_name=patient.get("name", "Patient"),
         diagnosis=diagnosis or ", ".join(patient.get("chronic_conditions", [])) or "general health",
-        recent_history=recent_history,
+        recent_history=followup.get("conversation_log", []),
         is_pediatric=patient.get("is_pediatric", False),
         age=patient.get("age", 0),
+        conversation_summary=followup.get("conversation_summary"),
+        summary_through=followup.get("summary_through"),
     )
 
     intent = classification["intent"]
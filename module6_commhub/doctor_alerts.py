@@ -0,0 +1,322 @@
+"""
+module6_commhub/doctor_alerts.py
+Doctor notifications: consumes doctor.alert and followup.flagged, dedupes and
+digests them per doctor, and delivers through the dashboard gateway + WhatsApp.
+
+Each alert is resolved to a doctor (event doctor_id → primary doctor_patient_map
+entry → doctor of the latest consultation) and then:
+  - deduped: the same (doctor, patient, source, severity) inside its dedupe
+    window is suppressed. Claim and window keys are Redis SET NX, so only one
+    worker acts on an event every worker receives and windows hold across workers.
+  - CRITICAL alerts are delivered immediately (dashboard topic
+    `commhub.emergency` + WhatsApp to the doctor).
+  - everything else is appended to the doctor's digest list in Redis; the first
+    item opens a DIGEST_WINDOW and the flush job sends the whole list as one
+    `commhub.doctor_digest` push and one WhatsApp message when it closes. A
+    digest whose delivery fails is pushed back onto the list and retried.
+Every delivery is stored in `doctor_notifications` with its latency (first
+event → sent) and how many alerts it absorbed; received/deduped/digested
+counters live in a per-day Redis hash shared by all workers.
+"""
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from shared.database import db
+from shared.events import get_redis, subscribe
+from shared.realtime import gateway
+from module6_commhub.gateway import send_whatsapp
+from module6_commhub.message_templates import doctor_alert_digest, doctor_critical_alert
+
+DEDUPE_WINDOW_SECONDS = int(os.getenv("DOCTOR_ALERT_DEDUPE_SECONDS", "1800"))
+CRITICAL_DEDUPE_WINDOW_SECONDS = int(os.getenv("DOCTOR_ALERT_CRITICAL_DEDUPE_SECONDS", "300"))
+DIGEST_WINDOW_SECONDS = int(os.getenv("DOCTOR_ALERT_DIGEST_SECONDS", "900"))
+DIGEST_FLUSH_INTERVAL_SECONDS = int(os.getenv("DOCTOR_ALERT_FLUSH_INTERVAL_SECONDS", "15"))
+DIGEST_MAX_ITEMS = int(os.getenv("DOCTOR_ALERT_DIGEST_MAX_ITEMS", "50"))
+# A digest whose delivery raised is put back and retried after this long, up to DIGEST_MAX_ATTEMPTS times
+DIGEST_RETRY_SECONDS = int(os.getenv("DOCTOR_ALERT_DIGEST_RETRY_SECONDS", "60"))
+DIGEST_MAX_ATTEMPTS = int(os.getenv("DOCTOR_ALERT_DIGEST_MAX_ATTEMPTS", "5"))
+CLAIM_TTL_SECONDS = 120
+
+_KEY = "doctor_alerts"
+_DUE_KEY = f"{_KEY}:due"            # zset doctor_id -> window close (epoch seconds)
+_UNASSIGNED = "unassigned"          # alerts with no resolvable doctor still reach the dashboard
+
+_indexes_ready = False
+
+
+def _digest_key(doctor_id: str) -> str:
+    return f"{_KEY}:digest:{doctor_id}"
+
+
+def _stats_key(day: str | None = None) -> str:
+    return f"{_KEY}:stats:{day or datetime.utcnow().strftime('%Y-%m-%d')}"
+
+
+async def _count(r, **fields: int) -> None:
+    key = _stats_key()
+    pipe = r.pipeline()
+    for field, n in fields.items():
+        pipe.hincrby(key, field, n)
+    pipe.expire(key, 86400 * 30)
+    await pipe.execute()
+
+
+async def ensure_indexes() -> None:
+    global _indexes_ready
+    if not _indexes_ready:
+        await db.doctor_notifications.create_index([("doctor_id", ASCENDING), ("sent_at", DESCENDING)])
+        await db.doctor_notifications.create_index([("sent_at", ASCENDING)])
+        _indexes_ready = True
+
+
+# ── Normalisation ─────────────────────────────────────────────────────────────
+
+def normalise(channel: str, event: dict) -> dict:
+    """Bring both event shapes into one alert record."""
+    if channel == "doctor.alert":
+        severity = (event.get("severity") or "CRITICAL").upper()
+        text = event.get("message") or ""
+    else:
+        severity = (event.get("risk_label") or "HIGH").upper()
+        text = event.get("suggested_action") or f"Follow-up flagged {severity} risk"
+    return {
+        "patient_id": event.get("patient_id"),
+        "patient_name": event.get("patient_name"),
+        "doctor_id": event.get("doctor_id"),
+        "followup_id": event.get("followup_id"),
+        "source": event.get("source") or ("orchestrator" if channel == "doctor.alert" else "recoverbot"),
+        "channel": channel,
+        "severity": severity,
+        "risk_score": event.get("risk_score"),
+        "message": text[:300],
+        "ts": float(event.get("ts") or time.time()),
+    }
+
+
+async def _resolve_doctor(patient_id: str) -> str | None:
+    mapping = await db.doctor_patient_map.find_one(
+        {"patient_id": patient_id, "relationship_status": "active"},
+        {"doctor_id": 1}, sort=[("primary_doctor", DESCENDING), ("created_at", DESCENDING)],
+    )
+    if mapping and mapping.get("doctor_id"):
+        return str(mapping["doctor_id"])
+    consult = await db.consultations.find_one(
+        {"patient_id": patient_id, "doctor_id": {"$ne": None}},
+        {"doctor_id": 1}, sort=[("created_at", DESCENDING)],
+    )
+    return str(consult["doctor_id"]) if consult and consult.get("doctor_id") else None
+
+
+async def _get_doctor(doctor_id: str) -> dict | None:
+    try:
+        return await db.doctors.find_one({"_id": ObjectId(doctor_id)}, {"name": 1, "phone": 1, "whatsapp_number": 1})
+    except Exception:
+        return await db.doctors.find_one({"_id": doctor_id}, {"name": 1, "phone": 1, "whatsapp_number": 1})
+
+
+async def _patient_name(patient_id: str) -> str:
+    try:
+        p = await db.patients.find_one({"_id": ObjectId(patient_id)}, {"name": 1})
+    except Exception:
+        p = None
+    return (p or {}).get("name", "Patient")
+
+
+# ── Intake ────────────────────────────────────────────────────────────────────
+
+async def handle_alert(channel: str, event: dict) -> str:
+    """
+    Route one incoming event. Returns 'critical' | 'digested' | 'deduped' | 'ignored'.
+    Every worker calls this for every event; only the one that claims it goes on.
+    """
+    alert = normalise(channel, event)
+    if not alert["patient_id"]:
+        return "ignored"
+    r = await get_redis()
+    # Pub/sub hands the same event to every worker; exactly one claims it
+    digest = hashlib.sha1(json.dumps(event, sort_keys=True, default=str).encode()).hexdigest()
+    if not await r.set(f"{_KEY}:claim:{channel}:{digest}", 1, nx=True, ex=CLAIM_TTL_SECONDS):
+        return "ignored"
+    critical = alert["severity"] == "CRITICAL"
+
+    doctor_id = alert["doctor_id"] or await _resolve_doctor(alert["patient_id"]) or _UNASSIGNED
+    alert["doctor_id"] = doctor_id
+    window = CRITICAL_DEDUPE_WINDOW_SECONDS if critical else DEDUPE_WINDOW_SECONDS
+    dedupe_key = f"{_KEY}:seen:{doctor_id}:{alert['patient_id']}:{alert['source']}:{alert['severity']}"
+    if not await r.set(dedupe_key, alert["ts"], nx=True, ex=window):
+        await _count(r, received=1, deduped=1)
+        return "deduped"
+
+    if not alert["patient_name"]:
+        alert["patient_name"] = await _patient_name(alert["patient_id"])
+
+    if critical:
+        await _count(r, received=1, critical=1)
+        await deliver([alert], doctor_id, kind="critical")
+        return "critical"
+
+    pipe = r.pipeline()
+    pipe.rpush(_digest_key(doctor_id), json.dumps(alert, default=str))
+    pipe.zadd(_DUE_KEY, {doctor_id: time.time() + DIGEST_WINDOW_SECONDS}, nx=True)
+    await pipe.execute()
+    await _count(r, received=1, digested=1)
+    return "digested"
+
+
+async def _listen(channel: str) -> None:
+    async for event in subscribe(channel):
+        try:
+            await handle_alert(channel, event)
+        except Exception as e:
+            print(f"[doctor_alerts] {channel} error: {e}")
+
+
+# ── Digest flush ──────────────────────────────────────────────────────────────
+
+async def flush_due_digests() -> int:
+    """Send every digest whose window has closed. Safe to run on every worker."""
+    r = await get_redis()
+    due = await r.zrangebyscore(_DUE_KEY, 0, time.time())
+    sent = 0
+    for raw_id in due:
+        doctor_id = raw_id.decode() if isinstance(raw_id, bytes) else raw_id
+        if not await r.zrem(_DUE_KEY, doctor_id):
+            continue  # another worker claimed it
+        pipe = r.pipeline()
+        pipe.lrange(_digest_key(doctor_id), 0, -1)
+        pipe.delete(_digest_key(doctor_id))
+        items, _ = await pipe.execute()
+        if not items:
+            continue
+        alerts = [json.loads(i) for i in items]
+        try:
+            await deliver(alerts, doctor_id, kind="digest")
+            sent += 1
+        except Exception as e:
+            await _requeue_digest(r, doctor_id, alerts, e)
+    return sent
+
+
+async def _requeue_digest(r, doctor_id: str, alerts: list[dict], error: Exception) -> None:
+    """Put a failed digest back in front of anything queued since and retry it after DIGEST_RETRY_SECONDS."""
+    for a in alerts:
+        a["attempts"] = a.get("attempts", 0) + 1
+    keep = [a for a in alerts if a["attempts"] < DIGEST_MAX_ATTEMPTS]
+    dropped = len(alerts) - len(keep)
+    print(f"[doctor_alerts] Digest for {doctor_id} failed ({error}); "
+          f"retrying {len(keep)} alert(s) in {DIGEST_RETRY_SECONDS}s, dropped {dropped}")
+    if dropped:
+        await _count(r, digest_dropped=dropped)
+    if not keep:
+        return
+    pipe = r.pipeline()
+    pipe.lpush(_digest_key(doctor_id), *[json.dumps(a, default=str) for a in reversed(keep)])
+    pipe.zadd(_DUE_KEY, {doctor_id: time.time() + DIGEST_RETRY_SECONDS})
+    await pipe.execute()
+
+
+# ── Delivery ──────────────────────────────────────────────────────────────────
+
+async def deliver(alerts: list[dict], doctor_id: str, kind: str) -> dict:
+    """Push to the doctor's dashboards and WhatsApp, then record the notification."""
+    first_ts = min(a["ts"] for a in alerts)
+    assigned = doctor_id != _UNASSIGNED
+    doctor = await _get_doctor(doctor_id) if assigned else None
+
+    if kind == "critical":
+        a = alerts[0]
+        topic = "commhub.emergency"
+        payload = {"type": "DOCTOR_ALERT", "data": a}
+        text = doctor_critical_alert(a["patient_name"], a["severity"], a["message"], a["source"])
+    else:
+        # One line per patient, worst severity first, newest first within it
+        alerts = sorted(alerts, key=lambda a: (a["severity"] != "CRITICAL", a["severity"] != "HIGH", -a["ts"]))
+        topic = "commhub.doctor_digest"
+        payload = {"type": "DOCTOR_DIGEST", "data": {"count": len(alerts), "alerts": alerts[:DIGEST_MAX_ITEMS]}}
+        text = doctor_alert_digest(alerts[:DIGEST_MAX_ITEMS], len(alerts))
+
+    await gateway.publish(topic, payload, doctor_id=doctor_id if assigned else None)
+    phone = (doctor or {}).get("whatsapp_number") or (doctor or {}).get("phone")
+    whatsapp_ok = await asyncio.to_thread(send_whatsapp, phone, text) if phone else False
+
+    sent_at = time.time()
+    record = {
+        "doctor_id": doctor_id,
+        "kind": kind,
+        "alerts": len(alerts),
+        "patient_ids": sorted({a["patient_id"] for a in alerts}),
+        "max_severity": "CRITICAL" if any(a["severity"] == "CRITICAL" for a in alerts) else alerts[0]["severity"],
+        "whatsapp": whatsapp_ok,
+        "latency_ms": round((sent_at - first_ts) * 1000, 1),
+        "sent_at": datetime.utcfromtimestamp(sent_at),
+    }
+    await ensure_indexes()
+    await db.doctor_notifications.insert_one(dict(record))
+    await _count(await get_redis(), **{f"sent_{kind}": 1, "whatsapp_sent": int(whatsapp_ok),
+                                       "whatsapp_failed": int(bool(phone) and not whatsapp_ok)})
+    print(f"[doctor_alerts] {kind} → {doctor_id}: {len(alerts)} alert(s), "
+          f"{record['latency_ms']:.0f} ms, whatsapp={'ok' if whatsapp_ok else 'no'}")
+    return record
+
+
+# ── Stats ─────────────────────────────────────────────────────────────────────
+
+def _percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def alert_stats(days: int = 1) -> dict:
+    """Intake counters, suppression ratio and delivery latency per notification kind."""
+    r = await get_redis()
+    today = datetime.utcnow().date()
+    counters: dict[str, int] = {}
+    for d in range(days):
+        raw = await r.hgetall(_stats_key((today - timedelta(days=d)).isoformat()))
+        for k, v in raw.items():
+            k = k.decode() if isinstance(k, bytes) else k
+            counters[k] = counters.get(k, 0) + int(v)
+
+    since = datetime.utcnow() - timedelta(days=days)
+    latencies: dict[str, list[float]] = {}
+    async for n in db.doctor_notifications.find({"sent_at": {"$gte": since}}, {"kind": 1, "latency_ms": 1}):
+        latencies.setdefault(n["kind"], []).append(n["latency_ms"])
+    delivery = {}
+    for kind, values in latencies.items():
+        values.sort()
+        delivery[kind] = {"sent": len(values), "p50_ms": _percentile(values, 0.5),
+                          "p95_ms": _percentile(values, 0.95), "max_ms": values[-1]}
+
+    received = counters.get("received", 0)
+    notifications = counters.get("sent_critical", 0) + counters.get("sent_digest", 0)
+    return {
+        "days": days,
+        "counters": counters,
+        "notifications": notifications,
+        # Alerts that did not get a notification of their own (deduped or folded into a digest)
+        "suppressed": max(0, received - notifications),
+        "suppression_ratio": round(1 - notifications / received, 3) if received else None,
+        "delivery": delivery,
+        "pending_digests": await r.zcard(_DUE_KEY),
+    }
+
+
+# ── Startup ───────────────────────────────────────────────────────────────────
+
+async def start_doctor_alerts(scheduler) -> None:
+    """Subscribe to both alert channels and register the digest flush on the CommHub scheduler."""
+    asyncio.create_task(_listen("doctor.alert"))
+    asyncio.create_task(_listen("followup.flagged"))
+    scheduler.add_job(flush_due_digests, "interval", seconds=DIGEST_FLUSH_INTERVAL_SECONDS,
+                      id="doctor_digest_flush", max_instances=1, coalesce=True)
+    print(f"[doctor_alerts] Listening; digest window {DIGEST_WINDOW_SECONDS}s, "
+          f"dedupe {DEDUPE_WINDOW_SECONDS}s (critical {CRITICAL_DEDUPE_WINDOW_SECONDS}s)")
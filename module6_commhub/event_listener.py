@@ -12,6 +12,7 @@ from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from shared.database import db
 from shared.events import subscribe, publish
 from module6_commhub.gateway import send_whatsapp
+from module6_commhub.doctor_alerts import start_doctor_alerts
 import google.generativeai as genai
 from module6_commhub.message_templates import (
     welcome_new_patient,
@@ -276,5 +277,6 @@ async def start_listeners():
 
     scheduler = AsyncIOScheduler()
     scheduler.add_job(check_unresponsive_patients, "interval", hours=6, id="unresponsive_check")
+    await start_doctor_alerts(scheduler)
     scheduler.start()
-    print("[CommHub] ✅ 8 event listeners + unresponsive scheduler active")
+    print("[CommHub] ✅ 8 event listeners + doctor alerts + unresponsive/digest scheduler active")
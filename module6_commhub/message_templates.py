@@ -72,3 +72,22 @@ def caregap_outreach(name: str, gap_type: str, custom_msg: str = "") -> str:
 
 def manual_message(body: str) -> str:
     return f"💬 *MediLoop Care Team*\n\n{body}"
+
+
+def doctor_critical_alert(patient_name: str, severity: str, message: str, source: str) -> str:
+    return (
+        f"🚨 *MediLoop {severity} — {patient_name}*\n\n"
+        f"{message or 'Patient needs immediate attention.'}\n\n"
+        f"Source: {source}. Please review the patient in the Control Center now."
+    )
+
+
+def doctor_alert_digest(alerts: list[dict], total: int) -> str:
+    lines = [f"• *{a.get('patient_name', 'Patient')}* — {a['severity']}: {a.get('message', '')[:120]}"
+             for a in alerts]
+    more = f"\n…and {total - len(alerts)} more" if total > len(alerts) else ""
+    return (
+        f"📋 *MediLoop Alert Digest* — {total} alert{'s' if total != 1 else ''}\n\n"
+        + "\n".join(lines) + more
+        + "\n\nOpen the Control Center for details."
+    )
@@ -191,6 +191,25 @@ async def dismiss_appointment(appt_id: str):
     return APIResponse(success=result.modified_count > 0, data=None, message="Dismissed" if result.modified_count else "Not found")
 
 
+# ── Doctor Notification Endpoints ────────────────────────────────────────────
+
+@router.get("/doctor-alerts", response_model=APIResponse)
+async def get_doctor_notifications(doctor_id: Optional[str] = None, limit: int = 50):
+    """Recent doctor notifications (critical alerts and digests)."""
+    query = {"doctor_id": doctor_id} if doctor_id else {}
+    docs = await db.doctor_notifications.find(query).sort("sent_at", -1).limit(limit).to_list(length=limit)
+    for d in docs:
+        d["_id"] = str(d["_id"])
+    return APIResponse(success=True, data=docs, message=f"{len(docs)} notifications")
+
+
+@router.get("/doctor-alerts/stats", response_model=APIResponse)
+async def get_doctor_alert_stats(days: int = 1):
+    """Alerts received, deduped and digested, suppression ratio and delivery latency (p50/p95)."""
+    from module6_commhub.doctor_alerts import alert_stats
+    return APIResponse(success=True, data=await alert_stats(days))
+
+
 # ── Unified Twilio Webhook ────────────────────────────────────────────────────
 # Configure your Twilio number/sandbox webhook to:
 #   POST https://<your-backend-host>/api/commhub/webhook/twilio
@@ -211,6 +230,8 @@ async def twilio_inbound(
     import google.generativeai as genai
     from module5_orchestrator.intent_classifier import classify_intent, INTENT_TO_MODULE
     from module5_orchestrator.decision_engine import store_decision, execute_decision
+    from module2_recoverbot.services import conversation_memory
+    from module2_recoverbot.services.gemini_service import format_history
 
     phone_raw = From.replace("whatsapp:", "").strip()
     message   = Body.strip()
@@ -247,8 +268,12 @@ async def twilio_inbound(
 
     # ── 3. Classify intent ────────────────────────────────────────────────────
     try:
-        followup    = await db.followups.find_one({"patient_id": patient_id, "status": "active"})
-        recent_hist = (followup or {}).get("conversation_log", [])[-4:]
+        followup    = await db.followups.find_one(
+            {"patient_id": patient_id, "status": "active"}, conversation_memory.context_projection(recent=4),
+        )
+        recent_hist = (followup or {}).get("conversation_log", [])
+        summary     = (followup or {}).get("conversation_summary")
+        summary_through = (followup or {}).get("summary_through")
         consult     = await db.consultations.find_one({"patient_id": patient_id}, sort=[("created_at", -1)])
         diagnosis   = (
             (consult or {}).get("diagnosis") or
@@ -263,6 +288,8 @@ async def twilio_inbound(
             recent_history=recent_hist,
             is_pediatric=patient.get("is_pediatric", False),
             age=patient.get("age", 0),
+            conversation_summary=summary,
+            summary_through=summary_through,
         )
         intent     = classification.get("intent", "GENERAL_QUERY")
         confidence = classification.get("confidence", 0.0)
@@ -334,10 +361,7 @@ async def twilio_inbound(
         if generate_gemini:
             genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
             model = genai.GenerativeModel("gemini-2.5-flash")
-            hist_text = "\n".join(
-                f"{h.get('role', '?').upper()}: {h.get('message', '')}"
-                for h in recent_hist
-            )
+            hist_text = format_history(recent_hist, summary, recent=4, summary_through=summary_through)
             # Incorporate recent consultation context
             consult_context = ""
             if consult and "soap_note" in consult:
@@ -352,7 +376,7 @@ async def twilio_inbound(
                 + (f", condition: {diagnosis}" if diagnosis and diagnosis != "general health" else "")
                 + ".\n"
                 + consult_context
-                + (f"\nRecent chat:\n{hist_text}\n" if hist_text else "")
+                + (f"\nConversation so far:\n{hist_text}\n" if hist_text else "")
                 + f"\nPatient says: {message}\n\n"
                 "Reply warmly and empathetically in 1-2 clear sentences. "
                 "Since they are expressing a concern, explicitly ask them how their recovery is going regarding their recent consultation, or ask them to rate any pain from 0-10. "
@@ -367,14 +391,18 @@ async def twilio_inbound(
         print(f"[CommHub] Reply to {patient_name}: {reply[:80]}")
 
         # Mirror into RecoverBot conversation log if followup is active
+        # (RecoverBot stores naive UTC timestamps, like datetime.utcnow() everywhere in that module)
         if followup:
+            turn_at = datetime.utcnow()
+            turns = [
+                {"timestamp": turn_at, "role": "patient", "message": message},
+                {"timestamp": turn_at, "role": "bot",     "message": reply},
+            ]
             await db.followups.update_one(
                 {"_id": followup["_id"]},
-                {"$push": {"conversation_log": {"$each": [
-                    {"timestamp": now, "role": "patient", "message": message},
-                    {"timestamp": now, "role": "bot",     "message": reply},
-                ]}}},
+                {"$push": {"conversation_log": {"$each": turns}}},
             )
+            conversation_memory.maybe_schedule_update(followup["_id"], recent_hist + turns, summary_through)
 
     except Exception as exc:
         print(f"[CommHub Webhook] Error: {exc}")
@@ -106,7 +106,8 @@ class ConversationEntry(BaseModel):
 class CheckinSlot(BaseModel):
     scheduled_at: datetime
     completed_at: Optional[datetime] = None
-    status: str = "pending"   # 'pending' | 'completed' | 'missed'
+    status: str = "pending"   # 'pending' | 'completed' | 'missed' | 'cancelled'
+    offset_hours: Optional[float] = None
 
 
 class FollowupOut(MongoBaseModel):
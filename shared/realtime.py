@@ -0,0 +1,336 @@
+"""
+shared/realtime.py
+Realtime gateway: one multiplexed WebSocket per dashboard, fan-out across workers.
+
+Clients connect to /api/realtime/ws?topics=recoverbot.*,painscan.scored&doctor_id=...
+and can change subscriptions on the fly:
+    {"action": "subscribe" | "unsubscribe", "topics": [...]}   {"action": "ping"}
+(`topics` must be a list of strings; anything else gets a {"type": "error"} frame).
+Topics are dotted names; a pattern is an exact topic, "prefix.*" or "*".
+Messages carrying a doctor_id only reach connections of that doctor (or
+connections with no doctor scope, e.g. the admin overview).
+
+Publishing (`await gateway.publish(topic, message, ...)`) never waits on a
+socket: the message is serialised once, appended to each matching
+connection's bounded queue, and every connection drains its own queue in its
+own sender task. A full queue drops its oldest entry; messages with a
+coalesce_key replace the queued message with the same key instead of queueing
+another. A client that stays behind (send timeouts, sustained drops) is
+disconnected and counted as a slow consumer. Publishes go to the local
+connections immediately and to the other workers over the Redis channel
+`realtime.fanout`; a few existing domain events are bridged in as topics.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from itertools import count
+from typing import Optional
+
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from jose import JWTError, jwt
+
+from shared.auth import ALGORITHM, JWT_SECRET, get_current_user
+from shared.events import publish as publish_event, subscribe
+from shared.models import APIResponse
+
+FANOUT_CHANNEL = "realtime.fanout"
+SEND_QUEUE_MAX = int(os.getenv("REALTIME_SEND_QUEUE_MAX", "256"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("REALTIME_SEND_TIMEOUT_SECONDS", "5"))
+# Disconnect a client once it has dropped this many messages in a row without catching up
+SLOW_CONSUMER_DROPS = int(os.getenv("REALTIME_SLOW_CONSUMER_DROPS", "1000"))
+
+# Domain events re-emitted as dashboard topics on every worker
+BRIDGED_EVENTS = {
+    "consultation.completed": "scribe.consultation_completed",
+    "pain.multimodal_scored": "painscan.scored",
+    "respiratory.distress.detected": "painscan.respiratory_distress",
+    "silent_distress.detected": "painscan.silent_distress",
+    "appointment.requested": "commhub.appointment_requested",
+}
+
+_worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_conn_ids = count(1)
+
+router = APIRouter()
+
+
+def topic_matches(patterns: set[str], topic: str) -> bool:
+    if "*" in patterns or topic in patterns:
+        return True
+    return any(p.endswith(".*") and topic.startswith(p[:-1]) for p in patterns)
+
+
+class Connection:
+    """One dashboard socket with its subscriptions and bounded send queue."""
+
+    def __init__(self, ws: WebSocket, topics: set[str], doctor_id: str | None):
+        self.id = next(_conn_ids)
+        self.ws = ws
+        self.topics = topics
+        self.doctor_id = doctor_id
+        self.queue: OrderedDict = OrderedDict()   # key -> serialised message
+        self._seq = count()
+        self._wakeup = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.drop_streak = 0
+        self.connected_at = time.time()
+
+    def wants(self, topic: str, doctor_id: str | None) -> bool:
+        if doctor_id and self.doctor_id and doctor_id != self.doctor_id:
+            return False
+        return topic_matches(self.topics, topic)
+
+    def enqueue(self, text: str, coalesce_key: str | None) -> str:
+        """Returns 'queued' | 'coalesced' | 'dropped' (oldest evicted to make room)."""
+        if coalesce_key is not None and coalesce_key in self.queue:
+            self.queue[coalesce_key] = text
+            self.coalesced += 1
+            return "coalesced"
+        outcome = "queued"
+        if len(self.queue) >= SEND_QUEUE_MAX:
+            self.queue.popitem(last=False)
+            self.dropped += 1
+            self.drop_streak += 1
+            outcome = "dropped"
+        self.queue[coalesce_key if coalesce_key is not None else next(self._seq)] = text
+        self._wakeup.set()
+        return outcome
+
+    async def sender(self) -> None:
+        while not self.closed:
+            if not self.queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            _, text = self.queue.popitem(last=False)
+            try:
+                await asyncio.wait_for(self.ws.send_text(text), SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                gateway.stats["slow_disconnects"] += 1
+                await self.close(code=1013)
+                return
+            except Exception:
+                await self.close()
+                return
+            self.sent += 1
+            self.drop_streak = 0
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        self._wakeup.set()
+        try:
+            await self.ws.close(code=code)
+        except Exception:
+            pass
+
+    def info(self) -> dict:
+        return {
+            "id": self.id,
+            "doctor_id": self.doctor_id,
+            "topics": sorted(self.topics),
+            "queued": len(self.queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "connected_for_s": round(time.time() - self.connected_at, 1),
+        }
+
+
+class RealtimeGateway:
+    def __init__(self):
+        self.connections: dict[int, Connection] = {}
+        self.stats = {
+            "published": 0,
+            "delivered": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "slow_disconnects": 0,
+            "fanout_out": 0,
+            "fanout_in": 0,
+            "fanout_errors": 0,
+        }
+
+    async def connect(self, ws: WebSocket, topics: set[str], doctor_id: str | None) -> Connection:
+        await ws.accept()
+        conn = Connection(ws, topics, doctor_id)
+        self.connections[conn.id] = conn
+        return conn
+
+    def disconnect(self, conn: Connection) -> None:
+        self.connections.pop(conn.id, None)
+
+    def deliver_local(self, topic: str, text: str, doctor_id: str | None, coalesce_key: str | None) -> int:
+        """Enqueue on every matching local connection. Never awaits a socket."""
+        delivered = 0
+        slow = []
+        for conn in list(self.connections.values()):
+            if conn.closed or not conn.wants(topic, doctor_id):
+                continue
+            outcome = conn.enqueue(text, coalesce_key)
+            delivered += 1
+            if outcome == "dropped":
+                self.stats["dropped"] += 1
+                if conn.drop_streak >= SLOW_CONSUMER_DROPS:
+                    slow.append(conn)
+            elif outcome == "coalesced":
+                self.stats["coalesced"] += 1
+        for conn in slow:
+            self.stats["slow_disconnects"] += 1
+            asyncio.create_task(conn.close(code=1013))
+        self.stats["delivered"] += delivered
+        return delivered
+
+    async def publish(
+        self,
+        topic: str,
+        message: dict,
+        doctor_id: str | None = None,
+        coalesce_key: str | None = None,
+        local_only: bool = False,
+    ) -> int:
+        """
+        Push a message to every subscribed dashboard on every worker.
+        `message` is sent as-is with "topic" filled in. Returns local deliveries.
+        """
+        message = {"topic": topic, **message} if "topic" not in message else message
+        text = json.dumps(message, default=str)
+        self.stats["published"] += 1
+        delivered = self.deliver_local(topic, text, doctor_id, coalesce_key)
+        if not local_only:
+            try:
+                await publish_event(FANOUT_CHANNEL, {
+                    "origin": _worker_id, "topic": topic, "text": text,
+                    "doctor_id": doctor_id, "coalesce_key": coalesce_key,
+                })
+                self.stats["fanout_out"] += 1
+            except Exception as e:
+                self.stats["fanout_errors"] += 1
+                print(f"[realtime] Fan-out publish failed: {e}")
+        return delivered
+
+    async def broadcast(self, payload: dict) -> int:
+        """AlertManager-compatible entry point: topic taken from the payload."""
+        return await self.publish(payload.get("topic") or payload.get("type", "broadcast"), payload)
+
+    def summary(self) -> dict:
+        conns = list(self.connections.values())
+        return {
+            "worker": _worker_id,
+            "connections": len(conns),
+            "queued": sum(len(c.queue) for c in conns),
+            "max_queue": max((len(c.queue) for c in conns), default=0),
+            **self.stats,
+            "clients": [c.info() for c in conns],
+        }
+
+
+gateway = RealtimeGateway()
+
+
+# ─── Cross-worker fan-out ────────────────────────────────────────────────────
+
+async def _listen_fanout() -> None:
+    async for event in subscribe(FANOUT_CHANNEL):
+        if event.get("origin") == _worker_id:
+            continue
+        gateway.stats["fanout_in"] += 1
+        gateway.deliver_local(event["topic"], event["text"], event.get("doctor_id"), event.get("coalesce_key"))
+
+
+async def _listen_bridged(channel: str, topic: str) -> None:
+    # Every worker receives the domain event itself, so deliver locally only
+    async for payload in subscribe(channel):
+        await gateway.publish(topic, {"type": topic, "data": payload},
+                              doctor_id=payload.get("doctor_id"), local_only=True)
+
+
+async def start_gateway() -> None:
+    """Start the fan-out and bridge listeners. Called in @app.on_event('startup')."""
+    asyncio.create_task(_listen_fanout())
+    for channel, topic in BRIDGED_EVENTS.items():
+        asyncio.create_task(_listen_bridged(channel, topic))
+    print(f"[realtime] Gateway {_worker_id} listening on {FANOUT_CHANNEL} + {len(BRIDGED_EVENTS)} bridged events")
+
+
+# ─── WebSocket endpoint ──────────────────────────────────────────────────────
+
+def _parse_topics(raw: str | None) -> set[str]:
+    return {t.strip() for t in (raw or "").split(",") if t.strip()}
+
+
+def _doctor_from_token(token: str | None) -> str | None:
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    if payload.get("role") == "doctor":
+        return payload.get("id") or payload.get("sub")
+    return None
+
+
+async def serve(ws: WebSocket, topics: set[str], doctor_id: str | None) -> None:
+    """Run one dashboard connection until it disconnects."""
+    conn = await gateway.connect(ws, topics, doctor_id)
+    sender = asyncio.create_task(conn.sender())
+    try:
+        while True:
+            raw = await ws.receive_text()
+            try:
+                msg = json.loads(raw)
+            except ValueError:
+                continue  # plain keep-alive text
+            if not isinstance(msg, dict):
+                continue
+            action = msg.get("action")
+            if action in ("subscribe", "unsubscribe"):
+                raw_topics = msg.get("topics", [])
+                if not isinstance(raw_topics, list) or not all(isinstance(t, str) for t in raw_topics):
+                    conn.enqueue(json.dumps({"type": "error", "message": "topics must be a list of strings"}), "error")
+                    continue
+                wanted = {t.strip() for t in raw_topics if t.strip()}
+            if action == "subscribe":
+                conn.topics |= wanted
+            elif action == "unsubscribe":
+                conn.topics -= wanted
+            elif action == "ping":
+                conn.enqueue(json.dumps({"type": "pong", "ts": time.time()}), "pong")
+                continue
+            else:
+                continue
+            conn.enqueue(json.dumps({"type": "subscribed", "topics": sorted(conn.topics)}), "subscribed")
+    except WebSocketDisconnect:
+        pass
+    finally:
+        gateway.disconnect(conn)
+        await conn.close()
+        sender.cancel()
+
+
+@router.websocket("/ws")
+async def realtime_ws(
+    ws: WebSocket,
+    topics: Optional[str] = None,
+    doctor_id: Optional[str] = None,
+    token: Optional[str] = None,
+):
+    """Multiplexed dashboard socket. A valid doctor token pins the doctor scope."""
+    await serve(ws, _parse_topics(topics) or {"*"}, _doctor_from_token(token) or doctor_id)
+
+
+@router.get("/stats", response_model=APIResponse)
+async def realtime_stats(
+    _user: dict = Depends(get_current_user),
+):
+    """Connections, queue depths, drops, coalesces and slow-consumer disconnects on this worker."""
+    return APIResponse(success=True, data=gateway.summary())
@@ -0,0 +1,63 @@
+"""
+tests/test_compiled_forest.py
+CompiledForest (module2_recoverbot/services/risk_service.py) must score exactly
+like the RandomForestClassifier it was compiled from, on both sides of the
+COMPILED_MAX_ROWS hand-off to sklearn.
+Run with: python -m unittest discover tests
+"""
+import unittest
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from module2_recoverbot.services.risk_service import COMPILED_MAX_ROWS, CompiledForest, LoadedModel
+
+
+def _risk_like_rows(rng, n):
+    """Rows in risk_service.features_to_row order."""
+    return np.column_stack([
+        rng.integers(0, 11, n),          # pain_score
+        rng.integers(0, 2, n),           # fever_present
+        rng.integers(0, 2, n),           # swelling
+        rng.integers(0, 2, n),           # medication_adherent
+        rng.uniform(0, 30, n),           # days_since_discharge
+        rng.uniform(0, 95, n),           # age
+        rng.integers(1, 4, n),           # diagnosis_severity
+    ]).astype(np.float64)
+
+
+class CompiledForestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        rng = np.random.default_rng(7)
+        X = _risk_like_rows(rng, 600)
+        score = X[:, 0] / 10 + X[:, 1] * 0.3 - X[:, 3] * 0.2 + X[:, 6] * 0.1 + rng.normal(0, 0.15, len(X))
+        y = np.digitize(score, [0.3, 0.6, 0.9])    # four risk labels
+        cls.clf = RandomForestClassifier(n_estimators=25, max_depth=8, random_state=0).fit(X, y)
+        cls.compiled = CompiledForest(cls.clf)
+        cls.rng = rng
+
+    def test_matches_sklearn_on_risk_like_rows(self):
+        X = _risk_like_rows(self.rng, 500)
+        np.testing.assert_allclose(self.compiled.predict_proba(X), self.clf.predict_proba(X), rtol=0, atol=1e-9)
+
+    def test_matches_sklearn_on_arbitrary_rows(self):
+        X = self.rng.normal(5, 20, size=(300, 7))
+        np.testing.assert_allclose(self.compiled.predict_proba(X), self.clf.predict_proba(X), rtol=0, atol=1e-9)
+
+    def test_single_row_and_chunking(self):
+        X = _risk_like_rows(self.rng, 37)
+        expected = self.clf.predict_proba(X)
+        np.testing.assert_allclose(self.compiled.predict_proba(X[:1]), expected[:1], rtol=0, atol=1e-9)
+        np.testing.assert_allclose(self.compiled.predict_proba(X, chunk_rows=5), expected, rtol=0, atol=1e-9)
+
+    def test_loaded_model_hand_off(self):
+        model = LoadedModel.__new__(LoadedModel)     # skip the registry load
+        model.clf, model.compiled = self.clf, self.compiled
+        for n in (COMPILED_MAX_ROWS, COMPILED_MAX_ROWS + 1):
+            X = _risk_like_rows(self.rng, n)
+            np.testing.assert_allclose(model.predict_proba(X), self.clf.predict_proba(X), rtol=0, atol=1e-9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+tests/test_painscan_session.py
+Wire format and intake bookkeeping of PainScan streaming sessions
+(module3_painscan/session.py).
+Run with: python -m unittest discover tests
+"""
+import asyncio
+import unittest
+from unittest import mock
+
+from module3_painscan import session as session_module
+from module3_painscan.session import (
+    AUDIO, FRAME, HEADER, MAX_FRAME_BYTES, ProtocolError, ScanSession, parse_packet, parse_sample_rate,
+)
+
+
+def _packet(kind, seq, payload=b"", ts=1.5):
+    return HEADER.pack(kind, seq, ts) + payload
+
+
+class ParsePacketTest(unittest.TestCase):
+    def test_frame_and_audio(self):
+        kind, seq, ts, payload = parse_packet(_packet(FRAME, 7, b"\xff\xd8jpeg"))
+        self.assertEqual((kind, seq, ts, bytes(payload)), (FRAME, 7, 1.5, b"\xff\xd8jpeg"))
+        kind, seq, _, payload = parse_packet(_packet(AUDIO, 3, b"\x01\x00\x02\x00"))
+        self.assertEqual((kind, seq, len(payload)), (AUDIO, 3, 4))
+
+    def test_short_header(self):
+        with self.assertRaises(ProtocolError):
+            parse_packet(_packet(FRAME, 1)[:HEADER.size - 1])
+
+    def test_unknown_kind(self):
+        with self.assertRaises(ProtocolError):
+            parse_packet(_packet(9, 1, b"x"))
+
+    def test_oversize_frame(self):
+        with self.assertRaises(ProtocolError):
+            parse_packet(_packet(FRAME, 1, bytes(MAX_FRAME_BYTES + 1)))
+
+    def test_odd_length_pcm(self):
+        with self.assertRaises(ProtocolError):
+            parse_packet(_packet(AUDIO, 1, b"\x01\x00\x02"))
+
+    def test_sample_rate(self):
+        self.assertEqual(parse_sample_rate("48000"), 48000)
+        for bad in ("abc", None, 0, 10 ** 6):
+            with self.assertRaises(ProtocolError):
+                parse_sample_rate(bad)
+
+
+class IntakeTest(unittest.TestCase):
+    def test_stale_and_lost_frames(self):
+        s = ScanSession(None, None)
+        self.assertTrue(s.accept_frame(0, 0.0, b"a"))
+        self.assertTrue(s.accept_frame(1, 0.1, b"b"))
+        self.assertTrue(s.accept_frame(4, 0.4, b"c"))
+        self.assertFalse(s.accept_frame(3, 0.3, b"late"))
+        self.assertFalse(s.accept_frame(4, 0.4, b"dup"))
+        self.assertEqual(s.stats["frames_received"], 5)
+        self.assertEqual(s.stats["frames_lost"], 2)
+        self.assertEqual(s.stats["frames_stale"], 2)
+
+    def test_latest_frame_wins(self):
+        s = ScanSession(None, None)
+        s.accept_frame(1, 0.1, b"first")
+        s.accept_frame(2, 0.2, b"second")
+        s.accept_frame(3, 0.3, b"third")
+        self.assertEqual(s.stats["frames_superseded"], 2)
+        self.assertEqual(asyncio.run(s.next_frame()), (3, 0.3, b"third"))
+
+    def test_audio_sequence_accounting(self):
+        s = ScanSession(None, None, sample_rate=8000)
+        s.add_audio(0, b"\x00\x00" * 100)
+        s.add_audio(3, b"\x00\x00" * 100)
+        s.add_audio(2, b"\x00\x00" * 100)     # stale, ignored
+        self.assertEqual(s.stats["audio_chunks"], 2)
+        self.assertEqual(s.stats["audio_lost"], 2)
+
+
+class ResultsTest(unittest.TestCase):
+    def test_results_are_capped_and_latest_kept(self):
+        with mock.patch.object(session_module, "MAX_FRAME_RESULTS", 3):
+            s = ScanSession(None, None)
+        for i in range(5):
+            s.record(i, i / 10, {"face_detected": True, "score": i, "quality_weight": 1.0, "heart_rate": 60 + i})
+        summary = s.summary()
+        self.assertEqual(summary["frame_scores"], [2, 3, 4])
+        self.assertEqual(summary["heart_rate"], 64)
+        self.assertEqual(s.stats["frames_analysed"], 5)
+
+    def test_drain_returns_when_analyser_died(self):
+        async def scenario():
+            s = ScanSession(None, None)
+            s.accept_frame(1, 0.1, b"never analysed")
+
+            async def dead():
+                raise RuntimeError("socket closed")
+
+            analyser = asyncio.create_task(dead())
+            drained = await s.drain(analyser, timeout=5)
+            analyser.exception()
+            return drained
+
+        self.assertFalse(asyncio.run(asyncio.wait_for(scenario(), 2)))
+
+    def test_drain_when_idle(self):
+        async def scenario():
+            return await ScanSession(None, None).drain(timeout=1)
+
+        self.assertTrue(asyncio.run(scenario()))
+
+
+if __name__ == "__main__":
+    unittest.main()
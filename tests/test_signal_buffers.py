@@ -0,0 +1,100 @@
+"""
+tests/test_signal_buffers.py
+RingBuffer wraparound, the shared spectral estimator and the rPPG /
+respiration rate checks (module3_painscan/services/).
+Run with: python -m unittest discover tests
+"""
+import unittest
+
+import numpy as np
+
+from module3_painscan.services.respiration import MIN_SAMPLE_FPS as RESP_MIN_FPS, estimate_respiration
+from module3_painscan.services.rppg import MIN_SAMPLE_FPS as RPPG_MIN_FPS, estimate_rppg
+from module3_painscan.services.signal_buffers import (
+    RingBuffer, detrend, dominant_frequency, native_rate, resample_uniform,
+)
+
+
+def _pulse_buffer(fps, hz=1.2, seconds=12.0):
+    buf = RingBuffer(600, 3)
+    for i in range(int(fps * seconds)):
+        t = i / fps
+        p = 0.01 * np.sin(2 * np.pi * hz * t)
+        buf.push(t, [100 * (1 + 0.3 * p), 100 * (1 + p), 100 * (1 + 0.6 * p)])
+    return buf
+
+
+class RingBufferTest(unittest.TestCase):
+    def test_wraparound_window_is_contiguous_and_ordered(self):
+        buf = RingBuffer(8, 2)
+        for i in range(21):
+            buf.push(float(i), [i, -i])
+        ts, data = buf.window()
+        self.assertEqual(buf.count, 8)
+        np.testing.assert_array_equal(ts, np.arange(13, 21, dtype=float))
+        np.testing.assert_array_equal(data[:, 0], np.arange(13, 21))
+        np.testing.assert_array_equal(data[:, 1], -np.arange(13, 21))
+        self.assertTrue(data.flags["C_CONTIGUOUS"])
+        self.assertTrue(np.shares_memory(data, buf._data))     # a view, not a copy
+
+    def test_window_seconds_and_duration(self):
+        buf = RingBuffer(8, 1)
+        for i in range(12):
+            buf.push(i * 0.5, [i])
+        ts, _ = buf.window(1.0)
+        np.testing.assert_array_equal(ts, [4.5, 5.0, 5.5])
+        self.assertEqual(buf.duration(), 3.5)
+        buf.clear()
+        self.assertEqual((buf.count, buf.duration()), (0, 0.0))
+
+    def test_native_rate(self):
+        self.assertAlmostEqual(native_rate(np.arange(0, 10, 0.1)), 10.0)
+        self.assertEqual(native_rate(np.array([1.0])), 0.0)
+
+
+class DominantFrequencyTest(unittest.TestCase):
+    def test_recovers_sinusoid_at_10_fps(self):
+        t = np.arange(0, 10, 0.1)
+        x = detrend(np.sin(2 * np.pi * 1.2 * t) + 0.05 * t)
+        freq, confidence = dominant_frequency(x, 10.0, (0.7, 4.0))
+        self.assertAlmostEqual(freq, 1.2, delta=0.05)
+        self.assertGreater(confidence, 0.8)
+
+    def test_irregular_timestamps_through_resample(self):
+        rng = np.random.default_rng(1)
+        ts = np.cumsum(rng.uniform(0.08, 0.12, 100))
+        x, fs = resample_uniform(ts, np.sin(2 * np.pi * 1.2 * ts)[:, None], 256)
+        freq, _ = dominant_frequency(detrend(x[:, 0]), fs, (0.7, 4.0))
+        self.assertAlmostEqual(freq, 1.2, delta=0.05)
+
+    def test_band_too_narrow(self):
+        self.assertEqual(dominant_frequency(np.ones(16), 10.0, (0.7, 0.71)), (None, 0.0))
+
+
+class EstimatorTest(unittest.TestCase):
+    def test_rppg_recovers_pulse(self):
+        result = estimate_rppg(_pulse_buffer(10))
+        self.assertAlmostEqual(result["heart_rate"], 72.0, delta=3.0)
+        self.assertGreaterEqual(result["pulse_confidence"], 0.4)
+
+    def test_rppg_none_below_min_sample_fps(self):
+        self.assertIsNone(estimate_rppg(_pulse_buffer(RPPG_MIN_FPS - 2))["heart_rate"])
+
+    def test_rppg_none_for_short_window(self):
+        self.assertIsNone(estimate_rppg(_pulse_buffer(10, seconds=3))["heart_rate"])
+
+    def test_respiration(self):
+        for fps, expected in ((10, 18.0), (RESP_MIN_FPS - 0.5, None)):
+            buf = RingBuffer(600, 2)
+            for i in range(int(fps * 16)):
+                t = i / fps
+                buf.push(t, [0.5 + 0.01 * np.sin(2 * np.pi * 0.3 * t), 80.0])
+            rate = estimate_respiration(buf)["resp_rate"]
+            if expected is None:
+                self.assertIsNone(rate)
+            else:
+                self.assertAlmostEqual(rate, expected, delta=1.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+tests/test_symptom_rules.py
+Unit tests for the deterministic symptom extractor (module2_recoverbot/services/symptom_rules.py).
+Run with: python -m unittest discover tests
+"""
+import unittest
+
+from module2_recoverbot.services.symptom_rules import extract_rule_features, unresolved_mentions
+
+
+class ClearStatementsTest(unittest.TestCase):
+    def test_pain_score(self):
+        self.assertEqual(extract_rule_features("Pain is 3 today")["pain_score"], 3)
+        self.assertEqual(extract_rule_features("about 7/10")["pain_score"], 7)
+        self.assertEqual(extract_rule_features("pain level five")["pain_score"], 5)
+        self.assertEqual(extract_rule_features("No pain at all")["pain_score"], 0)
+
+    def test_pain_duration_is_not_a_score(self):
+        self.assertNotIn("pain_score", extract_rule_features("the pain for 2 days now"))
+
+    def test_conflicting_pain_scores(self):
+        self.assertNotIn("pain_score", extract_rule_features("pain is 3, actually 7/10"))
+
+    def test_fever(self):
+        self.assertIs(extract_rule_features("no fever")["fever_present"], False)
+        self.assertIs(extract_rule_features("I have a fever")["fever_present"], True)
+        self.assertIs(extract_rule_features("temperature 38.5")["fever_present"], True)
+        self.assertIs(extract_rule_features("temp was 99.1 F")["fever_present"], False)
+        self.assertIs(extract_rule_features("the fever is gone")["fever_present"], False)
+
+    def test_swelling(self):
+        self.assertIs(extract_rule_features("the knee is swollen")["swelling"], True)
+        self.assertIs(extract_rule_features("no swelling")["swelling"], False)
+
+    def test_medication(self):
+        self.assertIs(extract_rule_features("took all my meds")["medication_adherent"], True)
+        self.assertIs(extract_rule_features("I forgot my pills")["medication_adherent"], False)
+
+
+class MissedDoseTest(unittest.TestCase):
+    def test_quantified_missed_doses(self):
+        for message in (
+            "missed one dose",
+            "I missed a dose yesterday",
+            "skipped a few doses",
+            "forgot two of my tablets",
+            "missed my evening dose",
+            "skipped a couple of pills",
+        ):
+            with self.subTest(message=message):
+                self.assertIs(extract_rule_features(message)["medication_adherent"], False)
+
+    def test_on_medication_but_missed_dose_is_unresolved(self):
+        message = "I am on my antibiotics but missed one dose"
+        self.assertNotIn("medication_adherent", extract_rule_features(message))
+        self.assertIn("medication_adherent", unresolved_mentions(message, set()))
+
+
+class HedgedStatementsTest(unittest.TestCase):
+    def test_not_sure_is_not_negation(self):
+        message = "I am not sure about the fever"
+        self.assertNotIn("fever_present", extract_rule_features(message))
+        self.assertIn("fever_present", unresolved_mentions(message, set()))
+
+    def test_hedges_leave_fields_unresolved(self):
+        for message, field in (
+            ("maybe a little swelling", "swelling"),
+            ("I think the pain is 4", "pain_score"),
+            ("probably took my meds", "medication_adherent"),
+            ("don't know if it's a fever", "fever_present"),
+        ):
+            with self.subTest(message=message):
+                self.assertNotIn(field, extract_rule_features(message))
+
+    def test_hedge_only_affects_its_own_clause(self):
+        found = extract_rule_features("pain is 2, but I'm not sure about the swelling")
+        self.assertEqual(found.get("pain_score"), 2)
+        self.assertNotIn("swelling", found)
+
+
+if __name__ == "__main__":
+    unittest.main()